@@ -0,0 +1,250 @@
+"""Coalesces outbound Graph mail calls into ``$batch`` requests.
+
+Every reply used to be its own ``/reply`` or ``/sendMail`` POST, which runs
+into Graph's per-mailbox throttling (429) during email bursts. Replies are
+queued instead and a single background thread sends them:
+
+- after the first reply arrives it waits ``window_seconds`` for more, then
+  posts up to ``max_size`` (Graph's limit is 20) in one ``$batch`` call
+- each item's result is read on its own: 2xx is sent, 429/503/504 is
+  retried after its ``Retry-After`` (the whole queue pauses meanwhile, the
+  throttle is per mailbox), anything else is logged as failed
+- a single queued item, or a ``$batch`` call that fails as a whole, goes out
+  as plain single POSTs
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.lazy import lazy_import
+from app.core.metrics import Counter, Histogram
+from app.core.tracing import start_span, inject
+
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger("adapters.email.graph_batch")
+
+GRAPH_BATCH_LIMIT = 20
+RETRY_STATUSES = (429, 503, 504)
+DEFAULT_RETRY_AFTER = 5.0
+
+GRAPH_BATCH_ITEMS = Counter(
+    "multikanal_graph_batch_items_total",
+    "Queued Graph mail calls by outcome (sent, retried, failed).",
+    ("result",),
+)
+GRAPH_BATCH_SIZE = Histogram(
+    "multikanal_graph_batch_size",
+    "Mail calls per Graph request ($batch or single).",
+    buckets=(1, 2, 5, 10, 15, 20),
+)
+
+
+def _retry_after(headers: Optional[Dict[str, Any]]) -> float:
+    for key, value in (headers or {}).items():
+        if key.lower() == "retry-after":
+            try:
+                return max(float(value), 0.0)
+            except (TypeError, ValueError):
+                break
+    return DEFAULT_RETRY_AFTER
+
+
+class GraphBatchDispatcher:
+    def __init__(self, base_url: str, token_provider: Callable[[], Optional[str]], window_seconds: float = 0.25,
+                 max_size: int = GRAPH_BATCH_LIMIT, max_attempts: int = 3, timeout: float = 10.0):
+        self.base_url = f"{base_url.rstrip('/')}/v1.0"
+        self.token_provider = token_provider
+        self.window_seconds = window_seconds
+        self.max_size = max(1, min(max_size, GRAPH_BATCH_LIMIT))
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._pending: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._blocked_until = 0.0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._client = None
+        self._ids = itertools.count(1)
+
+    def submit(self, url: str, body: Dict[str, Any]) -> bool:
+        """Queues a POST to ``url`` (relative to ``/v1.0``); False once closed."""
+        item = {
+            "url": url,
+            "body": body,
+            # Captured here: the sender thread has no span of its own.
+            "headers": inject({"Content-Type": "application/json"}),
+            "attempt": 0,
+            "ready_at": 0.0,
+        }
+        with self._cond:
+            if self._closed:
+                return False
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="graph-batch", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def close(self, timeout: float = 10.0):
+        """Flushes what is queued (throttle delays are not waited out) and stops."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Graph batch sender still busy, %s replies not sent", self.pending())
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.error("Graph batch flush error: %s", e)
+                GRAPH_BATCH_ITEMS.inc("failed", amount=len(batch))
+
+    def _take(self) -> Optional[List[Dict[str, Any]]]:
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                if not self._pending:
+                    timeout = None
+                elif now < self._blocked_until:
+                    timeout = self._blocked_until - now
+                else:
+                    timeout = min(item["ready_at"] for item in self._pending) - now
+                    if timeout <= 0:
+                        break
+                self._cond.wait(timeout)
+            if self._closed and not self._pending:
+                return None
+
+            # Something is ready: give the burst the window to catch up.
+            deadline = time.monotonic() + self.window_seconds
+            while not self._closed and self._ready_count() < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            now = time.monotonic()
+            batch = [item for item in self._pending if self._closed or item["ready_at"] <= now][:self.max_size]
+            for item in batch:
+                self._pending.remove(item)
+            return batch
+
+    def _ready_count(self) -> int:
+        now = time.monotonic()
+        return sum(1 for item in self._pending if item["ready_at"] <= now)
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        return self._client
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        token = self.token_provider()
+        if not token:
+            logger.error("No Graph token, dropping %d replies", len(batch))
+            GRAPH_BATCH_ITEMS.inc("failed", amount=len(batch))
+            return
+        if len(batch) == 1:
+            self._send_single(batch[0], token)
+            return
+
+        ids = [str(next(self._ids)) for _ in batch]
+        payload = {"requests": [
+            {"id": request_id, "method": "POST", "url": item["url"], "headers": item["headers"], "body": item["body"]}
+            for request_id, item in zip(ids, batch)
+        ]}
+        GRAPH_BATCH_SIZE.observe(len(batch))
+        try:
+            with start_span("graph.batch", size=len(batch)):
+                response = self._http().post(
+                    f"{self.base_url}/$batch",
+                    json=payload,
+                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+                )
+        except Exception as e:
+            logger.warning("Graph $batch failed (%s), sending %d replies one by one", e, len(batch))
+            self._send_each(batch, token)
+            return
+
+        if response.status_code in RETRY_STATUSES:
+            self._retry(batch, _retry_after(response.headers))
+            return
+        if response.status_code != 200:
+            logger.warning("Graph $batch rejected (%s), sending replies one by one", response.status_code)
+            self._send_each(batch, token)
+            return
+
+        results = {r.get("id"): r for r in response.json().get("responses", [])}
+        retry, delay = [], 0.0
+        for request_id, item in zip(ids, batch):
+            result = results.get(request_id)
+            if result is None:
+                self._send_single(item, token)
+                continue
+            status = result.get("status", 0)
+            if 200 <= status < 300:
+                GRAPH_BATCH_ITEMS.inc("sent")
+            elif status in RETRY_STATUSES:
+                retry.append(item)
+                delay = max(delay, _retry_after(result.get("headers")))
+            else:
+                logger.error("Graph batch item %s failed (%s): %s", item['url'], status, result.get('body'))
+                GRAPH_BATCH_ITEMS.inc("failed")
+        if retry:
+            self._retry(retry, delay)
+
+    def _send_each(self, batch: List[Dict[str, Any]], token: str):
+        for item in batch:
+            self._send_single(item, token)
+
+    def _send_single(self, item: Dict[str, Any], token: str):
+        GRAPH_BATCH_SIZE.observe(1)
+        headers = dict(item["headers"], Authorization=f"Bearer {token}")
+        try:
+            with start_span("graph.send_single"):
+                response = self._http().post(f"{self.base_url}{item['url']}", json=item["body"], headers=headers)
+        except Exception as e:
+            logger.error("Graph send exception: %s", e)
+            self._retry([item], DEFAULT_RETRY_AFTER)
+            return
+        if 200 <= response.status_code < 300:
+            GRAPH_BATCH_ITEMS.inc("sent")
+        elif response.status_code in RETRY_STATUSES:
+            self._retry([item], _retry_after(response.headers))
+        else:
+            logger.error("Graph send %s failed (%s): %s", item['url'], response.status_code, response.text)
+            GRAPH_BATCH_ITEMS.inc("failed")
+
+    def _retry(self, items: List[Dict[str, Any]], delay: float):
+        ready_at = time.monotonic() + delay
+        with self._cond:
+            for item in items:
+                item["attempt"] += 1
+                if item["attempt"] >= self.max_attempts:
+                    logger.error("Graph send %s gave up after %s attempts", item['url'], item['attempt'])
+                    GRAPH_BATCH_ITEMS.inc("failed")
+                    continue
+                GRAPH_BATCH_ITEMS.inc("retried")
+                item["ready_at"] = ready_at
+                self._pending.append(item)
+            self._blocked_until = max(self._blocked_until, ready_at)
+            self._cond.notify()
@@ -1,4 +1,3 @@
-import imaplib
 import email
 import time
 import asyncio
@@ -8,15 +7,19 @@ from email.header import decode_header
 from typing import Dict, Any, Optional
 
 from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.tracing import start_span, current_traceparent
+from app.core.capture import capture
 from app.adapters.email.utils import sanitize_email_body
 from app.repositories.message import MessageRepository
-from app.api.dependencies import get_orchestrator
-from app.schemas.models import IncomingMessage
+from app.api.dependencies import get_orchestrator, get_lanes, get_tenants
+from app.schemas.record import MessageRecord
 
 logger = logging.getLogger("email.listener")
 repo = MessageRepository()
 
-import msal
+imaplib = lazy_import("imaplib")
+msal = lazy_import("msal")
 _token_cache: Dict[str, Any] = {}
 
 def get_graph_token() -> Optional[str]:
@@ -43,21 +46,21 @@ def get_graph_token() -> Optional[str]:
         return None
 
 def _mark_graph_read(user_id, message_id, token):
-    url = f"https://graph.microsoft.com/v1.0/users/{user_id}/messages/{message_id}"
+    url = f"{settings.MS_GRAPH_BASE_URL.rstrip('/')}/v1.0/users/{user_id}/messages/{message_id}"
     try:
         requests.patch(url, json={"isRead": True}, headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"}, timeout=5)
     except Exception: 
         pass
 
-def _process_graph_message(user_id, msg, token):
+def _process_graph_message(user_id, msg, token, is_new: bool):
     graph_id = msg.get("id")
     azure_conv_id = msg.get("conversationId") 
     
     if not graph_id: 
         return
 
-    if repo.is_processed(graph_id, "email"):
-        logger.warning(f"DUPLIKASI DITOLAK: {graph_id}. Menandai sebagai Read.")
+    if not is_new:
+        logger.warning("DUPLIKASI DITOLAK: %s. Menandai sebagai Read.", graph_id)
         _mark_graph_read(user_id, graph_id, token)
         return
 
@@ -70,7 +73,8 @@ def _process_graph_message(user_id, msg, token):
         "subject": msg.get("subject", "No Subject"),
         "sender_name": sender_info.get("name", ""),
         "graph_message_id": graph_id,
-        "conversation_id": azure_conv_id 
+        "conversation_id": azure_conv_id,
+        "channel_id": user_id  # mailbox, selects the tenant
     }
 
     process_single_email(sender_info.get("address", ""), clean_body, metadata)
@@ -84,16 +88,22 @@ def _poll_graph_api():
     token = get_graph_token()
     if not token: 
         return
-    user_id = settings.AZURE_EMAIL_USER
-    url = f"https://graph.microsoft.com/v1.0/users/{user_id}/mailFolders/inbox/messages"
+    # One app token reads every mailbox: the default one and each tenant's.
+    for user_id in get_tenants().mailboxes():
+        _poll_graph_mailbox(user_id, token)
+
+def _poll_graph_mailbox(user_id, token):
+    url = f"{settings.MS_GRAPH_BASE_URL.rstrip('/')}/v1.0/users/{user_id}/mailFolders/inbox/messages"
     params = {"$filter": "isRead eq false", "$top": 10}
     try:
         resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, params=params, timeout=20)
         if resp.status_code == 200:
-            for msg in resp.json().get("value", []):
-                _process_graph_message(user_id, msg, token)
+            messages = resp.json().get("value", [])
+            new_ids = repo.claim_new((msg.get("id") for msg in messages), "email")
+            for msg in messages:
+                _process_graph_message(user_id, msg, token, msg.get("id") in new_ids)
     except Exception as e:
-        logger.error(f"Graph Polling Error: {e}")
+        logger.error("Graph Polling Error: %s", e)
 
 def _connect_gmail_imap():
     try:
@@ -104,11 +114,11 @@ def _connect_gmail_imap():
         mail.login(email_user, email_pass)
         return mail
     except imaplib.IMAP4.error as e:
-        logger.error(f"IMAP Login Error: {e}")
+        logger.error("IMAP Login Error: %s", e)
         logger.error("Check: 1) IMAP enabled in Gmail, 2) Using App Password, 3) 2FA enabled")
         return None
     except Exception as e:
-        logger.error(f"IMAP Connection Error: {e}")
+        logger.error("IMAP Connection Error: %s", e)
         return None
 
 def _process_gmail_message(mail, msg_id):
@@ -124,11 +134,11 @@ def _process_gmail_message(mail, msg_id):
         message_id = email_message.get("Message-ID", "").strip()
         
         if not message_id:
-            logger.warning(f"Email {msg_id} has no Message-ID, skipping")
+            logger.warning("Email %s has no Message-ID, skipping", msg_id)
             return
         
         if repo.is_processed(message_id, "email"):
-            logger.debug(f"Email {message_id[:30]}... already processed")
+            logger.debug("Email %s... already processed", message_id[:30])
             mail.store(msg_id, '+FLAGS', '\\Seen')
             return
         
@@ -141,7 +151,7 @@ def _process_gmail_message(mail, msg_id):
         
         sender_lower = sender_email.lower()
         if any(skip in sender_lower for skip in ["mailer-daemon", "noreply", "no-reply", "postmaster"]):
-            logger.info(f"Skipping system email from: {sender_email}")
+            logger.info("Skipping system email from: %s", sender_email)
             return
         
         subject = email_message.get("Subject", "No Subject")
@@ -188,7 +198,7 @@ def _process_gmail_message(mail, msg_id):
         clean_body = sanitize_email_body(body, html_body)
         
         if not clean_body or len(clean_body.strip()) < 3:
-            logger.warning(f"Email has no readable content: {subject}")
+            logger.warning("Email has no readable content: %s", subject)
             return
         
         in_reply_to = email_message.get("In-Reply-To", "")
@@ -205,13 +215,13 @@ def _process_gmail_message(mail, msg_id):
             "thread_key": thread_key
         }
         
-        logger.info(f"Processing email from {sender_email}: {subject[:50]}")
+        logger.info("Processing email from %s: %s", sender_email, subject[:50])
         
         # Process the email
         process_single_email(sender_email, clean_body, metadata)
         
     except Exception as e:
-        logger.error(f"Error processing Gmail message {msg_id}: {e}")
+        logger.error("Error processing Gmail message %s: %s", msg_id, e)
         import traceback
         traceback.print_exc()
 
@@ -226,7 +236,7 @@ def _poll_gmail_imap():
         status, messages = mail.select("INBOX")
         
         if status != "OK":
-            logger.error(f"Failed to select INBOX: {status}")
+            logger.error("Failed to select INBOX: %s", status)
             return
         
         status, msg_ids = mail.search(None, "UNSEEN")
@@ -238,7 +248,7 @@ def _poll_gmail_imap():
         unread_ids = msg_ids[0].split()
         
         if unread_ids:
-            logger.info(f"Found {len(unread_ids)} unread email(s)")
+            logger.info("Found %d unread email(s)", len(unread_ids))
             
             for msg_id in unread_ids:
                 _process_gmail_message(mail, msg_id)
@@ -248,40 +258,42 @@ def _poll_gmail_imap():
             logger.debug("No unread emails")
         
     except Exception as e:
-        logger.error(f"Gmail polling error: {e}")
+        logger.error("Gmail polling error: %s", e)
     finally:
         try:
             mail.logout()
         except:
             pass
 
-def process_single_email(sender_email, body, metadata: dict):
-    if "mailer-daemon" in sender_email.lower() or "noreply" in sender_email.lower(): 
-        return
-
-    msg = IncomingMessage(
-        platform_unique_id=sender_email,
-        query=body,
-        platform="email",
-        metadata=metadata
-    )
-    
+def _process_email(msg: MessageRecord):
     try:
         orchestrator = get_orchestrator()
         orchestrator.process_message(msg)
-        logger.info(f"Email processed: {sender_email}")
+        logger.info("Email processed: %s", msg.user_id)
     except Exception as err:
-        logger.error(f"Internal Process Error: {err}")
+        logger.error("Internal Process Error: %s", err)
         import traceback
         traceback.print_exc()
 
+def process_single_email(sender_email, body, metadata: dict):
+    if "mailer-daemon" in sender_email.lower() or "noreply" in sender_email.lower(): 
+        return
+
+    capture("email", {"sender_email": sender_email, "body": body, "metadata": metadata})
+
+    with start_span("email.process", provider=settings.EMAIL_PROVIDER):
+        msg = MessageRecord.from_metadata("email", sender_email, body, metadata=metadata)
+        msg.traceparent = current_traceparent() or msg.traceparent
+        # Runs on the email lane so slow email work cannot starve chat traffic.
+        get_lanes().submit("email", _process_email, msg)
+
 def start_email_listener():
     if not settings.EMAIL_USER and not settings.AZURE_CLIENT_ID: 
         logger.warning("No email credentials configured")
         return
     
     provider = settings.EMAIL_PROVIDER
-    logger.info(f"Starting Email Listener (Provider: {provider})")
+    logger.info("Starting Email Listener (Provider: %s)", provider)
     
     while True:
         try:
@@ -290,9 +302,9 @@ def start_email_listener():
             elif provider == "gmail":
                 _poll_gmail_imap()
             else:
-                logger.warning(f"Unknown email provider: {provider}")
+                logger.warning("Unknown email provider: %s", provider)
                 
         except Exception as e:
-            logger.error(f"Email listener error: {e}")
+            logger.error("Email listener error: %s", e)
         
         time.sleep(settings.EMAIL_POLL_INTERVAL_SECONDS)
\ No newline at end of file
@@ -1,27 +1,53 @@
-import smtplib
-import httpx
+import asyncio
 import logging
 import time
-import re
-import msal
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from email.utils import make_msgid
 from typing import Optional, Dict, Any
 
 from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.tracing import start_span, inject
 from app.adapters.base import BaseAdapter
+from app.adapters.markdown import parse_markdown, render_email_html
+from app.adapters.email.smtp_pool import SMTPPool
+from app.adapters.email.graph_batch import GraphBatchDispatcher
+
+# Channel-specific stacks are only loaded once an email is actually sent.
+httpx = lazy_import("httpx")
+msal = lazy_import("msal")
+mime_text = lazy_import("email.mime.text")
+mime_multipart = lazy_import("email.mime.multipart")
 
 logger = logging.getLogger("adapters.email")
 
 class EmailAdapter(BaseAdapter):
     _token_cache: Dict[str, Any] = {}
 
+    def __init__(self, mailbox: Optional[str] = None):
+        self.mailbox = mailbox or settings.AZURE_EMAIL_USER
+        self.smtp = SMTPPool(
+            settings.EMAIL_HOST,
+            settings.EMAIL_PORT,
+            settings.EMAIL_USER,
+            settings.EMAIL_PASS,
+            size=settings.SMTP_POOL_SIZE,
+            idle_seconds=settings.SMTP_IDLE_SECONDS
+        )
+        self.graph_batch = GraphBatchDispatcher(
+            settings.MS_GRAPH_BASE_URL,
+            self._get_graph_token,
+            window_seconds=settings.GRAPH_BATCH_WINDOW_MS / 1000,
+            max_size=settings.GRAPH_BATCH_MAX_SIZE,
+            max_attempts=settings.GRAPH_BATCH_MAX_ATTEMPTS
+        ) if settings.GRAPH_BATCH_ENABLED else None
+
+    def close(self):
+        if self.graph_batch is not None:
+            self.graph_batch.close(timeout=settings.GRAPH_BATCH_CLOSE_SECONDS)
+        self.smtp.close()
+
     def _convert_markdown_to_html(self, text: str) -> str:
-        text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
-        text = re.sub(r'\*(.*?)\*', r'<i>\1</i>', text)
-        text = re.sub(r'_(.*?)_', r'<i>\1</i>', text)
-        return text
+        return render_email_html(parse_markdown(text))
 
     def _get_graph_token(self) -> Optional[str]:
         if self._token_cache and self._token_cache.get("expires_at", 0) > time.time() + 60:
@@ -52,42 +78,74 @@ class EmailAdapter(BaseAdapter):
             logger.error(f"Azure Auth Exception: {e}")
             return None
 
-    async def send_message(self, recipient_id: str, text: str, **kwargs):
-        subject = kwargs.get("subject", "Re: Your Inquiry")
-        in_reply_to = kwargs.get("in_reply_to")
-        references = kwargs.get("references")
-        graph_message_id = kwargs.get("graph_message_id")
-        
-        text = self._convert_markdown_to_html(text)
-        html_body = text.replace('\n', '<br>')
-        
+    def _prepare(self, text: str, **kwargs):
+        html_body = self._convert_markdown_to_html(text)
         formatted_body = (
             f"Yth. Bapak/Ibu,<br><br>{html_body}<br><br>"
         )
+        return kwargs.get("subject", "Re: Your Inquiry"), formatted_body
 
+    def send_message(self, recipient_id: str, text: str, **kwargs):
+        """Blocking send, for worker threads (the orchestrator's lanes)."""
+        subject, formatted_body = self._prepare(text, **kwargs)
         if settings.EMAIL_PROVIDER == "azure_oauth2":
-            return await self._send_via_graph(recipient_id, subject, formatted_body, graph_message_id)
-        else:
-            return self._send_via_smtp(recipient_id, subject, formatted_body, in_reply_to, references)
+            queued = self._queue_graph(recipient_id, subject, formatted_body, kwargs.get("graph_message_id"))
+            if queued:
+                return queued
+            return asyncio.run(self._send_via_graph(recipient_id, subject, formatted_body, kwargs.get("graph_message_id")))
+        return self._send_via_smtp(recipient_id, subject, formatted_body, kwargs.get("in_reply_to"), kwargs.get("references"))
+
+    async def send_message_async(self, recipient_id: str, text: str, **kwargs):
+        """Event-loop variant: SMTP I/O runs in a worker thread."""
+        subject, formatted_body = self._prepare(text, **kwargs)
+        if settings.EMAIL_PROVIDER == "azure_oauth2":
+            queued = self._queue_graph(recipient_id, subject, formatted_body, kwargs.get("graph_message_id"))
+            if queued:
+                return queued
+            return await self._send_via_graph(recipient_id, subject, formatted_body, kwargs.get("graph_message_id"))
+        return await asyncio.to_thread(
+            self._send_via_smtp, recipient_id, subject, formatted_body, kwargs.get("in_reply_to"), kwargs.get("references")
+        )
+
+    def _graph_request(self, to_email: str, subject: str, html_body: str, graph_message_id: str = None):
+        """(path relative to /v1.0, JSON body) of the reply or sendMail call."""
+        if graph_message_id:
+            return f"/users/{self.mailbox}/messages/{graph_message_id}/reply", {"comment": html_body}
+        return f"/users/{self.mailbox}/sendMail", {
+            "message": {
+                "subject": subject,
+                "body": {"contentType": "HTML", "content": html_body},
+                "toRecipients": [{"emailAddress": {"address": to_email}}]
+            },
+            "saveToSentItems": "true"
+        }
+
+    def _queue_graph(self, to_email: str, subject: str, html_body: str, graph_message_id: str = None):
+        if self.graph_batch is None:
+            return None
+        path, body = self._graph_request(to_email, subject, html_body, graph_message_id)
+        if not self.graph_batch.submit(path, body):
+            return None
+        return {"queued": True, "method": "azure_graph_batch"}
 
     async def _send_via_graph(self, to_email: str, subject: str, html_body: str, graph_message_id: str = None):
         token = self._get_graph_token()
         if not token:
             return {"sent": False, "error": "Could not acquire Azure token"}
 
-        user_id = settings.AZURE_EMAIL_USER
-        headers = {
+        headers = inject({
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
-        }
-        
+        })
+        path, payload = self._graph_request(to_email, subject, html_body, graph_message_id)
+        url = f"{settings.MS_GRAPH_BASE_URL.rstrip('/')}/v1.0{path}"
+
         async with httpx.AsyncClient(timeout=10) as client:
             if graph_message_id:
-                logger.info(f"Replying to existing thread using Graph ID: {graph_message_id}")
-                url = f"https://graph.microsoft.com/v1.0/users/{user_id}/messages/{graph_message_id}/reply"
-                payload = {"comment": html_body}
+                logger.info("Replying to existing thread using Graph ID: %s", graph_message_id)
                 try:
-                    response = await client.post(url, json=payload, headers=headers)
+                    with start_span("graph.reply"):
+                        response = await client.post(url, json=payload, headers=headers)
                     if response.status_code == 202:
                         return {"sent": True, "method": "azure_graph_reply"}
                     else:
@@ -97,20 +155,11 @@ class EmailAdapter(BaseAdapter):
                     logger.error(f"Graph Reply Exception: {e}")
                     return {"sent": False, "error": str(e)}
 
-            url = f"https://graph.microsoft.com/v1.0/users/{user_id}/sendMail"
-            email_msg = {
-                "message": {
-                    "subject": subject,
-                    "body": {"contentType": "HTML", "content": html_body},
-                    "toRecipients": [{"emailAddress": {"address": to_email}}]
-                },
-                "saveToSentItems": "true"
-            }
-
             try:
-                response = await client.post(url, json=email_msg, headers=headers)
+                with start_span("graph.send_mail"):
+                    response = await client.post(url, json=payload, headers=headers)
                 if response.status_code == 202:
-                    logger.info(f"Email sent via Azure sendMail to {to_email}")
+                    logger.info("Email sent via Azure sendMail to %s", to_email)
                     return {"sent": True, "method": "azure_graph_send"}
                 else:
                     logger.error(f"Graph API Error {response.status_code}: {response.text}")
@@ -121,18 +170,16 @@ class EmailAdapter(BaseAdapter):
 
     def _send_via_smtp(self, to_email, subject, html_body, in_reply_to, references):
         try:
-            msg = MIMEMultipart()
+            msg = mime_multipart.MIMEMultipart()
             msg['From'] = settings.EMAIL_USER
             msg['To'] = to_email
             msg['Subject'] = subject
             msg['Message-ID'] = make_msgid()
             if in_reply_to: msg['In-Reply-To'] = in_reply_to
             if references: msg['References'] = references
-            msg.attach(MIMEText(html_body, 'html'))
-            with smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
-                server.starttls()
-                server.login(settings.EMAIL_USER, settings.EMAIL_PASS)
-                server.send_message(msg)
+            msg.attach(mime_text.MIMEText(html_body, 'html'))
+            with start_span("smtp.send"):
+                self.smtp.send(msg)
             return {"sent": True, "message_id": msg['Message-ID']}
         except Exception as e:
             logger.error(f"SMTP Error: {e}")
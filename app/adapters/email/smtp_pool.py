@@ -0,0 +1,127 @@
+"""Small pool of authenticated SMTP sessions for the Gmail send path.
+
+Opening a session costs a TCP + TLS handshake, EHLO, STARTTLS and AUTH, and
+Gmail rate-limits logins, so sessions are reused across replies:
+
+- at most ``size`` sessions exist; extra senders wait for a free one
+- a session idle for more than ``idle_seconds`` is closed instead of reused
+  (servers drop idle clients), one idle for over ``check_seconds`` is
+  checked with NOOP first
+- a session that fails mid-send is discarded; when the server turns out to
+  have disconnected, idle sessions are dropped and the send is retried
+  once on a fresh session
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Optional, Tuple
+
+from app.core.lazy import lazy_import
+from app.core.metrics import Counter
+
+smtplib = lazy_import("smtplib")
+
+logger = logging.getLogger("adapters.email.smtp")
+
+SMTP_SESSIONS = Counter(
+    "multikanal_smtp_sessions_total",
+    "SMTP session events (opened, reused, expired, failed).",
+    ("event",),
+)
+
+
+class SMTPPool:
+    def __init__(self, host: str, port: int, user: Optional[str], password: Optional[str], size: int = 2,
+                 idle_seconds: float = 60.0, check_seconds: float = 10.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.check_seconds = check_seconds
+        self.timeout = timeout
+        self._idle: Deque[Tuple[object, float]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            self._discard(server)
+            raise
+        SMTP_SESSIONS.inc("opened")
+        return server
+
+    @staticmethod
+    def _discard(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            idle = time.monotonic() - last_used
+            if idle > self.idle_seconds:
+                SMTP_SESSIONS.inc("expired")
+                self._discard(server)
+                continue
+            if idle > self.check_seconds:
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPException("NOOP rejected")
+                except Exception:
+                    SMTP_SESSIONS.inc("expired")
+                    self._discard(server)
+                    continue
+            SMTP_SESSIONS.inc("reused")
+            return server
+        return self._open()
+
+    @contextmanager
+    def connection(self, fresh: bool = False):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No SMTP session available")
+        try:
+            server = self._open() if fresh else self._checkout()
+            try:
+                yield server
+            except Exception:
+                SMTP_SESSIONS.inc("failed")
+                self._discard(server)
+                raise
+            with self._lock:
+                self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def send(self, msg):
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped the session; its idle siblings are likely gone too.
+            logger.info("SMTP session dropped, retrying on a new one")
+            self.close()
+            with self.connection(fresh=True) as server:
+                server.send_message(msg)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            self._discard(server)
@@ -1,44 +1,241 @@
 import re
-from html import unescape
+from html.parser import HTMLParser
+from typing import Optional
+
+REGEX_HORIZONTAL_SPACE = re.compile(r'[ \t\r\f\v\u00a0\u200b]+')
+
+# Every marker is matched against a single, whitespace-normalized line with
+# re.match, so the cost per line is bounded by the line length.
+REGEX_QUOTE_MARKER = re.compile(
+    r'(?:'
+    r'>'
+    r'|On\s.*\b(?:wrote|menulis)\s*:?$'
+    r'|Pada\s.*\bmenulis\s*:?$'
+    r'|(?:From|Dari)\s*:.*\b(?:Sent|Kirim|Date|Tanggal)\s*:'
+    r'|_{3,}'
+    r'|-{2,}\s*(?:Original Message|Pesan Asli|Forwarded message|Pesan yang diteruskan)\s*-{2,}'
+    r')',
+    re.IGNORECASE
+)
+# Markers that mail clients wrap over two lines: (first line, continuation line).
+HELD_MARKERS = (
+    (re.compile(r'(?:From|Dari)\s*:', re.IGNORECASE), re.compile(r'(?:Sent|Kirim|Date|Tanggal)\s*:', re.IGNORECASE)),
+    (re.compile(r'(?:On|Pada)\s', re.IGNORECASE), re.compile(r'.*\b(?:wrote|menulis)\s*:?$', re.IGNORECASE)),
+)
+
+BLOCK_TAGS = frozenset({
+    "p", "div", "br", "li", "tr", "table", "ul", "ol", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+})
+SKIP_TAGS = frozenset({"script", "style", "head", "title"})
+QUOTE_CONTAINER_IDS = frozenset({"divrplyfwdmsg", "appendonsend"})
+QUOTE_CONTAINER_CLASSES = frozenset({"gmail_quote", "yahoo_quoted", "moz-cite-prefix"})
+
+FEED_CHUNK_SIZE = 8192
+
+
+class _BodyBuilder:
+    """Line-oriented sink that normalizes whitespace and cuts at the first quoted-reply marker.
+
+    Text is written incrementally; ``done`` turns true once a quote marker is
+    found or ``max_chars`` of output have been produced, so producers can
+    stop reading the rest of the body.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None, detect_quotes: bool = True):
+        self.max_chars = max_chars
+        self.detect_quotes = detect_quotes
+        self.done = False
+        self._lines = []
+        self._size = 0
+        self._pending = []
+        self._pending_size = 0
+        self._held = None
+        self._held_next = None
+        self._held_blank = False
+        self._blank = False
+        self._continued = False
+        self._segment_limit = (max_chars or 0) + 1024
+
+    def write(self, text: str):
+        if self.done or not text:
+            return
+        start = 0
+        while not self.done:
+            newline = text.find('\n', start)
+            if newline == -1:
+                self._pending.append(text[start:])
+                self._pending_size += len(text) - start
+                if self.max_chars and self._pending_size > self._segment_limit:
+                    self._flush_pending(continuation=True)
+                return
+            self._pending.append(text[start:newline])
+            self._flush_pending()
+            start = newline + 1
+
+    def close(self) -> str:
+        if not self.done:
+            self._flush_pending()
+            if self._held is not None:
+                self._release_held()
+        body = ''.join(self._lines).strip()
+        if self.max_chars is not None:
+            body = body[:self.max_chars].strip()
+        return body
+
+    def _flush_pending(self, continuation: bool = False):
+        raw = ''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        if continuation or self._continued:
+            # Overlong line flushed in segments: only its first segment can hold a marker.
+            segment = REGEX_HORIZONTAL_SPACE.sub(' ', raw)
+            if not self._continued and self.detect_quotes:
+                segment = segment.lstrip()
+                if self._at_marker(segment):
+                    self.done = True
+                    return
+            self._emit(segment, newline=not continuation)
+            self._continued = continuation
+            return
+        self._line(REGEX_HORIZONTAL_SPACE.sub(' ', raw).strip())
+
+    def _line(self, line: str):
+        if not line:
+            if self._held is None:
+                self._emit_blank()
+            else:
+                self._held_blank = True
+            return
+
+        if self.detect_quotes:
+            if self._at_marker(line):
+                self.done = True
+                return
+            for first, following in HELD_MARKERS:
+                if first.match(line):
+                    self._held = line
+                    self._held_next = following
+                    self._held_blank = False
+                    return
+
+        self._emit(line)
+
+    def _at_marker(self, line: str) -> bool:
+        """True when ``line`` starts the quote; a held line that did not is emitted first."""
+        if self._held is not None:
+            if self._held_next.match(line):
+                return True
+            self._release_held()
+        return REGEX_QUOTE_MARKER.match(line) is not None
+
+    def _release_held(self):
+        self._emit(self._held)
+        self._held = None
+        if self._held_blank:
+            self._held_blank = False
+            self._emit_blank()
+
+    def _emit_blank(self):
+        if self._lines and not self._blank:
+            self._lines.append('\n')
+            self._blank = True
+
+    def _emit(self, line: str, newline: bool = True):
+        self._lines.append(line + '\n' if newline else line)
+        self._blank = False
+        self._size += len(line) + 1
+        if self.max_chars is not None and self._size >= self.max_chars:
+            self.done = True
+
+
+class _HTMLTextExtractor(HTMLParser):
+    def __init__(self, sink: _BodyBuilder, stop_at_quote: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.sink = sink
+        self.stop_at_quote = stop_at_quote
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self.stop_at_quote and _is_quote_container(tag, attrs):
+            self.sink.done = True
+            return
+        if tag == "br":
+            self.sink.write('\n')
+        elif tag == "hr":
+            self.sink.write('\n__\n')
+        elif tag in ("td", "th"):
+            self.sink.write(' ')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.sink.write('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.sink.write(data)
+
+
+def _is_quote_container(tag: str, attrs) -> bool:
+    if tag not in ("div", "blockquote"):
+        return False
+    for name, value in attrs:
+        if not value:
+            continue
+        if name == "id" and value.lower() in QUOTE_CONTAINER_IDS:
+            return True
+        if name == "class" and QUOTE_CONTAINER_CLASSES.intersection(value.lower().split()):
+            return True
+        if name == "type" and tag == "blockquote" and value.lower() == "cite":
+            return True
+    return False
+
+
+def _feed_html(html: str, sink: _BodyBuilder, stop_at_quote: bool):
+    parser = _HTMLTextExtractor(sink, stop_at_quote)
+    start = 0
+    while start < len(html):
+        # HTMLParser rescans its unparsed buffer on every feed() while a tag,
+        # comment or <style> is open; feeding at least that much again doubles
+        # the buffer per rescan, so the total work stays linear.
+        end = start + max(FEED_CHUNK_SIZE, len(parser.rawdata))
+        parser.feed(html[start:end])
+        if sink.done:
+            return
+        start = end
+    parser.close()
+
+
+def _feed_text(text: str, sink: _BodyBuilder):
+    for start in range(0, len(text), FEED_CHUNK_SIZE):
+        sink.write(text[start:start + FEED_CHUNK_SIZE])
+        if sink.done:
+            return
 
-REGEX_MULTIPLE_NEWLINES = r'\n{3,}'
 
 def strip_html(html: str) -> str:
     if not html: return ""
-    
-    html = re.sub(r'<hr\s*/?>', '\n__\n', html, flags=re.IGNORECASE)
-    html = re.sub(r'<script[^>]>.?</script>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'<style[^>]>.?</style>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'</(p|div|br|li|h[1-6]|tr)>', '\n', html, flags=re.IGNORECASE)
-    html = re.sub(r'<br\s*/?>', '\n', html, flags=re.IGNORECASE)
-    html = re.sub(r'<[^>]+>', ' ', html)
-    html = unescape(html)
-    return html.strip()
+
+    sink = _BodyBuilder(detect_quotes=False)
+    _feed_html(html, sink, stop_at_quote=False)
+    return sink.close()
 
 def strip_quoted_sections(text: str) -> str:
     if not text: return ""
-    
-    patterns = [
-        r'(?:\r\n|\n|^)?\s*On\s+.*(?:at|pukul)\s+.*(?:wrote|menulis):?\s*[\s\S]*',
-        r'(?:\r\n|\n|^)?\s*On\s+.*(?:wrote|menulis):?\s*[\s\S]*',
-        r'(?:\r\n|\n|^)?\s*Pada\s+.*menulis:\s*[\s\S]*',
-        r'(?:\r\n|\n|^)?\s*From:\s*.*\n?Sent:\s*.*\n?To:\s*.*[\s\S]*',
-        r'(?:\r\n|\n|^)?\s*Dari:\s*.*\n?Kirim:\s*.*\n?Kepada:\s*.*[\s\S]*',
-        r'\n\s*_{3,}[\s\S]*',         
-        r'\n\s*-{3,}\s*Original Message\s*-{3,}[\s\S]*', 
-        r'\n\s*>[\s\S]*',
-    ]
-    
-    for pattern in patterns:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
-    
-    return text.strip()
+
+    sink = _BodyBuilder()
+    _feed_text(text, sink)
+    return sink.close()
 
 def sanitize_email_body(text_plain: str, html: str, max_chars: int = 6000) -> str:
-    body = text_plain.strip() if text_plain else strip_html(html)
-    
-    body = strip_quoted_sections(body)
-    body = re.sub(r'\s{2,}', ' ', body)
-    body = re.sub(REGEX_MULTIPLE_NEWLINES, '\n\n', body)
-    
-    return body[:max_chars].strip()
\ No newline at end of file
+    sink = _BodyBuilder(max_chars=max_chars)
+    if text_plain and text_plain.strip():
+        _feed_text(text_plain, sink)
+    elif html:
+        _feed_html(html, sink, stop_at_quote=True)
+    return sink.close()
@@ -1,16 +1,19 @@
-import re
 import logging
+from typing import Optional
 from app.core.config import settings
 from app.adapters.base import BaseAdapter
-from app.adapters.utils import split_text_smartly, make_meta_request
+from app.adapters.markdown import parse_markdown, render_plain
+from app.core.tracing import traced
+from app.adapters.utils import iter_chunks, make_meta_request, open_stream, CHANNEL_LIMITS
 
 logger = logging.getLogger("adapters.instagram")
 
 class InstagramAdapter(BaseAdapter):
-    def __init__(self):
+    def __init__(self, page_id: Optional[str] = None, access_token: Optional[str] = None, session=None):
         self.version = "v24.0"
-        self.base_url = f"https://graph.instagram.com/{self.version}/{settings.INSTAGRAM_CHATBOT_ID}/messages"
-        self.token = settings.INSTAGRAM_PAGE_ACCESS_TOKEN
+        self.base_url = f"{settings.INSTAGRAM_GRAPH_BASE_URL.rstrip('/')}/{self.version}/{page_id or settings.INSTAGRAM_CHATBOT_ID}/messages"
+        self.token = access_token or settings.INSTAGRAM_PAGE_ACCESS_TOKEN
+        self.session = session
 
     def _clean_id(self, user_id: str) -> str:
         return user_id.replace('@instagram.com', '').strip()
@@ -18,26 +21,25 @@ class InstagramAdapter(BaseAdapter):
     def send_typing_on(self, recipient_id: str, message_id: str = None):
         if not self.token: return
         payload = {"recipient": {"id": self._clean_id(recipient_id)}, "sender_action": "typing_on"}
-        make_meta_request("POST", self.base_url, self.token, payload)
+        make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
 
     def send_typing_off(self, recipient_id: str):
         if not self.token: return
         payload = {"recipient": {"id": self._clean_id(recipient_id)}, "sender_action": "typing_off"}
-        make_meta_request("POST", self.base_url, self.token, payload)
+        make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
 
+    @traced("instagram.send_message")
     def send_message(self, recipient_id: str, text: str, **kwargs):
         if not self.token: return {"success": False}
         
-        text = re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)
-        chunks = split_text_smartly(text, 1000)
-        
+        text = render_plain(parse_markdown(text))
         results = []
-        for chunk in chunks:
+        for chunk in iter_chunks(text, *CHANNEL_LIMITS["instagram"]):
             payload = {
                 "recipient": {"id": self._clean_id(recipient_id)},
                 "message": {"text": chunk}
             }
-            res = make_meta_request("POST", self.base_url, self.token, payload)
+            res = make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
             results.append(res)
             
         return {"sent": True, "results": results}
@@ -55,4 +57,8 @@ class InstagramAdapter(BaseAdapter):
                 ]
             }
         }
-        return make_meta_request("POST", self.base_url, self.token, payload)
\ No newline at end of file
+        return make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
+
+    def open_media(self, url: str):
+        # Attachment URLs are signed CDN links, no token needed.
+        return open_stream(url, session=self.session)
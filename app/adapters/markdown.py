@@ -0,0 +1,248 @@
+"""Shared markdown pipeline for chatbot answers.
+
+A Dify answer is parsed once into a small, immutable block/inline tree and
+rendered per channel: WhatsApp markup, plain text for Instagram and an HTML
+fragment for email.
+"""
+import re
+from functools import lru_cache
+from html import escape
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+REGEX_FENCE = re.compile(r'^\s*```\s*([\w+-]*)\s*$')
+REGEX_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+REGEX_BULLET = re.compile(r'^(\s*)[-*+•]\s+(.*)$')
+REGEX_ORDERED = re.compile(r'^(\s*)(\d{1,3}[.)])\s+(.*)$')
+REGEX_RULE = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$')
+# The leading lookahead lets the scanner skip plain characters without
+# trying every alternative at each position.
+REGEX_INLINE = re.compile(
+    r'(?=[*_~`\[])(?:'
+    r'\*\*(?P<bold>.+?)\*\*'
+    r'|(?<!\w)__(?P<bold2>.+?)__(?!\w)'
+    r'|~~(?P<strike>.+?)~~'
+    r'|`(?P<code>[^`\n]+)`'
+    r'|\[(?P<label>[^\]\n]+)\]\((?P<url>[^)\s]+)\)'
+    r'|(?<![\w*])\*(?P<em>[^*\s](?:[^*\n]*[^*\s])?)\*(?![\w*])'
+    r'|(?<![\w_])_(?P<em2>[^_\s](?:[^_\n]*[^_\s])?)_(?![\w_])'
+    r')'
+)
+INLINE_MARKERS = ("*", "_", "~", "`", "[")
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:", "tel:")
+
+
+class Inline(NamedTuple):
+    kind: str  # text | bold | italic | strike | code | link
+    text: str = ""
+    children: Tuple["Inline", ...] = ()
+    url: str = ""
+
+
+class Block(NamedTuple):
+    kind: str  # paragraph | heading | bullet | ordered | code | rule | blank
+    inlines: Tuple[Inline, ...] = ()
+    marker: str = ""
+    indent: str = ""
+    text: str = ""
+
+
+def parse_inline(text: str) -> Tuple[Inline, ...]:
+    if not any(marker in text for marker in INLINE_MARKERS):
+        return (Inline("text", text),) if text else ()
+    nodes: List[Inline] = []
+    pos = 0
+    for match in REGEX_INLINE.finditer(text):
+        if match.start() > pos:
+            nodes.append(Inline("text", text[pos:match.start()]))
+        group = match.lastgroup
+        value = match.group(group)
+        if group in ("bold", "bold2"):
+            nodes.append(Inline("bold", children=parse_inline(value)))
+        elif group in ("em", "em2"):
+            nodes.append(Inline("italic", children=parse_inline(value)))
+        elif group == "strike":
+            nodes.append(Inline("strike", children=parse_inline(value)))
+        elif group == "code":
+            nodes.append(Inline("code", value))
+        else:
+            nodes.append(Inline("link", children=parse_inline(match.group("label")), url=value))
+        pos = match.end()
+    if pos < len(text):
+        nodes.append(Inline("text", text[pos:]))
+    return tuple(nodes)
+
+
+@lru_cache(maxsize=256)
+def parse_markdown(text: str) -> Tuple[Block, ...]:
+    blocks: List[Block] = []
+    code_lines: List[str] = []
+    in_code = False
+
+    for line in (text or "").splitlines():
+        if REGEX_FENCE.match(line):
+            if in_code:
+                blocks.append(Block("code", text="\n".join(code_lines)))
+                code_lines = []
+            in_code = not in_code
+            continue
+        if in_code:
+            code_lines.append(line)
+            continue
+
+        if not line.strip():
+            blocks.append(Block("blank"))
+        elif REGEX_RULE.match(line):
+            blocks.append(Block("rule"))
+        elif match := REGEX_HEADING.match(line):
+            blocks.append(Block("heading", parse_inline(match.group(2))))
+        elif match := REGEX_BULLET.match(line):
+            blocks.append(Block("bullet", parse_inline(match.group(2)), indent=match.group(1)))
+        elif match := REGEX_ORDERED.match(line):
+            blocks.append(Block("ordered", parse_inline(match.group(3)), marker=match.group(2), indent=match.group(1)))
+        else:
+            blocks.append(Block("paragraph", parse_inline(line.strip())))
+
+    if in_code:
+        blocks.append(Block("code", text="\n".join(code_lines)))
+    return tuple(blocks)
+
+
+# --- WhatsApp ---
+
+def _inline_whatsapp(nodes: Tuple[Inline, ...]) -> str:
+    out = []
+    for node in nodes:
+        if node.kind == "text":
+            out.append(node.text)
+        elif node.kind == "bold":
+            out.append(f"*{_inline_whatsapp(node.children)}*")
+        elif node.kind == "italic":
+            out.append(f"_{_inline_whatsapp(node.children)}_")
+        elif node.kind == "strike":
+            out.append(f"~{_inline_whatsapp(node.children)}~")
+        elif node.kind == "code":
+            out.append(f"`{node.text}`")
+        else:
+            out.append(_link_text(_inline_whatsapp(node.children), node.url))
+    return "".join(out)
+
+
+def render_whatsapp(blocks: Tuple[Block, ...]) -> str:
+    lines = []
+    for block in blocks:
+        if block.kind == "heading":
+            lines.append(f"*{_inline_plain(block.inlines)}*")
+        elif block.kind == "bullet":
+            lines.append(f"{block.indent}- {_inline_whatsapp(block.inlines)}")
+        elif block.kind == "ordered":
+            lines.append(f"{block.indent}{block.marker} {_inline_whatsapp(block.inlines)}")
+        elif block.kind == "code":
+            lines.append(f"```\n{block.text}\n```")
+        elif block.kind == "rule":
+            lines.append("———")
+        elif block.kind == "blank":
+            lines.append("")
+        else:
+            lines.append(_inline_whatsapp(block.inlines))
+    return "\n".join(lines).strip()
+
+
+# --- Plain text (Instagram) ---
+
+def _inline_plain(nodes: Tuple[Inline, ...]) -> str:
+    out = []
+    for node in nodes:
+        if node.kind in ("text", "code"):
+            out.append(node.text)
+        elif node.kind == "link":
+            out.append(_link_text(_inline_plain(node.children), node.url))
+        else:
+            out.append(_inline_plain(node.children))
+    return "".join(out)
+
+
+def render_plain(blocks: Tuple[Block, ...]) -> str:
+    lines = []
+    for block in blocks:
+        if block.kind == "bullet":
+            lines.append(f"{block.indent}• {_inline_plain(block.inlines)}")
+        elif block.kind == "ordered":
+            lines.append(f"{block.indent}{block.marker} {_inline_plain(block.inlines)}")
+        elif block.kind == "code":
+            lines.append(block.text)
+        elif block.kind == "rule":
+            lines.append("———")
+        elif block.kind == "blank":
+            lines.append("")
+        else:
+            lines.append(_inline_plain(block.inlines))
+    return "\n".join(lines).strip()
+
+
+# --- Email HTML ---
+
+def _inline_html(nodes: Tuple[Inline, ...]) -> str:
+    out = []
+    for node in nodes:
+        if node.kind == "text":
+            out.append(escape(node.text, quote=False))
+        elif node.kind == "bold":
+            out.append(f"<b>{_inline_html(node.children)}</b>")
+        elif node.kind == "italic":
+            out.append(f"<i>{_inline_html(node.children)}</i>")
+        elif node.kind == "strike":
+            out.append(f"<s>{_inline_html(node.children)}</s>")
+        elif node.kind == "code":
+            out.append(f"<code>{escape(node.text, quote=False)}</code>")
+        elif node.url.lower().startswith(SAFE_URL_SCHEMES):
+            out.append(f'<a href="{escape(node.url)}">{_inline_html(node.children)}</a>')
+        else:
+            out.append(_inline_html(node.children))
+    return "".join(out)
+
+
+def render_email_html(blocks: Tuple[Block, ...]) -> str:
+    out = []
+    open_list = None
+    for block in blocks:
+        list_tag = {"bullet": "ul", "ordered": "ol"}.get(block.kind)
+        if open_list and list_tag != open_list:
+            out.append(f"</{open_list}>")
+            open_list = None
+        if list_tag:
+            if not open_list:
+                out.append(f"<{list_tag}>")
+                open_list = list_tag
+            out.append(f"<li>{_inline_html(block.inlines)}</li>")
+        elif block.kind == "heading":
+            out.append(f"<b>{_inline_html(block.inlines)}</b><br>")
+        elif block.kind == "code":
+            out.append(f"<pre>{escape(block.text, quote=False)}</pre>")
+        elif block.kind == "rule":
+            out.append("<hr>")
+        elif block.kind == "blank":
+            out.append("<br>")
+        else:
+            out.append(f"{_inline_html(block.inlines)}<br>")
+    if open_list:
+        out.append(f"</{open_list}>")
+
+    html = "".join(out)
+    while html.endswith("<br>"):
+        html = html[:-4]
+    return html
+
+
+def _link_text(label: str, url: str) -> str:
+    return label if label == url else f"{label} ({url})"
+
+
+RENDERERS: Dict[str, Callable[[Tuple[Block, ...]], str]] = {
+    "whatsapp": render_whatsapp,
+    "instagram": render_plain,
+    "email": render_email_html,
+}
+
+
+def render_markdown(text: str, target: str) -> str:
+    return RENDERERS.get(target, render_plain)(parse_markdown(text))
@@ -1,49 +1,200 @@
+import re
+import unicodedata
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+from urllib.parse import urlsplit
+from typing import Iterable, Iterator, List, Tuple
+
+from app.core.tracing import start_span, inject
 
 logger = logging.getLogger("adapters.utils")
 
-def split_text_smartly(text: str, max_length: int = 4096) -> list[str]:
-    if len(text) <= max_length:
-        return [text]
-
-    chunks = []
-    while text:
-        if len(text) <= max_length:
-            chunks.append(text)
-            break
-
-        split_at = max_length
-        last_newline = text[:max_length].rfind('\n')
-        
-        if last_newline > max_length * 0.7:
-            split_at = last_newline + 1
-        else:
-            last_space = text[:max_length].rfind(' ')
-            if last_space > max_length * 0.7:
-                split_at = last_space + 1
-
-        chunks.append(text[:split_at].strip())
-        text = text[split_at:].strip()
-    
-    return chunks
-
-def make_meta_request(method: str, url: str, token: str, payload: dict = None) -> dict:
-    headers = {
+# (limit, unit) per channel. WhatsApp counts text.body in characters; Instagram
+# rejects messages over 1000 bytes of UTF-8, so it is measured in bytes.
+CHANNEL_LIMITS = {
+    "whatsapp": (4096, "chars"),
+    "instagram": (1000, "bytes"),
+}
+
+CODE_FENCE = "```"
+REGEX_INLINE_SPAN = re.compile(r'(?<!\w)(?:\*[^*\s][^*\n]*\*|_[^_\s][^_\n]*_|~[^~\s][^~\n]*~)(?!\w)')
+SOFT_SPLIT_RATIO = 0.7
+SPAN_LOOKAROUND = 256
+
+
+def _is_regional_indicator(char: str) -> bool:
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def _joins_previous(text: str, index: int) -> bool:
+    """True when text[index] continues the grapheme cluster started before it."""
+    char = text[index]
+    prev = text[index - 1]
+    code = ord(char)
+    return (
+        prev == "\u200d" or char == "\u200d"
+        or 0xFE00 <= code <= 0xFE0F
+        or 0x1F3FB <= code <= 0x1F3FF
+        or 0xE0020 <= code <= 0xE007F
+        or (_is_regional_indicator(char) and _is_regional_indicator(prev))
+        or unicodedata.combining(char) != 0
+    )
+
+
+class _Chunker:
+    """Index-based splitter shared by the one-shot and streaming entry points."""
+
+    def __init__(self, max_length: int, unit: str = "chars"):
+        if unit not in ("chars", "bytes"):
+            raise ValueError(f"Unknown length unit: {unit}")
+        self.max_length = max_length
+        self.unit = unit
+        self.in_fence = False
+
+    def _hard_end(self, text: str, pos: int, budget: int) -> int:
+        window = text[pos:pos + budget]
+        if self.unit == "chars" or window.isascii():
+            return pos + len(window)
+        encoded = window.encode("utf-8")
+        if len(encoded) <= budget:
+            return pos + len(window)
+        # Dropping the partial sequence at the cut leaves only whole code points.
+        return pos + len(encoded[:budget].decode("utf-8", errors="ignore"))
+
+    def _split_point(self, text: str, pos: int, hard: int) -> int:
+        floor = pos + int((hard - pos) * SOFT_SPLIT_RATIO)
+
+        newline = text.rfind('\n', floor, hard)
+        if newline != -1:
+            return newline + 1
+
+        space = text.rfind(' ', floor, hard)
+        if space != -1:
+            # Formatting spans never cross a line, so only the line around the
+            # candidate window is scanned (bounded by SPAN_LOOKAROUND).
+            line_start = max(text.rfind('\n', pos, floor) + 1 or pos, floor - SPAN_LOOKAROUND)
+            line_end = text.find('\n', hard, hard + SPAN_LOOKAROUND)
+            if line_end == -1:
+                line_end = min(len(text), hard + SPAN_LOOKAROUND)
+            spans = [m.span() for m in REGEX_INLINE_SPAN.finditer(text, line_start, line_end)]
+
+        while space != -1:
+            if not any(start < space < end for start, end in spans):
+                return space + 1
+            space = text.rfind(' ', floor, space)
+
+        split = hard
+        while split > pos + 1 and split < len(text) and _joins_previous(text, split):
+            split -= 1
+        return split
+
+    def cut(self, text: str, pos: int = 0, final: bool = True) -> Iterator[Tuple[str, int]]:
+        """Yield (chunk, next_pos) pairs; without ``final`` the short tail is left unconsumed."""
+        size = len(text)
+        reserve = len(CODE_FENCE) + 1 if self.in_fence or CODE_FENCE in text else 0
+        while True:
+            while pos < size and text[pos].isspace():
+                pos += 1
+            if pos >= size:
+                return
+
+            prefix = CODE_FENCE + "\n" if self.in_fence else ""
+            budget = self.max_length - len(prefix) - reserve
+            hard = max(self._hard_end(text, pos, budget), pos + 1)
+            if hard >= size:
+                if not final:
+                    return
+                split = size
+            else:
+                split = self._split_point(text, pos, hard)
+
+            body = text[pos:split].rstrip()
+            if body.count(CODE_FENCE) % 2:
+                self.in_fence = not self.in_fence
+            chunk = prefix + body
+            if self.in_fence and split < size:
+                chunk += "\n" + CODE_FENCE
+            pos = split
+            if body:
+                yield chunk, pos
+
+
+def iter_chunks(text: str, max_length: int = 4096, unit: str = "chars") -> Iterator[str]:
+    if not text:
+        return
+    for chunk, _ in _Chunker(max_length, unit).cut(text):
+        yield chunk
+
+
+def stream_chunks(pieces: Iterable[str], max_length: int = 4096, unit: str = "chars") -> Iterator[str]:
+    """Chunk text that is still arriving (e.g. a streamed Dify answer).
+
+    Pieces are buffered until there is enough text to pick a good split
+    point, so full chunks can be sent before the answer is complete.
+    """
+    chunker = _Chunker(max_length, unit)
+    threshold = 2 * max_length
+    buffered: List[str] = []
+    buffered_len = 0
+    for piece in pieces:
+        if not piece:
+            continue
+        buffered.append(piece)
+        buffered_len += len(piece)
+        if buffered_len < threshold:
+            continue
+        text = ''.join(buffered)
+        pos = 0
+        for chunk, pos in chunker.cut(text, final=False):
+            yield chunk
+        rest = text[pos:]
+        buffered = [rest] if rest else []
+        buffered_len = len(rest)
+
+    text = ''.join(buffered)
+    for chunk, _ in chunker.cut(text):
+        yield chunk
+
+
+def split_text_smartly(text: str, max_length: int = 4096, unit: str = "chars") -> list[str]:
+    return list(iter_chunks(text, max_length, unit))
+
+def new_http_session(pool_size: int = 10) -> requests.Session:
+    """A keep-alive session whose pool holds ``pool_size`` connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def open_stream(url: str, token: str = None, session=None, timeout: float = 30):
+    """GET ``url`` without reading the body; iterate ``iter_content`` and close it."""
+    headers = inject({"Authorization": f"Bearer {token}"} if token else {})
+    resp = (session or requests).get(url, headers=headers, stream=True, timeout=timeout)
+    resp.raise_for_status()
+    return resp
+
+def make_meta_request(method: str, url: str, token: str, payload: dict = None, session=None) -> dict:
+    http = session or requests
+    headers = inject({
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
-    }
-    try:
-        if method.upper() == "POST":
-            resp = requests.post(url, json=payload, headers=headers, timeout=10)
-        else:
-            resp = requests.get(url, headers=headers, timeout=10)
-            
-        return {
-            "success": resp.ok,
-            "status_code": resp.status_code,
-            "data": resp.json() if resp.ok else resp.text
-        }
-    except Exception as e:
-        logger.error(f"Meta API Request Error: {e}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+    })
+    with start_span("meta.request", method=method.upper(), path=urlsplit(url).path) as span:
+        try:
+            if method.upper() == "POST":
+                resp = http.post(url, json=payload, headers=headers, timeout=10)
+            else:
+                resp = http.get(url, headers=headers, timeout=10)
+
+            span.set_attribute("http.status_code", resp.status_code)
+            return {
+                "success": resp.ok,
+                "status_code": resp.status_code,
+                "data": resp.json() if resp.ok else resp.text
+            }
+        except Exception as e:
+            span.record_error(str(e))
+            logger.error("Meta API Request Error: %s", e)
+            return {"success": False, "error": str(e)}
@@ -1,27 +1,29 @@
-import re
+from typing import Optional
 from app.core.config import settings
 from app.adapters.base import BaseAdapter
-from app.adapters.utils import split_text_smartly, make_meta_request
+from app.adapters.markdown import parse_markdown, render_whatsapp
+from app.core.tracing import traced
+from app.adapters.utils import iter_chunks, make_meta_request, open_stream, CHANNEL_LIMITS
 
 class WhatsAppAdapter(BaseAdapter):
-    def __init__(self):
+    def __init__(self, phone_number_id: Optional[str] = None, access_token: Optional[str] = None, session=None):
         self.version = "v24.0"
-        self.base_url = f"https://graph.facebook.com/{self.version}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
-        self.token = settings.WHATSAPP_ACCESS_TOKEN
+        self.graph_url = f"{settings.META_GRAPH_BASE_URL.rstrip('/')}/{self.version}"
+        self.base_url = f"{self.graph_url}/{phone_number_id or settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+        self.token = access_token or settings.WHATSAPP_ACCESS_TOKEN
+        self.session = session
 
     def _convert_markdown(self, text: str) -> str:
-        text = re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)
-        text = re.sub(r'~~(.*?)~~', r'~\1~', text)
-        return text
+        return render_whatsapp(parse_markdown(text))
 
+    @traced("whatsapp.send_message")
     def send_message(self, recipient_id: str, text: str, **kwargs):
         if not self.token: return {"success": False, "error": "No token"}
 
         text = self._convert_markdown(text)
-        chunks = split_text_smartly(text, 4096)
         results = []
 
-        for chunk in chunks:
+        for chunk in iter_chunks(text, *CHANNEL_LIMITS["whatsapp"]):
             payload = {
                 "messaging_product": "whatsapp",
                 "to": recipient_id,
@@ -31,7 +33,7 @@ class WhatsAppAdapter(BaseAdapter):
             if kwargs.get("message_id"):
                 payload["context"] = {"message_id": kwargs["message_id"]}
 
-            res = make_meta_request("POST", self.base_url, self.token, payload)
+            res = make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
             results.append(res)
         
         return {"sent": True, "results": results}
@@ -48,7 +50,7 @@ class WhatsAppAdapter(BaseAdapter):
                     "type":"text"
                 }
             }
-            make_meta_request("POST", self.base_url, self.token, payload)
+            make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
 
     def mark_as_read(self, message_id: str):
         payload = {
@@ -56,7 +58,7 @@ class WhatsAppAdapter(BaseAdapter):
             "status": "read",
             "message_id": message_id
         }
-        make_meta_request("POST", self.base_url, self.token, payload)
+        make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
 
     def send_feedback_request(self, recipient_id: str, message_id: str):
         payload = {
@@ -74,4 +76,13 @@ class WhatsAppAdapter(BaseAdapter):
                 }
             }
         }
-        return make_meta_request("POST", self.base_url, self.token, payload)
\ No newline at end of file
+        return make_meta_request("POST", self.base_url, self.token, payload, session=self.session)
+
+    def media_info(self, media_id: str) -> dict:
+        """Resolves a media id to its short-lived download URL, size, type and sha256."""
+        res = make_meta_request("GET", f"{self.graph_url}/{media_id}", self.token, session=self.session)
+        return res.get("data") if res.get("success") else {}
+
+    def open_media(self, url: str):
+        # Media URLs need the same bearer token as the API.
+        return open_stream(url, self.token, session=self.session)
@@ -1,21 +1,116 @@
+from app.core.config import settings
 from app.services.chatbot import ChatbotClient
 from app.services.orchestrator import MessageOrchestrator
+from app.services.intents import IntentRegistry
+from app.services.threads import EmailThreadResolver
+from app.services.media import MediaIngestor
+from app.services.feedback import FeedbackPipeline
+from app.services.admission import AdmissionController, register_metrics
+from app.core.lanes import Lane, LaneScheduler, set_scheduler
+from app.services.health import ReadinessProbe
+from app.services.tenants import Tenant, TenantRegistry, DEFAULT_TENANT
+from app.repositories.intent import IntentRepository
 from app.adapters.whatsapp import WhatsAppAdapter
 from app.adapters.instagram import InstagramAdapter
 from app.adapters.email.sender import EmailAdapter
+from app.adapters.utils import new_http_session
 
-_wa_adapter = WhatsAppAdapter()
-_ig_adapter = InstagramAdapter()
+_http_session = new_http_session(settings.TENANT_HTTP_POOL_SIZE)
+_wa_adapter = WhatsAppAdapter(session=_http_session)
+_ig_adapter = InstagramAdapter(session=_http_session)
 _email_adapter = EmailAdapter()
-_chatbot_client = ChatbotClient()
+_chatbot_client = ChatbotClient(session=_http_session)
+_intent_registry = IntentRegistry(
+    repo=IntentRepository(),
+    refresh_seconds=settings.INTENT_RULES_REFRESH_SECONDS
+) if settings.INTENT_FASTPATH_ENABLED else None
+_email_threads = EmailThreadResolver(
+    max_entries=settings.EMAIL_THREAD_CACHE_SIZE,
+    miss_ttl=settings.EMAIL_THREAD_MISS_TTL_SECONDS
+)
+_media = MediaIngestor(
+    max_bytes=settings.MEDIA_MAX_BYTES,
+    max_concurrent=settings.MEDIA_MAX_CONCURRENT,
+    cache_size=settings.MEDIA_CACHE_SIZE,
+    spool_bytes=settings.MEDIA_SPOOL_MEMORY_BYTES,
+    chunk_bytes=settings.MEDIA_CHUNK_BYTES
+) if settings.MEDIA_ENABLED else None
+_admission = AdmissionController(
+    limits={
+        "whatsapp": settings.ADMISSION_WHATSAPP_MAX_INFLIGHT,
+        "instagram": settings.ADMISSION_INSTAGRAM_MAX_INFLIGHT,
+    },
+    default_limit=settings.ADMISSION_DEFAULT_MAX_INFLIGHT,
+    overflow=settings.ADMISSION_OVERFLOW,
+    spill_path=settings.ADMISSION_SPILL_PATH
+)
+register_metrics(_admission)
+_adapters = {
+    "whatsapp": _wa_adapter,
+    "instagram": _ig_adapter,
+    "email": _email_adapter
+}
+_tenants = TenantRegistry(
+    default=Tenant(DEFAULT_TENANT, _adapters, _chatbot_client, session=_http_session),
+    path=settings.TENANTS_FILE,
+    refresh_seconds=settings.TENANTS_REFRESH_SECONDS,
+    admission=_admission,
+    http_pool_size=settings.TENANT_HTTP_POOL_SIZE
+)
+_tenants.reload()
+# "generic" API traffic shares the email lane; timeouts run in "maintenance".
+_lanes = LaneScheduler(
+    lanes=[
+        Lane("whatsapp", 0, settings.LANE_WHATSAPP_MAX_WORKERS, settings.LANE_WHATSAPP_DB_CONNECTIONS),
+        Lane("instagram", 0, settings.LANE_INSTAGRAM_MAX_WORKERS, settings.LANE_INSTAGRAM_DB_CONNECTIONS),
+        Lane("email", 1, settings.LANE_EMAIL_MAX_WORKERS, settings.LANE_EMAIL_DB_CONNECTIONS),
+        Lane("maintenance", 2, settings.LANE_MAINTENANCE_MAX_WORKERS, settings.LANE_MAINTENANCE_DB_CONNECTIONS),
+        Lane("feedback", 3, settings.LANE_FEEDBACK_MAX_WORKERS, settings.LANE_FEEDBACK_DB_CONNECTIONS),
+    ],
+    workers=settings.LANE_WORKERS,
+    default_lane="email"
+)
+set_scheduler(_lanes)
+_feedback = FeedbackPipeline(
+    submit=_lanes.submit,
+    flush_seconds=settings.FEEDBACK_FLUSH_SECONDS,
+    batch_size=settings.FEEDBACK_BATCH_SIZE,
+    max_attempts=settings.FEEDBACK_MAX_ATTEMPTS,
+    retry_seconds=settings.FEEDBACK_RETRY_SECONDS,
+    answer_cache_size=settings.FEEDBACK_ANSWER_CACHE_SIZE
+)
+_readiness = ReadinessProbe(
+    admission=_admission,
+    lanes=_lanes,
+    cache_seconds=settings.READINESS_CACHE_SECONDS,
+    db_max_wait_ms=settings.READINESS_DB_MAX_WAIT_MS
+)
+
+def get_admission() -> AdmissionController:
+    return _admission
+
+def get_lanes() -> LaneScheduler:
+    return _lanes
+
+def get_readiness() -> ReadinessProbe:
+    return _readiness
+
+def get_feedback() -> FeedbackPipeline:
+    return _feedback
+
+def get_tenants() -> TenantRegistry:
+    return _tenants
+
+def close_adapters():
+    _tenants.close()
 
 def get_orchestrator() -> MessageOrchestrator:
-    adapters = {
-        "whatsapp": _wa_adapter,
-        "instagram": _ig_adapter,
-        "email": _email_adapter
-    }
     return MessageOrchestrator(
         chatbot=_chatbot_client,
-        adapters=adapters
+        adapters=_adapters,
+        intents=_intent_registry,
+        threads=_email_threads,
+        tenants=_tenants,
+        media=_media,
+        feedback=_feedback
     )
\ No newline at end of file
@@ -1,15 +1,49 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, Request, Query, Response, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, Request, Query, Response, HTTPException
 from app.core.config import settings
 from app.schemas.models import IncomingMessage
-from app.api.dependencies import get_orchestrator
+from app.schemas.record import MessageRecord
+from app.api.dependencies import get_orchestrator, get_admission, get_lanes, get_tenants
+from app.services.admission import admission_key
 from app.api.auth import verify_api_key
 from app.services.orchestrator import MessageOrchestrator
 from app.services.parsers import parse_whatsapp_payload, parse_instagram_payload
+from app.core.tracing import start_span, current_traceparent, TRACEPARENT_HEADER
+from app.core.capture import capture
+from app.core.lifecycle import begin_drain, is_draining
 import logging
 
 logger = logging.getLogger("api.routes")
 router = APIRouter()
 
+def _refuse(status_code: int, detail: str):
+    # Meta retries failed webhook deliveries with backoff, so refusing is safe.
+    raise HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+    )
+
+async def _schedule(platform: str, func, msg: MessageRecord, status_code: int = 503):
+    if is_draining():
+        _refuse(503, "Server is shutting down, retry later")
+    # The task runs on a lane worker, outside the request span.
+    msg.traceparent = current_traceparent() or msg.traceparent
+    tenant = get_tenants().for_message(msg)
+    if not tenant.is_default:
+        # Pins the tenant for the worker (and spill replay) and selects its admission budget.
+        msg.tenant = tenant.key
+    admission = get_admission()
+    key = admission_key(msg)
+    if admission.try_acquire(key):
+        get_lanes().submit(platform, admission.run, key, func, msg)
+        return
+    # Spilling fsyncs the file; off the event loop, since it happens under overload.
+    if await asyncio.to_thread(admission.spill, func.__name__, msg):
+        return
+    logger.warning("Admission limit reached for %s (%d in flight)", key, admission.depth(key))
+    _refuse(status_code, "Too many messages in flight, retry later")
+
 @router.get("/whatsapp/webhook")
 def verify_whatsapp(
     mode: str = Query(..., alias="hub.mode"),
@@ -33,44 +67,58 @@ def verify_instagram(
 @router.post("/whatsapp/webhook")
 async def whatsapp_webhook(
     request: Request,
-    bg_tasks: BackgroundTasks,
     orchestrator: MessageOrchestrator = Depends(get_orchestrator)
 ):
-    data = await request.json()
-    msg = parse_whatsapp_payload(data)
-    
-    if msg:
-        if msg.metadata and msg.metadata.get("is_feedback"):
-            logger.info(f"Feedback Event Received (WA): {msg.metadata['payload']}")
-            bg_tasks.add_task(orchestrator.handle_feedback, msg)
-        else:
-            bg_tasks.add_task(orchestrator.process_message, msg)
-            
+    with start_span("webhook.whatsapp", parent=request.headers.get(TRACEPARENT_HEADER)) as span:
+        data = await request.json()
+        capture("whatsapp", data)
+        msg = parse_whatsapp_payload(data)
+        span.set_attribute("has_message", msg is not None)
+
+        if msg:
+            if msg.is_feedback:
+                logger.info("Feedback Event Received (WA): %s", msg.feedback)
+                # Only buffered here; sent from the low-priority feedback lane.
+                orchestrator.handle_feedback(msg)
+            else:
+                await _schedule(msg.platform, orchestrator.process_message, msg)
+
     return {"status": "ok"}
 
 @router.post("/instagram/webhook")
 async def instagram_webhook(
     request: Request,
-    bg_tasks: BackgroundTasks,
     orchestrator: MessageOrchestrator = Depends(get_orchestrator)
 ):
-    data = await request.json()
-    msg = parse_instagram_payload(data)
-    
-    if msg:
-        if msg.metadata and msg.metadata.get("is_feedback"):
-            logger.info(f"Feedback Event Received (IG): {msg.metadata['payload']}")
-            bg_tasks.add_task(orchestrator.handle_feedback, msg)
-        else:
-            bg_tasks.add_task(orchestrator.process_message, msg)
-            
+    with start_span("webhook.instagram", parent=request.headers.get(TRACEPARENT_HEADER)) as span:
+        data = await request.json()
+        capture("instagram", data)
+        msg = parse_instagram_payload(data)
+        span.set_attribute("has_message", msg is not None)
+
+        if msg:
+            if msg.is_feedback:
+                logger.info("Feedback Event Received (IG): %s", msg.feedback)
+                # Only buffered here; sent from the low-priority feedback lane.
+                orchestrator.handle_feedback(msg)
+            else:
+                await _schedule(msg.platform, orchestrator.process_message, msg)
+
     return {"status": "ok"}
 
 @router.post("/api/messages/process", dependencies=[Depends(verify_api_key)])
 async def process_message_internal(
+    request: Request,
     msg: IncomingMessage,
-    bg_tasks: BackgroundTasks,
     orchestrator: MessageOrchestrator = Depends(get_orchestrator)
 ):
-    bg_tasks.add_task(orchestrator.process_message, msg)
-    return {"status": "queued"}
\ No newline at end of file
+    with start_span("api.process_message", parent=request.headers.get(TRACEPARENT_HEADER)):
+        # The Pydantic model stops here; lanes and the spill file carry the record.
+        await _schedule(msg.platform, orchestrator.process_message, MessageRecord.from_incoming(msg), status_code=429)
+    return {"status": "queued"}
+
+@router.post("/api/admin/drain", dependencies=[Depends(verify_api_key)])
+def drain():
+    # Call from a preStop hook: the health probe turns 503 before SIGTERM arrives.
+    begin_drain()
+    return {"status": "draining", "admission": get_admission().snapshot()}
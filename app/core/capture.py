@@ -0,0 +1,163 @@
+"""Optional capture of inbound traffic for incident reproduction.
+
+When ``CAPTURE_PATH`` is set, the webhook routes and the email listener
+append each raw inbound payload to that file as one compact JSON line:
+
+    {"t": 1741000000.123, "ch": "whatsapp", "body": {...}}
+
+The request path only enqueues; a background thread copies, redacts and
+writes, so capture never waits on disk. The default redaction hook replaces
+phone numbers, Instagram ids, email addresses and profile names with stable
+pseudonyms (the same user always maps to the same value, so conversations
+still group correctly on replay). Replay the file with
+``python -m benchmarks.loadtest.replay``.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("core.capture")
+
+Redactor = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+REGEX_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Keys whose values identify a person, wherever they appear in a payload.
+ID_KEYS = {"from", "wa_id", "recipient_id", "sender_email", "address"}
+NAME_KEYS = {"name", "sender_name"}
+
+_redactors: List[Redactor] = []
+
+
+def pseudonym(value: str, digits: bool = False) -> str:
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+    if digits:
+        return str(int(digest[:15], 16))[:len(value)].rjust(len(value), "0")
+    return digest[:12]
+
+
+def _redact_value(key: str, value: Any) -> Any:
+    if not isinstance(value, str) or not value:
+        return value
+    if key in NAME_KEYS:
+        return f"user-{pseudonym(value)[:8]}"
+    if value.isdigit():
+        return pseudonym(value, digits=True)
+    return REGEX_EMAIL.sub(lambda m: f"user-{pseudonym(m.group(0))[:8]}@redacted.invalid", value)
+
+
+def _walk(node: Any) -> Any:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, str) and (key in ID_KEYS or key in NAME_KEYS):
+                node[key] = _redact_value(key, value)
+            elif key in ("sender", "recipient") and isinstance(value, dict) and "id" in value:
+                value["id"] = _redact_value("id", value["id"])
+            else:
+                _walk(value)
+    elif isinstance(node, list):
+        for item in node:
+            _walk(item)
+    return node
+
+
+def redact_identifiers(channel: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Default hook: pseudonymize ids, addresses and names; message text is kept."""
+    return _walk(payload)
+
+
+def redact_text(channel: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Stricter hook: also replaces message text, keeping only its length."""
+    def scrub(node: Any):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ("body", "text", "content", "subject") and isinstance(value, str):
+                    node[key] = "x" * len(value)
+                else:
+                    scrub(value)
+        elif isinstance(node, list):
+            for item in node:
+                scrub(item)
+    scrub(payload)
+    return payload
+
+
+def register_redactor(func: Redactor):
+    _redactors.append(func)
+
+
+class TrafficCapture:
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="TrafficCapture", daemon=True)
+        self._thread.start()
+
+    def record(self, channel: str, payload: Dict[str, Any]):
+        # Copying, redaction and serialization happen on the writer thread.
+        try:
+            self._queue.put_nowait((time.time(), channel, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, at: float, channel: str, payload: Dict[str, Any]) -> str:
+        entry = copy.deepcopy(payload)
+        for redactor in _redactors:
+            entry = redactor(channel, entry)
+        return json.dumps({"t": round(at, 6), "ch": channel, "body": entry},
+                          ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as fh:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    fh.write(self._encode(*item) + "\n")
+                except Exception as e:
+                    logger.error(f"Capture failed for {item[1]}: {e}")
+                if self._queue.empty():
+                    fh.flush()
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_capture: Optional[TrafficCapture] = None
+
+
+def configure_capture(path: Optional[str], redaction: str = "ids"):
+    global _capture
+    if not path:
+        return
+    _redactors.clear()
+    if redaction in ("ids", "all"):
+        register_redactor(redact_identifiers)
+    if redaction == "all":
+        register_redactor(redact_text)
+    _capture = TrafficCapture(path)
+    logger.info("Capturing inbound traffic to %s (redaction: %s)", path, redaction)
+
+
+def capture(channel: str, payload: Dict[str, Any]):
+    if _capture is not None:
+        _capture.record(channel, payload)
+
+
+def close_capture():
+    global _capture
+    if _capture is not None:
+        _capture.close()
+        _capture = None
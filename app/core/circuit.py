@@ -0,0 +1,86 @@
+"""Minimal circuit breaker for upstream HTTP dependencies.
+
+After ``failure_threshold`` consecutive failures the breaker opens and calls
+fail fast for ``reset_seconds``; then one trial call is let through
+(half-open) and its outcome closes or re-opens the breaker.
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+from app.core.metrics import GaugeFunc
+
+logger = logging.getLogger("core.circuit")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKERS: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._trial_running = False
+        self._lock = threading.Lock()
+        BREAKERS[name] = self
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            # Half-open: a single trial call at a time.
+            if self._trial_running:
+                return False
+            self._state = HALF_OPEN
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self._state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call without a verdict: frees the half-open trial, state unchanged."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning("Circuit %s opened after %d failure(s)", self.name, self.failures)
+                self._state = OPEN
+                self.opened_at = time.monotonic()
+
+
+GaugeFunc(
+    "multikanal_circuit_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ("name",),
+    lambda: {(name,): _STATE_VALUES[breaker.state] for name, breaker in BREAKERS.items()},
+)
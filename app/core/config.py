@@ -7,12 +7,70 @@ class Settings(BaseSettings):
     # App Settings
     APP_NAME: str = "Multikarnal Orchestrator"
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # "text" or "json" (one object per line)
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped instead of blocking
+    LOG_RATE_LIMIT_PER_MINUTE: int = 60  # per INFO/DEBUG message template; 0 disables
     ENABLE_BACKGROUND_WORKER: bool = True 
     X_API_KEY: Optional[str] = None
 
+    # Startup Profiling
+    STARTUP_PROFILE: bool = False
+    STARTUP_BUDGET_MS: int = 1500
+
+    # Tracing ("none", "memory" or "file"; file spans are JSON lines)
+    TRACE_EXPORTER: str = "none"
+    TRACE_FILE_PATH: str = "traces/spans.jsonl"
+
+    # Traffic capture (off unless a path is set); redaction: "ids", "all" or "none"
+    CAPTURE_PATH: Optional[str] = None
+    CAPTURE_REDACTION: Literal["none", "ids", "all"] = "ids"
+
+    # Admission control: in-flight background work per channel before new
+    # messages are rejected (503/429 + Retry-After) or spilled to disk
+    ADMISSION_WHATSAPP_MAX_INFLIGHT: int = 200
+    ADMISSION_INSTAGRAM_MAX_INFLIGHT: int = 200
+    ADMISSION_DEFAULT_MAX_INFLIGHT: int = 100
+    ADMISSION_OVERFLOW: Literal["reject", "spill"] = "reject"
+    ADMISSION_RETRY_AFTER_SECONDS: int = 30
+    ADMISSION_SPILL_PATH: str = "spill/messages.jsonl"
+
+    # Readiness probe (/health/ready): cached check interval and the DB
+    # acquire + ping time above which the instance reports not ready
+    READINESS_CACHE_SECONDS: float = 5.0
+    READINESS_DB_MAX_WAIT_MS: float = 500.0
+    DB_PREWARM_TIMEOUT_SECONDS: float = 10.0
+
+    # Seconds the shutdown waits for queued/running work before checkpointing
+    # what is left to the spill file (keep below the orchestrator's grace period)
+    SHUTDOWN_DRAIN_SECONDS: int = 20
+
+    # Execution lanes: shared worker threads, per-lane worker caps and DB
+    # connection quotas (keep email + maintenance quotas below the pool size)
+    LANE_WORKERS: int = 16
+    LANE_WHATSAPP_MAX_WORKERS: int = 12
+    LANE_INSTAGRAM_MAX_WORKERS: int = 8
+    LANE_EMAIL_MAX_WORKERS: int = 4
+    LANE_MAINTENANCE_MAX_WORKERS: int = 4
+    LANE_FEEDBACK_MAX_WORKERS: int = 2  # concurrent Dify feedback calls
+    LANE_WHATSAPP_DB_CONNECTIONS: int = 6
+    LANE_INSTAGRAM_DB_CONNECTIONS: int = 4
+    LANE_EMAIL_DB_CONNECTIONS: int = 2
+    LANE_MAINTENANCE_DB_CONNECTIONS: int = 1
+    LANE_FEEDBACK_DB_CONNECTIONS: int = 1
+
+    # Feedback buttons: buffered per message and flushed to Dify from the
+    # "feedback" lane
+    FEEDBACK_FLUSH_SECONDS: float = 2.0
+    FEEDBACK_BATCH_SIZE: int = 50  # buffered events that trigger an early flush
+    FEEDBACK_MAX_ATTEMPTS: int = 3
+    FEEDBACK_RETRY_SECONDS: float = 5.0  # first retry delay, doubled per attempt
+    FEEDBACK_ANSWER_CACHE_SIZE: int = 4096  # sessions whose last Dify answer id is kept
+
     # Dify API Configuration
     DIFY_API_BASE_URL: str
     DIFY_API_KEY: str
+    DIFY_CIRCUIT_FAILURES: int = 5  # consecutive failures before failing fast
+    DIFY_CIRCUIT_RESET_SECONDS: float = 30.0
     
     # Database Configuration (Restored)
     DB_HOST: str
@@ -20,10 +78,31 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASS: str
+    DB_POOL_MIN_SIZE: int = 2  # also the pre-warm target at startup
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_AUTOTUNE: bool = False  # grow max size while requests wait for connections
+    DB_POOL_AUTOTUNE_MAX_SIZE: int = 20
+    DB_POOL_TARGET_WAIT_MS: float = 50.0
+    DB_ASYNC_POOL_MAX_SIZE: int = 10  # AsyncDatabase (async repositories)
+    DB_PREPARE_STATEMENTS: bool = True  # disable behind PgBouncer in transaction mode
 
     # Feature Flags
     EMAIL_POLL_INTERVAL_SECONDS: int = 15
     MAX_INPUT_CHARS: int = 6000
+    INTENT_FASTPATH_ENABLED: bool = True
+    INTENT_RULES_REFRESH_SECONDS: int = 60
+    SESSION_TIMEOUT_SECONDS: int = 180
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 30
+    SESSION_SWEEP_BATCH_SIZE: int = 200
+
+    # Media attachments (WhatsApp/Instagram -> Dify file upload, streamed)
+    MEDIA_ENABLED: bool = True
+    MEDIA_MAX_BYTES: int = 15 * 1024 * 1024  # Dify's default upload limit
+    MEDIA_MAX_CONCURRENT: int = 4  # downloads/uploads in flight at once
+    MEDIA_CACHE_SIZE: int = 1024  # content hash -> upload id entries
+    MEDIA_SPOOL_MEMORY_BYTES: int = 1024 * 1024  # larger unhashed files spill to a temp file
+    MEDIA_CHUNK_BYTES: int = 64 * 1024
 
     # Social Media Credentials
     INSTAGRAM_PAGE_ACCESS_TOKEN: Optional[str] = None
@@ -34,12 +113,32 @@ class Settings(BaseSettings):
     WHATSAPP_PHONE_NUMBER_ID: Optional[str] = None
     WHATSAPP_VERIFY_TOKEN: Optional[str] = None
 
+    # API base URLs (overridable for local stand-ins, see benchmarks/loadtest)
+    META_GRAPH_BASE_URL: str = "https://graph.facebook.com"
+    INSTAGRAM_GRAPH_BASE_URL: str = "https://graph.instagram.com"
+    MS_GRAPH_BASE_URL: str = "https://graph.microsoft.com"
+
+    # Tenants: JSON list of agencies sharing this deployment (see
+    # tenants.example.json); unmatched traffic uses the settings above
+    TENANTS_FILE: Optional[str] = None
+    TENANTS_REFRESH_SECONDS: int = 60  # how often the file's mtime is checked
+    TENANT_HTTP_POOL_SIZE: int = 20  # keep-alive connections per host, per tenant
+
     # Email Settings
     EMAIL_PROVIDER: Literal["gmail", "azure_oauth2", "unknown"] = "unknown"
     EMAIL_HOST: str = "smtp.gmail.com"
     EMAIL_PORT: int = 587
     EMAIL_USER: Optional[str] = None
     EMAIL_PASS: Optional[str] = None
+    SMTP_POOL_SIZE: int = 2  # authenticated sessions kept open for replies
+    SMTP_IDLE_SECONDS: float = 60.0  # older idle sessions are closed, not reused
+    EMAIL_THREAD_CACHE_SIZE: int = 2048  # thread key -> conversation LRU entries
+    EMAIL_THREAD_MISS_TTL_SECONDS: float = 10.0  # unknown threads are not re-queried meanwhile
+    GRAPH_BATCH_ENABLED: bool = True  # coalesce Graph replies into $batch calls
+    GRAPH_BATCH_WINDOW_MS: int = 250  # how long the first queued reply waits for company
+    GRAPH_BATCH_MAX_SIZE: int = 20  # Graph caps $batch at 20 requests
+    GRAPH_BATCH_MAX_ATTEMPTS: int = 3  # throttled/failed sends before a reply is dropped
+    GRAPH_BATCH_CLOSE_SECONDS: float = 10.0  # flush budget at shutdown
     
     # Azure OAuth2
     AZURE_CLIENT_ID: Optional[str] = None
@@ -0,0 +1,222 @@
+"""Execution lanes (bulkheads) with a shared priority scheduler.
+
+Every lane has its own worker cap and database connection quota, so a
+backlog in one platform cannot take all threads or all pooled connections.
+Free workers always pick the oldest task of the highest-priority lane that
+is under its cap: interactive chat (priority 0) goes before email (1) and
+session timeouts (2). Scheduling is non-preemptive; a running email task
+keeps its worker, but chat never waits behind queued email.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.metrics import GaugeFunc, Histogram
+
+logger = logging.getLogger("core.lanes")
+
+LANE_QUEUE_WAIT_SECONDS = Histogram(
+    "multikanal_lane_queue_wait_seconds",
+    "Time a task waited in its lane before a worker picked it up.",
+    ("lane",),
+)
+LANE_DB_WAIT_SECONDS = Histogram(
+    "multikanal_lane_db_wait_seconds",
+    "Time spent waiting for the lane's database connection quota.",
+    ("lane",),
+)
+
+current_lane: ContextVar[Optional[str]] = ContextVar("current_lane", default=None)
+
+
+class Lane:
+    def __init__(self, name: str, priority: int, max_workers: int, db_connections: int):
+        self.name = name
+        self.priority = priority
+        self.max_workers = max_workers
+        self.db_connections = db_connections
+        self.pending: Deque[Tuple[int, float, Callable, tuple, dict]] = deque()
+        self.running = 0
+        self.db_slots = threading.BoundedSemaphore(db_connections) if db_connections > 0 else None
+
+
+class LaneScheduler:
+    def __init__(self, lanes: List[Lane], workers: int, default_lane: str, db_wait_timeout: float = 30.0):
+        self.lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self.workers = workers
+        self.default_lane = default_lane
+        self.db_wait_timeout = db_wait_timeout
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._held = threading.local()
+
+    def lane_for(self, name: str) -> Lane:
+        return self.lanes.get(name) or self.lanes[self.default_lane]
+
+    def submit(self, lane_name: str, func: Callable, *args, **kwargs):
+        lane = self.lane_for(lane_name)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Lane scheduler is stopped")
+            if not self._threads:
+                self._start()
+            lane.pending.append((next(self._seq), time.perf_counter(), func, args, kwargs))
+            self._cond.notify()
+
+    def _start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"lane-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_lane(self) -> Optional[Lane]:
+        candidates = [
+            (lane.priority, lane.pending[0][0], lane.name)
+            for lane in self.lanes.values()
+            if lane.pending and lane.running < lane.max_workers
+        ]
+        if not candidates:
+            return None
+        return self.lanes[min(candidates)[2]]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                lane = self._next_lane()
+                while lane is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    lane = self._next_lane()
+                _, queued_at, func, args, kwargs = lane.pending.popleft()
+                lane.running += 1
+
+            LANE_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at, lane.name)
+            token = current_lane.set(lane.name)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error("Task failed in lane %s: %s", lane.name, e)
+            finally:
+                current_lane.reset(token)
+                with self._cond:
+                    lane.running -= 1
+                    # A slot in this lane may unblock a task another worker skipped.
+                    self._cond.notify_all()
+
+    def drain(self, timeout: float) -> List[Tuple[str, Callable, tuple, dict]]:
+        """Waits up to ``timeout`` for queued and running tasks to finish.
+
+        Tasks still queued at the deadline are removed and returned so the
+        caller can checkpoint them; running tasks are left to finish.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while any(lane.pending or lane.running for lane in self.lanes.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            leftovers = [
+                (lane.name, func, args, kwargs)
+                for lane in self.lanes.values()
+                for _, _, func, args, kwargs in lane.pending
+            ]
+            for lane in self.lanes.values():
+                lane.pending.clear()
+            running = sum(lane.running for lane in self.lanes.values())
+        if leftovers or running:
+            logger.warning("Drain deadline reached: %d queued, %d still running", len(leftovers), running)
+        return leftovers
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    @contextmanager
+    def db_quota(self):
+        """Holds one of the current lane's DB connection slots (no-op outside a lane)."""
+        name = current_lane.get()
+        lane = self.lanes.get(name) if name else None
+        # Nested get_connection calls on the same thread reuse the slot already held.
+        depth = getattr(self._held, "depth", 0)
+        if lane is None or lane.db_slots is None or depth:
+            self._held.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._held.depth = depth
+            return
+
+        started = time.perf_counter()
+        acquired = lane.db_slots.acquire(timeout=self.db_wait_timeout)
+        LANE_DB_WAIT_SECONDS.observe(time.perf_counter() - started, lane.name)
+        if not acquired:
+            raise TimeoutError(f"DB connection quota exhausted for lane {lane.name}")
+        self._held.depth = 1
+        try:
+            yield
+        finally:
+            self._held.depth = 0
+            lane.db_slots.release()
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._cond:
+            return {
+                lane.name: {
+                    "queued": len(lane.pending),
+                    "running": lane.running,
+                    "max_workers": lane.max_workers,
+                    "db_connections": lane.db_connections,
+                }
+                for lane in self.lanes.values()
+            }
+
+
+_scheduler: Optional[LaneScheduler] = None
+
+
+def set_scheduler(scheduler: LaneScheduler):
+    global _scheduler
+    _scheduler = scheduler
+
+
+@contextmanager
+def db_quota():
+    if _scheduler is None:
+        yield
+        return
+    with _scheduler.db_quota():
+        yield
+
+
+def _lane_samples():
+    if _scheduler is None:
+        return {}
+    samples = {}
+    for name, state in _scheduler.snapshot().items():
+        samples[(name, "queued")] = state["queued"]
+        samples[(name, "running")] = state["running"]
+        samples[(name, "max_workers")] = state["max_workers"]
+        samples[(name, "saturation")] = round(state["running"] / state["max_workers"], 3) if state["max_workers"] else 0
+    return samples
+
+
+GaugeFunc(
+    "multikanal_lane_tasks",
+    "Queued and running tasks, worker cap and saturation (running / cap) per lane.",
+    ("lane", "state"),
+    _lane_samples,
+)
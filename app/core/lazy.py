@@ -0,0 +1,46 @@
+import importlib
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict
+
+# Deferred import timings (module name -> milliseconds), reported by the startup profiler.
+load_times: Dict[str, float] = {}
+
+
+class LazyModule:
+    """Module proxy that defers the real import until the first attribute access."""
+
+    __slots__ = ("_name", "_module", "_lock")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        with self._lock:
+            if self._module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                if self._name not in load_times:
+                    load_times[self._name] = (time.perf_counter() - started) * 1000
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "deferred"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """Return the module if it is already imported, otherwise a LazyModule proxy."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,23 @@
+"""Process lifecycle state shared by the routes and the health probe.
+
+Draining starts either from ``POST /api/admin/drain`` (e.g. a Kubernetes
+``preStop`` hook, so the pod turns not-ready before SIGTERM) or from the
+lifespan shutdown. From then on new messages are refused with 503 and
+``Retry-After`` so Meta redelivers them to another instance.
+"""
+import logging
+import threading
+
+logger = logging.getLogger("core.lifecycle")
+
+_draining = threading.Event()
+
+
+def begin_drain():
+    if not _draining.is_set():
+        _draining.set()
+        logger.info("Drain started: refusing new work")
+
+
+def is_draining() -> bool:
+    return _draining.is_set()
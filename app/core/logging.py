@@ -1,12 +1,212 @@
+import atexit
+import json
 import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
 from app.core.config import settings
+from app.core.tracing import current_traceparent
+from app.core.metrics import GaugeFunc
 
-def setup_logging():
-    logging.basicConfig(
-        level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
-        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+# Records whose args are all immutable are queued unformatted; the listener
+# thread does the %-interpolation.
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+_STD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["_LazyQueueHandler"] = None
+_rate_limit: Optional["RateLimitFilter"] = None
+_stop_reports = threading.Event()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        # Anything passed through ``extra=`` is kept as a structured field.
+        for key, value in record.__dict__.items():
+            if key not in _STD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most ``limit`` records per message template per window.
+
+    Keyed on the unformatted ``record.msg``, so it works best with %-style
+    calls. Only records below WARNING are limited, and never the ``exempt``
+    loggers (access lines). The next record let through after a quiet window
+    reports how many were dropped as ``suppressed``; ``report`` logs the
+    total dropped since its last call.
+    """
+
+    def __init__(self, limit: int, window_seconds: float = 60.0, exempt: Tuple[str, ...] = ("uvicorn.access",)):
+        super().__init__()
+        self.limit = limit
+        self.window = window_seconds
+        self.exempt = frozenset(exempt)
+        self.suppressed_total = 0
+        self._unreported = 0
+        self._counts: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING or record.name in self.exempt:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                if len(self._counts) > 10000:
+                    self._counts.clear()
+                self._counts[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            self.suppressed_total += 1
+            self._unreported += 1
+            return False
+
+    def report(self):
+        with self._lock:
+            count, self._unreported = self._unreported, 0
+        if count:
+            logging.getLogger("core.logging").warning(
+                "%d log record(s) suppressed by the rate limit (%d per message per %ds)",
+                count, self.limit, int(self.window)
+            )
+
+
+def _report_loop(rate_limit: RateLimitFilter):
+    while not _stop_reports.wait(rate_limit.window):
+        rate_limit.report()
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Enqueues without blocking and without formatting on the caller's thread."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        traceparent = current_traceparent()
+        if traceparent:
+            record.trace_id = traceparent[3:35]
+        if record.args and not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in _iter_args(record.args)):
+            # Mutable arguments could change before the listener formats them.
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _iter_args(args):
+    return args.values() if isinstance(args, dict) else args
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} (+{suppressed} similar suppressed)" if suppressed else line
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return TextFormatter(
+        fmt="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
+
+
+def setup_logging():
+    global _listener, _handler, _rate_limit
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(_build_formatter())
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _handler = _LazyQueueHandler(log_queue)
+    _rate_limit = RateLimitFilter(settings.LOG_RATE_LIMIT_PER_MINUTE)
+    _handler.addFilter(_rate_limit)
+
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
+
+    # uvicorn installs its own synchronous handlers; route them through the queue too.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers.clear()
+        uv_logger.propagate = True
+
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
-logger = logging.getLogger("multikarnal")
\ No newline at end of file
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    if _rate_limit.limit > 0:
+        threading.Thread(target=_report_loop, args=(_rate_limit,), name="log-rate-report", daemon=True).start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Drain queued records and stop the writer thread."""
+    global _listener
+    _stop_reports.set()
+    if _listener is not None:
+        if _rate_limit is not None:
+            _rate_limit.report()
+        _listener.stop()
+        # Late records (other atexit hooks) are written directly from now on.
+        logging.getLogger().handlers[:] = list(_listener.handlers)
+        _listener = None
+
+
+GaugeFunc(
+    "multikanal_log_records_dropped",
+    "Log records dropped because the logging queue was full.",
+    (),
+    lambda: {(): _handler.dropped} if _handler else {},
+)
+GaugeFunc(
+    "multikanal_log_records_suppressed",
+    "INFO/DEBUG log records dropped by the per-message rate limit.",
+    (),
+    lambda: {(): _rate_limit.suppressed_total} if _rate_limit else {},
+)
+
+logger = logging.getLogger("multikarnal")
@@ -0,0 +1,239 @@
+"""Lightweight tracing with W3C ``traceparent`` propagation.
+
+The active span lives in a contextvar, so nested ``start_span`` blocks form a
+tree without passing span objects around. Work that hops to a background task
+or another thread carries ``current_traceparent()`` with it (the routes stamp
+it into ``msg.traceparent``) and resumes the trace with ``parent=``.
+
+Finished spans go to a pluggable exporter chosen by ``TRACE_EXPORTER``:
+``none`` (default, near-zero cost), ``memory`` (ring buffer, for tests and
+debugging) or ``file`` (JSON lines, see ``python -m app.tools.trace_report``).
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("core.tracing")
+
+TRACEPARENT_HEADER = "traceparent"
+REGEX_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "status", "start_ns", "end_ns")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, message: str):
+        self.status = "error"
+        self.attributes["error"] = message
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is off so call sites never need a None check."""
+
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, message: str):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+# --- Exporters ---
+
+class SpanExporter:
+    enabled = True
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NoopExporter(SpanExporter):
+    enabled = False
+
+    def export(self, span: Span):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span.to_dict())
+
+    def get_finished_spans(self) -> List[Dict[str, Any]]:
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """Appends one JSON object per finished span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+_exporter: SpanExporter = NoopExporter()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: SpanExporter):
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    previous.shutdown()
+
+
+def get_exporter() -> SpanExporter:
+    return _exporter
+
+
+def configure_tracing(kind: str, file_path: str = "traces/spans.jsonl"):
+    kind = (kind or "none").lower()
+    if kind == "memory":
+        set_exporter(InMemoryExporter())
+    elif kind == "file":
+        set_exporter(FileExporter(file_path))
+    else:
+        if kind != "none":
+            logger.warning(f"Unknown TRACE_EXPORTER '{kind}', tracing disabled")
+        set_exporter(NoopExporter())
+        return
+    logger.info("Tracing enabled (exporter: %s)", kind)
+
+
+# --- Context propagation ---
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not value:
+        return None
+    match = REGEX_TRACEPARENT.match(value.strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the current ``traceparent`` to outbound HTTP headers (in place)."""
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+@contextmanager
+def start_span(name: str, parent: Optional[str] = None, **attributes) -> Iterator[Any]:
+    """Open a span under ``parent`` (a traceparent string) or the current span."""
+    if not _exporter.enabled:
+        yield NOOP_SPAN
+        return
+
+    remote = parse_traceparent(parent) if parent else None
+    if remote:
+        trace_id, parent_id = remote
+    else:
+        current = _current_span.get()
+        trace_id, parent_id = (current.trace_id, current.span_id) if current else (os.urandom(16).hex(), None)
+
+    span = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        try:
+            _exporter.export(span)
+        except Exception as e:
+            logger.error(f"Span export failed: {e}")
+
+
+def traced(name: str):
+    """Decorator form of ``start_span`` for repository and client methods."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
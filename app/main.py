@@ -1,15 +1,28 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.repositories.base import Database
+from app.core.metrics import render_metrics, CONTENT_TYPE_LATEST
+from app.core.tracing import configure_tracing, set_exporter, NoopExporter
+from app.core.capture import configure_capture, close_capture
+from app.core.lifecycle import begin_drain, is_draining
+from app.repositories.base import Database, AsyncDatabase
 from app.api.routes import router as api_router
+from app.api.dependencies import get_admission, get_orchestrator, get_lanes, get_readiness, get_feedback, close_adapters
 # from app.adapters.email.listener import start_email_listener  # DISABLED
 import logging
+_imports_done = time.perf_counter()
 
 setup_logging()
+configure_tracing(settings.TRACE_EXPORTER, settings.TRACE_FILE_PATH)
+configure_capture(settings.CAPTURE_PATH, settings.CAPTURE_REDACTION)
 logger = logging.getLogger("main")
 
 # --- EMAIL LISTENER DISABLED ---
@@ -33,21 +46,60 @@ logger = logging.getLogger("main")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialize DB Pool
+    lifespan_started = time.perf_counter()
+
+    # Initialize and pre-warm the DB Pool; readiness stays false until this is done
     try:
         Database.initialize()
+        await asyncio.to_thread(Database.prewarm, settings.DB_PREWARM_TIMEOUT_SECONDS)
     except Exception as e:
         logger.error(f"Failed to connect to DB: {e}")
     
+    # Re-feeds spilled messages once channels drop below their high-water mark
+    get_admission().start_drainer(get_orchestrator, get_lanes().submit)
+
     # --- BACKGROUND WORKERS DISABLED ---
     # if settings.ENABLE_BACKGROUND_WORKER:
     #     _setup_email_listener()
     #     # Scheduler is also disabled here
+
+    get_readiness().mark_started()
+
+    if settings.STARTUP_PROFILE:
+        ready = time.perf_counter()
+        logger.info(
+            "Startup profile: imports %.1f ms, lifespan %.1f ms, total %.1f ms (budget %d ms)",
+            (_imports_done - _import_started) * 1000,
+            (ready - lifespan_started) * 1000,
+            (ready - _import_started) * 1000,
+            settings.STARTUP_BUDGET_MS,
+        )
     
     yield
-    
-    # Close DB Pool
+
+    # Drain: refuse new work, let queued and running tasks finish within the
+    # deadline, checkpoint what is left, then close the pool and flush buffers.
+    begin_drain()
+    admission = get_admission()
+    admission.stop_drainer()
+    # Buffered feedback goes onto its lane so the drain below can send it.
+    await asyncio.to_thread(get_feedback().close)
+    leftovers = await asyncio.to_thread(get_lanes().drain, settings.SHUTDOWN_DRAIN_SECONDS)
+    # Always called: it also records which replayed spill messages have run.
+    checkpointed = admission.checkpoint(leftovers)
+    if leftovers:
+        logger.warning("Checkpointed %d queued message(s) for the next start", checkpointed)
+        # Feedback events hold live Dify clients and are not checkpointed.
+        get_feedback().discard(leftovers)
+    get_lanes().stop()
+    await asyncio.to_thread(close_adapters)
+
+    # Close DB Pools
     Database.close()
+    await AsyncDatabase.close()
+    # Flush and close the span exporter and traffic capture
+    set_exporter(NoopExporter())
+    close_capture()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -65,4 +117,20 @@ app.include_router(api_router)
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    if is_draining():
+        return Response(content='{"status":"draining"}', status_code=503, media_type="application/json")
+    return {"status": "ok"}
+
+@app.get("/health/live")
+def health_live():
+    # Process is up and serving; dependencies are the readiness probe's concern.
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def health_ready():
+    status = get_readiness().status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
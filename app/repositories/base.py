@@ -1,44 +1,138 @@
-from psycopg_pool import ConnectionPool
-from contextlib import contextmanager
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
 from app.core.config import settings
+from app.core.metrics import GaugeFunc
+from app.core.lanes import db_quota
 import logging
 
 logger = logging.getLogger("db")
 
+class PoolTuner:
+    """Grows the pool while requests queue for connections, shrinks it back when idle.
+
+    Every ``interval`` seconds it looks at the average wait of the requests
+    that had to queue since the last look. Above ``target_wait_ms`` (and with
+    the pool at its current max) ``max_size`` grows by ``step`` up to
+    ``ceiling``; after ``idle_rounds`` quiet intervals it steps back down
+    towards the configured ``DB_POOL_MAX_SIZE``.
+    """
+
+    def __init__(self, pool: ConnectionPool, floor: int, ceiling: int, target_wait_ms: float,
+                 interval: float = 10.0, step: int = 2, idle_rounds: int = 6):
+        self.pool = pool
+        self.floor = floor
+        self.ceiling = ceiling
+        self.target_wait_ms = target_wait_ms
+        self.interval = interval
+        self.step = step
+        self.idle_rounds = idle_rounds
+        self._quiet = 0
+        self._last = (0, 0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="PoolTuner", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tune()
+            except Exception as e:
+                logger.error("Pool tuning failed: %s", e)
+
+    def tune(self):
+        stats = self.pool.get_stats()
+        queued, wait_ms = stats.get("requests_queued", 0), stats.get("requests_wait_ms", 0)
+        new_queued, new_wait = queued - self._last[0], wait_ms - self._last[1]
+        self._last = (queued, wait_ms)
+        current = self.pool.max_size
+
+        if new_queued and new_wait / new_queued > self.target_wait_ms:
+            self._quiet = 0
+            if current < self.ceiling and stats.get("pool_size", 0) >= current:
+                size = min(self.ceiling, current + self.step)
+                self.pool.resize(self.pool.min_size, size)
+                logger.info("DB pool max_size %s -> %s (avg wait %.0f ms)", current, size, new_wait / new_queued)
+            return
+
+        self._quiet += 1
+        if self._quiet >= self.idle_rounds and current > self.floor:
+            self._quiet = 0
+            size = max(self.floor, current - self.step)
+            self.pool.resize(self.pool.min_size, size)
+            logger.info("DB pool max_size %s -> %s (idle)", current, size)
+
+
+def _conninfo() -> str:
+    return (
+        f"dbname={settings.DB_NAME} "
+        f"user={settings.DB_USER} "
+        f"password={settings.DB_PASS} "
+        f"host={settings.DB_HOST} "
+        f"port={settings.DB_PORT}"
+    )
+
+
+def _conn_args() -> dict:
+    return {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+        # None disables psycopg's automatic preparing (e.g. behind PgBouncer
+        # in transaction mode, where prepared statements do not survive).
+        "prepare_threshold": 5 if settings.DB_PREPARE_STATEMENTS else None
+    }
+
+
 class Database:
     _pool: ConnectionPool = None
+    _tuner: Optional[PoolTuner] = None
+    # Passed to cursor.execute(): prepare hot statements on first use per connection.
+    prepare: bool = settings.DB_PREPARE_STATEMENTS
 
     @classmethod
     def initialize(cls):
         if cls._pool is None:
             logger.info("Initializing Database Connection Pool...")
-            conn_args = {
-                "keepalives": 1,
-                "keepalives_idle": 30,
-                "keepalives_interval": 10,
-                "keepalives_count": 5
-            }
-            
             try:
                 cls._pool = ConnectionPool(
-                    conninfo=(
-                        f"dbname={settings.DB_NAME} "
-                        f"user={settings.DB_USER} "
-                        f"password={settings.DB_PASS} "
-                        f"host={settings.DB_HOST} "
-                        f"port={settings.DB_PORT}"
-                    ),
-                    min_size=1,
-                    max_size=10,
-                    timeout=30,
-                    kwargs=conn_args
+                    conninfo=_conninfo(),
+                    min_size=settings.DB_POOL_MIN_SIZE,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                    kwargs=_conn_args()
                 )
             except Exception as e:
-                logger.error(f"DB Connection Failed: {e}")
+                logger.error("DB Connection Failed: %s", e)
                 raise
 
+            if settings.DB_POOL_AUTOTUNE:
+                cls._tuner = PoolTuner(
+                    cls._pool,
+                    floor=settings.DB_POOL_MAX_SIZE,
+                    ceiling=max(settings.DB_POOL_MAX_SIZE, settings.DB_POOL_AUTOTUNE_MAX_SIZE),
+                    target_wait_ms=settings.DB_POOL_TARGET_WAIT_MS
+                )
+                cls._tuner.start()
+
+    @classmethod
+    def _stop_tuner(cls):
+        if cls._tuner:
+            cls._tuner.stop()
+            cls._tuner = None
+
     @classmethod
     def close(cls):
+        cls._stop_tuner()
         if cls._pool:
             cls._pool.close()
 
@@ -48,5 +142,141 @@ class Database:
         if cls._pool is None:
             cls.initialize()
         
-        with cls._pool.connection() as conn:
-            yield conn
\ No newline at end of file
+        with db_quota(), cls._pool.connection() as conn:
+            yield conn
+
+    @classmethod
+    @contextmanager
+    def pipeline(cls):
+        """Connection in pipeline mode: queued statements go out in one round trip."""
+        with cls.get_connection() as conn:
+            with conn.pipeline():
+                yield conn
+
+    @classmethod
+    def prewarm(cls, timeout: float = 10.0):
+        """Blocks until the pool holds ``min_size`` open connections."""
+        if cls._pool is None:
+            cls.initialize()
+        try:
+            cls._pool.wait(timeout=timeout)
+        except Exception:
+            # psycopg closes a pool that misses its deadline; start over next time.
+            cls._stop_tuner()
+            cls._pool = None
+            raise
+
+    @classmethod
+    def ping(cls, timeout: float = 2.0) -> Optional[float]:
+        """Round trip of acquire + ``SELECT 1`` in ms, or None when unavailable."""
+        if cls._pool is None:
+            return None
+        started = time.perf_counter()
+        try:
+            with cls._pool.connection(timeout=timeout) as conn:
+                conn.execute("SELECT 1")
+        except Exception as e:
+            logger.warning("DB ping failed: %s", e)
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        if cls._pool is None:
+            return {}
+        return cls._pool.get_stats()
+
+
+
+class AsyncDatabase:
+    """``AsyncConnectionPool`` twin of ``Database`` for code running on the event loop.
+
+    The pool is bound to the loop that opens it (the app's loop, on first use).
+    Lane DB quotas are thread based and do not apply here; size the async
+    pool with ``DB_ASYNC_POOL_MAX_SIZE`` instead.
+    """
+    _pool: Optional[AsyncConnectionPool] = None
+    _init_lock: Optional[asyncio.Lock] = None
+    prepare: bool = settings.DB_PREPARE_STATEMENTS
+
+    @classmethod
+    async def initialize(cls):
+        if cls._pool is not None:
+            return
+        if cls._init_lock is None:
+            cls._init_lock = asyncio.Lock()
+        # Coroutines racing on first use would each open a pool; one would leak.
+        async with cls._init_lock:
+            if cls._pool is not None:
+                return
+            logger.info("Initializing Async Database Connection Pool...")
+            pool = AsyncConnectionPool(
+                conninfo=_conninfo(),
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_ASYNC_POOL_MAX_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                kwargs=_conn_args(),
+                open=False
+            )
+            try:
+                await pool.open()
+            except Exception as e:
+                logger.error("Async DB Connection Failed: %s", e)
+                raise
+            cls._pool = pool
+
+    @classmethod
+    async def prewarm(cls, timeout: float = 10.0):
+        """Waits until the pool holds ``min_size`` open connections."""
+        await cls.initialize()
+        try:
+            await cls._pool.wait(timeout=timeout)
+        except Exception:
+            # As in Database.prewarm: the pool was closed, start over next time.
+            cls._pool = None
+            raise
+
+    @classmethod
+    async def close(cls):
+        if cls._pool:
+            await cls._pool.close()
+            cls._pool = None
+
+    @classmethod
+    @asynccontextmanager
+    async def get_connection(cls):
+        if cls._pool is None:
+            await cls.initialize()
+
+        async with cls._pool.connection() as conn:
+            yield conn
+
+    @classmethod
+    @asynccontextmanager
+    async def pipeline(cls):
+        async with cls.get_connection() as conn:
+            async with conn.pipeline():
+                yield conn
+
+
+def _pool_samples():
+    stats = Database.get_stats()
+    if not stats:
+        return {}
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    return {
+        ("size",): size,
+        ("max",): stats.get("pool_max", 0),
+        ("available",): available,
+        ("in_use",): size - available,
+        ("waiting",): stats.get("requests_waiting", 0),
+    }
+
+
+GaugeFunc(
+    "multikanal_db_pool_connections",
+    "Database connection pool state (size, max, available, in_use, waiting requests).",
+    ("state",),
+    _pool_samples,
+)
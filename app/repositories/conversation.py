@@ -1,74 +1,126 @@
 from typing import Optional, List, Tuple
-from app.repositories.base import Database
+from app.repositories.base import Database, AsyncDatabase
+from app.repositories import sql
+from app.core.tracing import traced
 import logging
 
 logger = logging.getLogger("repo.conversation")
 
 class ConversationRepository:
+    @traced("db.get_active_session")
     def get_active_session(self, user_id: str, platform: str) -> Optional[str]:
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT conversation_id
-                        FROM active_conversations
-                        WHERE platform_unique_id = %s AND platform = %s
-                        LIMIT 1
-                        """,
-                        (user_id, platform)
-                    )
+                    cursor.execute(sql.GET_ACTIVE_SESSION, (user_id, platform), prepare=Database.prepare)
                     row = cursor.fetchone()
                     return str(row[0]) if row else None
         except Exception as e:
-            logger.error(f"Error fetching session: {e}")
+            logger.error("Error fetching session: %s", e)
             return None
 
+    @traced("db.save_session")
     def save_session(self, user_id: str, platform: str, conversation_id: str):
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        INSERT INTO active_conversations (platform_unique_id, platform, conversation_id, last_active_at)
-                        VALUES (%s, %s, %s, NOW())
-                        ON CONFLICT (platform_unique_id) 
-                        DO UPDATE SET
-                            conversation_id = EXCLUDED.conversation_id,
-                            last_active_at = NOW()
-                        """,
-                        (user_id, platform, conversation_id)
-                    )
+                    cursor.execute(sql.SAVE_SESSION, (user_id, platform, conversation_id), prepare=Database.prepare)
         except Exception as e:
-            logger.error(f"Error saving session: {e}")
+            logger.error("Error saving session: %s", e)
 
-    def get_stale_sessions(self, seconds: int) -> List[Tuple[str, str, str]]:
+    @traced("db.claim_stale_sessions")
+    def claim_stale_sessions(self, seconds: int, limit: int) -> List[Tuple[str, str, str]]:
+        """Deletes up to ``limit`` sessions idle for ``seconds`` and returns them."""
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT platform_unique_id, platform, conversation_id
-                        FROM active_conversations
-                        WHERE last_active_at < NOW() - make_interval(secs => %s)
-                        LIMIT 50
-                        """,
-                        (seconds,)
-                    )
+                    cursor.execute(sql.CLAIM_STALE_SESSIONS, {"seconds": seconds, "limit": limit}, prepare=Database.prepare)
                     rows = cursor.fetchall()
                     return [(row[0], row[1], row[2]) for row in rows]
         except Exception as e:
-            logger.error(f"Error fetching stale sessions: {e}")
+            logger.error("Error claiming stale sessions: %s", e)
             return []
 
+    @traced("db.restore_sessions")
+    def restore_sessions(self, sessions: List[Tuple[str, str, str]], seconds: int):
+        """Undoes ``claim_stale_sessions`` for ``sessions`` (user_id, platform, conversation_id)."""
+        params = [
+            {"user_id": user_id, "platform": platform, "conversation_id": conversation_id, "seconds": seconds}
+            for user_id, platform, conversation_id in sessions
+        ]
+        try:
+            with Database.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.executemany(sql.RESTORE_SESSION, params)
+        except Exception as e:
+            logger.error("Error restoring %d stale session(s): %s", len(sessions), e)
+
+    @traced("db.clear_session")
     def clear_session(self, user_id: str):
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        "DELETE FROM active_conversations WHERE platform_unique_id = %s",
-                        (user_id,)
-                    )
-                    logger.info(f"Session cleared for user {user_id}")
+                    cursor.execute(sql.CLEAR_SESSION, (user_id,), prepare=Database.prepare)
+                    logger.info("Session cleared for user %s", user_id)
+        except Exception as e:
+            logger.error("Error clearing session for %s: %s", user_id, e)
+
+
+class AsyncConversationRepository:
+    """Same API as ``ConversationRepository`` on ``AsyncDatabase``; methods are coroutines."""
+
+    @traced("db.get_active_session")
+    async def get_active_session(self, user_id: str, platform: str) -> Optional[str]:
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.GET_ACTIVE_SESSION, (user_id, platform), prepare=AsyncDatabase.prepare)
+                    row = await cursor.fetchone()
+                    return str(row[0]) if row else None
+        except Exception as e:
+            logger.error("Error fetching session: %s", e)
+            return None
+
+    @traced("db.save_session")
+    async def save_session(self, user_id: str, platform: str, conversation_id: str):
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.SAVE_SESSION, (user_id, platform, conversation_id), prepare=AsyncDatabase.prepare)
+        except Exception as e:
+            logger.error("Error saving session: %s", e)
+
+    @traced("db.claim_stale_sessions")
+    async def claim_stale_sessions(self, seconds: int, limit: int) -> List[Tuple[str, str, str]]:
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.CLAIM_STALE_SESSIONS, {"seconds": seconds, "limit": limit}, prepare=AsyncDatabase.prepare)
+                    rows = await cursor.fetchall()
+                    return [(row[0], row[1], row[2]) for row in rows]
+        except Exception as e:
+            logger.error("Error claiming stale sessions: %s", e)
+            return []
+
+    @traced("db.restore_sessions")
+    async def restore_sessions(self, sessions: List[Tuple[str, str, str]], seconds: int):
+        params = [
+            {"user_id": user_id, "platform": platform, "conversation_id": conversation_id, "seconds": seconds}
+            for user_id, platform, conversation_id in sessions
+        ]
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.executemany(sql.RESTORE_SESSION, params)
+        except Exception as e:
+            logger.error("Error restoring %d stale session(s): %s", len(sessions), e)
+
+    @traced("db.clear_session")
+    async def clear_session(self, user_id: str):
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.CLEAR_SESSION, (user_id,), prepare=AsyncDatabase.prepare)
+                    logger.info("Session cleared for user %s", user_id)
         except Exception as e:
-            logger.error(f"Error clearing session for {user_id}: {e}")
\ No newline at end of file
+            logger.error("Error clearing session for %s: %s", user_id, e)
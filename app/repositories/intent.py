@@ -0,0 +1,29 @@
+from typing import List, Optional, Dict, Any
+from app.repositories.base import Database
+from app.repositories import sql
+from app.core.tracing import traced
+import logging
+
+logger = logging.getLogger("repo.intent")
+
+class IntentRepository:
+    @traced("db.get_active_rules")
+    def get_active_rules(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with Database.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.GET_ACTIVE_INTENT_RULES)
+                    return [
+                        {
+                            "name": row[0],
+                            "action": row[1],
+                            "keywords": row[2] or [],
+                            "reply": row[3],
+                            "mode": row[4] or "exact",
+                            "priority": row[5] if row[5] is not None else 100
+                        }
+                        for row in cursor.fetchall()
+                    ]
+        except Exception as e:
+            logger.error(f"Error fetching intent rules: {e}")
+            return None
@@ -1,24 +1,30 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List, Set
 from psycopg import errors # Pastikan library psycopg sudah terinstall
-from app.repositories.base import Database
+from app.repositories.base import Database, AsyncDatabase
+from app.repositories import sql
+from app.core.tracing import traced
 from app.core.exceptions import DatabaseError
 import logging
 
 logger = logging.getLogger("repo.message")
 
+def _email_metadata(row) -> Dict[str, str]:
+    return {
+        "subject": row[0], 
+        "in_reply_to": row[1],  
+        "graph_message_id": row[1], # Alias untuk Azure
+        "references": row[2], 
+        "thread_key": row[3]  
+    }
+
 class MessageRepository:
+    @traced("db.is_processed")
     def is_processed(self, message_id: str, platform: str) -> bool:
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
                     try:
-                        cursor.execute(
-                            """
-                            INSERT INTO bkpm.processed_messages (message_id, platform)
-                            VALUES (%s, %s)
-                            """,
-                            (message_id, platform)
-                        )
+                        cursor.execute(sql.INSERT_PROCESSED, (message_id, platform), prepare=Database.prepare)
                         conn.commit()
                         return False 
                         
@@ -32,84 +38,222 @@ class MessageRepository:
             logger.error(f"DB Check Error: {e}")
             return True 
 
+    @traced("db.claim_new")
+    def claim_new(self, message_ids: Iterable[str], platform: str) -> Set[str]:
+        """Marks a batch as processed in one round trip; returns the ids not seen before."""
+        ids = [m for m in message_ids if m]
+        if not ids:
+            return set()
+        try:
+            with Database.pipeline() as conn:
+                cursors = []
+                for message_id in ids:
+                    cursor = conn.cursor()
+                    cursor.execute(sql.CLAIM_PROCESSED, (message_id, platform), prepare=Database.prepare)
+                    cursors.append(cursor)
+                conn.commit()
+                # Results are read only after the whole batch has been sent.
+                return {row[0] for cursor in cursors for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"DB Claim Error: {e}")
+            return set()
+
+    @traced("db.get_conversation_by_azure_thread")
     def get_conversation_by_azure_thread(self, azure_conversation_id: str) -> Optional[str]:
         if not azure_conversation_id: return None
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT conversation_id 
-                        FROM bkpm.email_metadata 
-                        WHERE thread_key = %s 
-                        LIMIT 1
-                        """, 
-                        (azure_conversation_id,)
-                    )
+                    cursor.execute(sql.GET_CONVERSATION_BY_THREAD, (azure_conversation_id,), prepare=Database.prepare)
                     row = cursor.fetchone()
                     return str(row[0]) if row else None
         except Exception as e:
             logger.error(f"Failed to find Azure thread: {e}")
             return None
 
+    @traced("db.get_conversation_by_thread")
     def get_conversation_by_thread(self, thread_key: str) -> Optional[str]:
         return self.get_conversation_by_azure_thread(thread_key)
 
+    @traced("db.find_conversation_by_thread_keys")
+    def find_conversation_by_thread_keys(self, thread_keys: List[str]) -> Optional[str]:
+        """Conversation of the first of ``thread_keys`` that is known."""
+        if not thread_keys: return None
+        keys = list(thread_keys)
+        try:
+            with Database.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.FIND_CONVERSATION_BY_THREAD_KEYS, (keys, keys), prepare=Database.prepare)
+                    row = cursor.fetchone()
+                    return str(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Failed to find email thread: {e}")
+            return None
+
+    @traced("db.save_email_metadata")
     def save_email_metadata(self, conversation_id: str, subject: str, in_reply_to: str, references: str, thread_key: str):
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        INSERT INTO bkpm.email_metadata (conversation_id, subject, in_reply_to, "references", thread_key)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (conversation_id) 
-                        DO UPDATE SET
-                            subject = EXCLUDED.subject,
-                            in_reply_to = EXCLUDED.in_reply_to,
-                            "references" = EXCLUDED."references",
-                            thread_key = EXCLUDED.thread_key,
-                            updated_at = NOW()
-                        """,
-                        (conversation_id, subject, in_reply_to, references, thread_key)
-                    )
+                    cursor.execute(sql.SAVE_EMAIL_METADATA, (conversation_id, subject, in_reply_to, references, thread_key), prepare=Database.prepare)
                     conn.commit()
         except Exception as e:
             logger.error(f"Failed to save email metadata: {e}")
 
+    @traced("db.delete_email_threads")
+    def delete_email_threads(self, thread_keys: List[str]) -> List[str]:
+        """Drops the metadata rows of these threads; returns their conversation ids."""
+        if not thread_keys: return []
+        try:
+            with Database.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.DELETE_EMAIL_THREADS, (list(thread_keys),), prepare=Database.prepare)
+                    rows = cursor.fetchall()
+                    conn.commit()
+                    return [str(row[0]) for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to delete email metadata: {e}")
+            return []
+
+    @traced("db.get_email_metadata")
     def get_email_metadata(self, conversation_id: str) -> Optional[Dict[str, str]]:
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT subject, in_reply_to, "references", thread_key 
-                        FROM bkpm.email_metadata 
-                        WHERE conversation_id = %s 
-                        LIMIT 1
-                        """, 
-                        (conversation_id,)
-                    )
+                    cursor.execute(sql.GET_EMAIL_METADATA, (conversation_id,), prepare=Database.prepare)
                     row = cursor.fetchone()
                     if row:
-                        return {
-                            "subject": row[0], 
-                            "in_reply_to": row[1],  
-                            "graph_message_id": row[1], # Alias untuk Azure
-                            "references": row[2], 
-                            "thread_key": row[3]  
-                        }
+                        return _email_metadata(row)
             return None
         except Exception as e:
             logger.error(f"Failed to get email metadata: {e}")
             return None
 
+    @traced("db.get_latest_answer_id")
     def get_latest_answer_id(self, conversation_id: str) -> Optional[int]:
         try:
             with Database.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT id FROM bkpm.chat_history WHERE session_id = %s ORDER BY created_at DESC LIMIT 1", (conversation_id,))
+                    cursor.execute(sql.GET_LATEST_ANSWER_ID, (conversation_id,), prepare=Database.prepare)
                     row = cursor.fetchone()
                     return int(row[0]) if row else None
         except Exception:
-            return None
\ No newline at end of file
+            return None
+
+
+class AsyncMessageRepository:
+    """Same API as ``MessageRepository`` on ``AsyncDatabase``; methods are coroutines."""
+
+    @traced("db.is_processed")
+    async def is_processed(self, message_id: str, platform: str) -> bool:
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    try:
+                        await cursor.execute(sql.INSERT_PROCESSED, (message_id, platform), prepare=AsyncDatabase.prepare)
+                        await conn.commit()
+                        return False
+                    except errors.UniqueViolation:
+                        await conn.rollback()
+                        return True
+        except Exception as e:
+            if "duplicate key" in str(e).lower():
+                return True
+            logger.error(f"DB Check Error: {e}")
+            return True
+
+    @traced("db.claim_new")
+    async def claim_new(self, message_ids: Iterable[str], platform: str) -> Set[str]:
+        ids = [m for m in message_ids if m]
+        if not ids:
+            return set()
+        try:
+            async with AsyncDatabase.pipeline() as conn:
+                cursors = []
+                for message_id in ids:
+                    cursor = conn.cursor()
+                    await cursor.execute(sql.CLAIM_PROCESSED, (message_id, platform), prepare=AsyncDatabase.prepare)
+                    cursors.append(cursor)
+                await conn.commit()
+                return {row[0] for cursor in cursors for row in await cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"DB Claim Error: {e}")
+            return set()
+
+    @traced("db.get_conversation_by_azure_thread")
+    async def get_conversation_by_azure_thread(self, azure_conversation_id: str) -> Optional[str]:
+        if not azure_conversation_id: return None
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.GET_CONVERSATION_BY_THREAD, (azure_conversation_id,), prepare=AsyncDatabase.prepare)
+                    row = await cursor.fetchone()
+                    return str(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Failed to find Azure thread: {e}")
+            return None
+
+    @traced("db.get_conversation_by_thread")
+    async def get_conversation_by_thread(self, thread_key: str) -> Optional[str]:
+        return await self.get_conversation_by_azure_thread(thread_key)
+
+    @traced("db.find_conversation_by_thread_keys")
+    async def find_conversation_by_thread_keys(self, thread_keys: List[str]) -> Optional[str]:
+        if not thread_keys: return None
+        keys = list(thread_keys)
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.FIND_CONVERSATION_BY_THREAD_KEYS, (keys, keys), prepare=AsyncDatabase.prepare)
+                    row = await cursor.fetchone()
+                    return str(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Failed to find email thread: {e}")
+            return None
+
+    @traced("db.save_email_metadata")
+    async def save_email_metadata(self, conversation_id: str, subject: str, in_reply_to: str, references: str, thread_key: str):
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.SAVE_EMAIL_METADATA, (conversation_id, subject, in_reply_to, references, thread_key), prepare=AsyncDatabase.prepare)
+                    await conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to save email metadata: {e}")
+
+    @traced("db.delete_email_threads")
+    async def delete_email_threads(self, thread_keys: List[str]) -> List[str]:
+        if not thread_keys: return []
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.DELETE_EMAIL_THREADS, (list(thread_keys),), prepare=AsyncDatabase.prepare)
+                    rows = await cursor.fetchall()
+                    await conn.commit()
+                    return [str(row[0]) for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to delete email metadata: {e}")
+            return []
+
+    @traced("db.get_email_metadata")
+    async def get_email_metadata(self, conversation_id: str) -> Optional[Dict[str, str]]:
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.GET_EMAIL_METADATA, (conversation_id,), prepare=AsyncDatabase.prepare)
+                    row = await cursor.fetchone()
+                    return _email_metadata(row) if row else None
+        except Exception as e:
+            logger.error(f"Failed to get email metadata: {e}")
+            return None
+
+    @traced("db.get_latest_answer_id")
+    async def get_latest_answer_id(self, conversation_id: str) -> Optional[int]:
+        try:
+            async with AsyncDatabase.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql.GET_LATEST_ANSWER_ID, (conversation_id,), prepare=AsyncDatabase.prepare)
+                    row = await cursor.fetchone()
+                    return int(row[0]) if row else None
+        except Exception:
+            return None
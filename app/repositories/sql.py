@@ -0,0 +1,118 @@
+"""SQL shared by the repositories.
+
+Kept as module constants so every call sends the identical string: psycopg
+caches prepared statements per connection keyed on the query text.
+"""
+
+# --- active_conversations ---
+
+GET_ACTIVE_SESSION = """
+    SELECT conversation_id
+    FROM active_conversations
+    WHERE platform_unique_id = %s AND platform = %s
+    LIMIT 1
+"""
+
+SAVE_SESSION = """
+    INSERT INTO active_conversations (platform_unique_id, platform, conversation_id, last_active_at)
+    VALUES (%s, %s, %s, NOW())
+    ON CONFLICT (platform_unique_id)
+    DO UPDATE SET
+        conversation_id = EXCLUDED.conversation_id,
+        last_active_at = NOW()
+"""
+
+# Claims and removes one batch of expired sessions atomically. SKIP LOCKED
+# leaves rows that a concurrent save_session is upserting; the outer
+# re-check drops rows whose last_active_at moved on while we waited.
+# Backed by idx_active_conversations_last_active_at (migrations/002).
+CLAIM_STALE_SESSIONS = """
+    DELETE FROM active_conversations
+    WHERE platform_unique_id IN (
+        SELECT platform_unique_id
+        FROM active_conversations
+        WHERE last_active_at < NOW() - make_interval(secs => %(seconds)s)
+        ORDER BY last_active_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    AND last_active_at < NOW() - make_interval(secs => %(seconds)s)
+    RETURNING platform_unique_id, platform, conversation_id
+"""
+
+# Puts back claimed sessions whose timeout notice could not be queued. They
+# are stored already expired so the next sweep claims them again; a session
+# the user started meanwhile is kept.
+RESTORE_SESSION = """
+    INSERT INTO active_conversations (platform_unique_id, platform, conversation_id, last_active_at)
+    VALUES (%(user_id)s, %(platform)s, %(conversation_id)s, NOW() - make_interval(secs => %(seconds)s))
+    ON CONFLICT (platform_unique_id) DO NOTHING
+"""
+
+CLEAR_SESSION = "DELETE FROM active_conversations WHERE platform_unique_id = %s"
+
+# --- bkpm.processed_messages / email_metadata / chat_history ---
+
+INSERT_PROCESSED = """
+    INSERT INTO bkpm.processed_messages (message_id, platform)
+    VALUES (%s, %s)
+"""
+
+CLAIM_PROCESSED = """
+    INSERT INTO bkpm.processed_messages (message_id, platform)
+    VALUES (%s, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING message_id
+"""
+
+GET_CONVERSATION_BY_THREAD = """
+    SELECT conversation_id
+    FROM bkpm.email_metadata
+    WHERE thread_key = %s
+    LIMIT 1
+"""
+
+# First match in the caller's order (canonical key first), in one round trip.
+FIND_CONVERSATION_BY_THREAD_KEYS = """
+    SELECT conversation_id
+    FROM bkpm.email_metadata
+    WHERE thread_key = ANY(%s)
+    ORDER BY array_position(%s::text[], thread_key::text)
+    LIMIT 1
+"""
+
+SAVE_EMAIL_METADATA = """
+    INSERT INTO bkpm.email_metadata (conversation_id, subject, in_reply_to, "references", thread_key)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (conversation_id)
+    DO UPDATE SET
+        subject = EXCLUDED.subject,
+        in_reply_to = EXCLUDED.in_reply_to,
+        "references" = EXCLUDED."references",
+        thread_key = EXCLUDED.thread_key,
+        updated_at = NOW()
+"""
+
+DELETE_EMAIL_THREADS = """
+    DELETE FROM bkpm.email_metadata
+    WHERE thread_key = ANY(%s)
+    RETURNING conversation_id
+"""
+
+GET_EMAIL_METADATA = """
+    SELECT subject, in_reply_to, "references", thread_key
+    FROM bkpm.email_metadata
+    WHERE conversation_id = %s
+    LIMIT 1
+"""
+
+GET_LATEST_ANSWER_ID = "SELECT id FROM bkpm.chat_history WHERE session_id = %s ORDER BY created_at DESC LIMIT 1"
+
+# --- bkpm.intent_rules ---
+
+GET_ACTIVE_INTENT_RULES = """
+    SELECT name, action, keywords, reply, match_mode, priority
+    FROM bkpm.intent_rules
+    WHERE is_active
+    ORDER BY priority
+"""
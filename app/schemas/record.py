@@ -0,0 +1,122 @@
+"""Internal message record used from the webhook parsers to the orchestrator.
+
+``IncomingMessage`` (Pydantic, free-form ``metadata`` dict) is only the
+shape of ``/api/messages/process`` and of spill file lines; everything
+queued on the lanes is a ``MessageRecord``: fixed ``__slots__``, one
+attribute per field the pipeline reads, ``None`` for what a platform does
+not have. See ``benchmarks/message_memory.py`` for the per-message cost.
+"""
+from typing import Any, Dict, List, Optional
+
+from app.schemas.models import IncomingMessage
+
+# metadata key -> record attribute; "conversation_id" in metadata is Azure's conversationId.
+_METADATA_FIELDS = {
+    "message_id": "message_id",
+    "channel_id": "channel_id",
+    "sender_name": "sender_name",
+    "media": "media",
+    "tenant": "tenant",
+    "traceparent": "traceparent",
+    "subject": "subject",
+    "in_reply_to": "in_reply_to",
+    "references": "references",
+    "thread_key": "thread_key",
+    "graph_message_id": "graph_message_id",
+    "conversation_id": "graph_conversation_id",
+}
+# Redundant with the record's own fields.
+_DROPPED_METADATA = ("phone", "is_feedback", "payload")
+
+
+class MessageRecord:
+    __slots__ = (
+        "platform", "user_id", "query", "conversation_id",
+        # All platforms: WhatsApp wamid / Instagram mid / email Message-ID, receiving channel, routing.
+        "message_id", "channel_id", "sender_name", "feedback", "media", "tenant", "traceparent",
+        # Email only: subject and thread keys.
+        "subject", "in_reply_to", "references", "thread_key", "graph_message_id", "graph_conversation_id",
+        "extra",
+    )
+
+    def __init__(self, platform: str, user_id: str, query: str, conversation_id: Optional[str] = None,
+                 message_id: Optional[str] = None, channel_id: Optional[str] = None,
+                 sender_name: Optional[str] = None, feedback: Optional[str] = None,
+                 media: Optional[List[Dict[str, Any]]] = None, tenant: Optional[str] = None,
+                 traceparent: Optional[str] = None, subject: Optional[str] = None,
+                 in_reply_to: Optional[str] = None, references: Optional[str] = None,
+                 thread_key: Optional[str] = None, graph_message_id: Optional[str] = None,
+                 graph_conversation_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None):
+        self.platform = platform
+        self.user_id = user_id
+        self.query = query
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.sender_name = sender_name
+        self.feedback = feedback  # button payload, None for ordinary messages
+        self.media = media
+        self.tenant = tenant
+        self.traceparent = traceparent
+        self.subject = subject
+        self.in_reply_to = in_reply_to
+        self.references = references
+        self.thread_key = thread_key
+        self.graph_message_id = graph_message_id
+        self.graph_conversation_id = graph_conversation_id
+        self.extra = extra  # metadata keys without a field, kept for the round trip
+
+    @property
+    def is_feedback(self) -> bool:
+        return self.feedback is not None
+
+    @classmethod
+    def from_metadata(cls, platform: str, user_id: str, query: str, conversation_id: Optional[str] = None,
+                      metadata: Optional[Dict[str, Any]] = None) -> "MessageRecord":
+        record = cls(platform, user_id, query, conversation_id)
+        if not metadata:
+            return record
+        for key, value in metadata.items():
+            attribute = _METADATA_FIELDS.get(key)
+            if attribute is not None:
+                setattr(record, attribute, value)
+            elif key not in _DROPPED_METADATA:
+                if record.extra is None:
+                    record.extra = {}
+                record.extra[key] = value
+        if metadata.get("is_feedback"):
+            record.feedback = metadata.get("payload") or ""
+        return record
+
+    @classmethod
+    def from_incoming(cls, msg: IncomingMessage) -> "MessageRecord":
+        return cls.from_metadata(msg.platform, msg.platform_unique_id, msg.query, msg.conversation_id, msg.metadata)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MessageRecord":
+        """Inverse of ``to_dict``."""
+        return cls.from_metadata(
+            data.get("platform", "generic"), data["platform_unique_id"], data["query"],
+            data.get("conversation_id"), data.get("metadata")
+        )
+
+    def metadata(self) -> Dict[str, Any]:
+        metadata = dict(self.extra or {})
+        for key, attribute in _METADATA_FIELDS.items():
+            value = getattr(self, attribute)
+            if value is not None:
+                metadata[key] = value
+        if self.feedback is not None:
+            metadata["is_feedback"] = True
+            metadata["payload"] = self.feedback
+        return metadata
+
+    def to_dict(self) -> Dict[str, Any]:
+        """``IncomingMessage``-shaped dict (spill lines stay readable by older releases)."""
+        return {
+            "platform_unique_id": self.user_id,
+            "query": self.query,
+            "conversation_id": self.conversation_id,
+            "platform": self.platform,
+            "metadata": self.metadata(),
+        }
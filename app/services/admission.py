@@ -0,0 +1,283 @@
+"""Per-channel admission control for background message processing.
+
+Every scheduled message holds a slot for its channel until the background
+task finishes. Past the channel's high-water mark new work is either
+rejected (the route answers 503/429 with ``Retry-After`` and Meta retries
+the delivery later) or spilled to an append-only file that a drainer thread
+feeds back in once the channel has room again.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from app.core.metrics import BACKGROUND_TASKS_PENDING, Counter, GaugeFunc
+from app.schemas.record import MessageRecord
+
+logger = logging.getLogger("service.admission")
+
+ADMISSION_REJECTED = Counter(
+    "multikanal_admission_rejected_total",
+    "Messages refused because the channel was at its high-water mark.",
+    ("platform",),
+)
+ADMISSION_SPILLED = Counter(
+    "multikanal_admission_spilled_total",
+    "Messages written to the spill file because the channel was at its high-water mark.",
+    ("platform",),
+)
+
+
+def admission_key(msg: MessageRecord) -> str:
+    """``<platform>`` or, for a tenant's traffic, ``<platform>:<tenant>``."""
+    return f"{msg.platform}:{msg.tenant}" if msg.tenant else msg.platform
+
+
+class AdmissionController:
+    def __init__(self, limits: Dict[str, int], default_limit: int, overflow: str = "reject",
+                 spill_path: Optional[str] = None):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self._inflight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spilled = 0
+        self._stop = threading.Event()
+        self._drainer: Optional[threading.Thread] = None
+        self._replay: Optional["_Replay"] = None
+
+    def limit(self, platform: str) -> int:
+        # A tenant without its own limit gets a separate budget of the channel's size.
+        limit = self.limits.get(platform)
+        if limit is None:
+            limit = self.limits.get(platform.split(":", 1)[0], self.default_limit)
+        return limit
+
+    def depth(self, platform: str) -> int:
+        return self._inflight.get(platform, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            inflight = dict(self._inflight)
+        channels = set(self.limits) | set(inflight)
+        return {p: {"inflight": inflight.get(p, 0), "limit": self.limit(p)} for p in sorted(channels)}
+
+    def try_acquire(self, platform: str) -> bool:
+        with self._lock:
+            current = self._inflight.get(platform, 0)
+            if current >= self.limit(platform):
+                return False
+            self._inflight[platform] = current + 1
+        BACKGROUND_TASKS_PENDING.inc(platform)
+        return True
+
+    def release(self, platform: str):
+        with self._lock:
+            self._inflight[platform] = max(0, self._inflight.get(platform, 0) - 1)
+        BACKGROUND_TASKS_PENDING.dec(platform)
+
+    def run(self, platform: str, func: Callable, *args, **kwargs):
+        """Background task wrapper that frees the slot taken by ``try_acquire``."""
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.release(platform)
+
+    # --- Spill ---
+
+    def spill(self, handler: str, msg: MessageRecord) -> bool:
+        if self.overflow != "spill" or not self.spill_path or not self._append([(handler, msg)]):
+            ADMISSION_REJECTED.inc(msg.platform)
+            return False
+        ADMISSION_SPILLED.inc(msg.platform)
+        return True
+
+    def checkpoint(self, tasks) -> int:
+        """Writes queued message tasks (from ``LaneScheduler.drain``) to the spill file.
+
+        Besides ``run`` tasks this covers any lane task carrying a
+        ``MessageRecord`` (the email listener's): those mails are already
+        claimed and marked read, so they are replayed through
+        ``process_message``. Checkpointing ignores ``overflow``: on shutdown
+        the file is the only place the messages can go.
+        """
+        entries, replayed = [], []
+        for lane, func, args, _ in tasks:
+            if func == self.run:
+                platform, handler, msg = args
+                entries.append((handler.__name__, msg))
+                self.release(platform)
+                if isinstance(handler, _Replayed):
+                    replayed.append(handler)
+                continue
+            msg = next((arg for arg in args if isinstance(arg, MessageRecord)), None)
+            if msg is not None:
+                entries.append(("process_message", msg))
+        saved = 0
+        if entries:
+            if self.spill_path and self._append(entries):
+                saved = len(entries)
+                # Now in the spill file; the .draining copy would replay them twice.
+                for handler in replayed:
+                    handler.replay.settle(handler.index)
+            else:
+                logger.error("Checkpoint failed, %d queued message(s) lost", len(entries))
+        replay = self._replay
+        if replay is not None:
+            replay.flush()
+        return saved
+
+    def _append(self, entries) -> bool:
+        lines = [
+            json.dumps({"handler": handler, "msg": msg.to_dict()}, ensure_ascii=False, default=str) + "\n"
+            for handler, msg in entries
+        ]
+        try:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._spill_lock:
+                with open(self.spill_path, "a", encoding="utf-8") as fh:
+                    fh.writelines(lines)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                self._spilled += len(lines)
+        except OSError as e:
+            logger.error("Spill failed: %s", e)
+            return False
+        return True
+
+    def spill_backlog(self) -> int:
+        return self._spilled
+
+    def start_drainer(self, get_orchestrator: Callable, submit: Callable, interval: float = 1.0):
+        if not self.spill_path or self._drainer is not None:
+            return
+        self._spilled = self._count_spilled()
+        # Also runs in "reject" mode when a previous shutdown left a checkpoint.
+        if self.overflow != "spill" and not self._spilled:
+            return
+        self._drainer = threading.Thread(
+            target=self._drain_loop, args=(get_orchestrator, submit, interval),
+            name="AdmissionDrainer", daemon=True
+        )
+        self._drainer.start()
+
+    def stop_drainer(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._drainer is not None:
+            self._drainer.join(timeout)
+            self._drainer = None
+
+    def _count_spilled(self) -> int:
+        total = 0
+        for path in (self.spill_path + ".draining", self.spill_path):
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as fh:
+                    total += sum(1 for line in fh if line.strip())
+        return total
+
+    def _drain_loop(self, get_orchestrator: Callable, submit: Callable, interval: float):
+        draining = self.spill_path + ".draining"
+        while not self._stop.wait(interval):
+            try:
+                # A leftover .draining file (crash mid-drain) is finished first.
+                if not os.path.exists(draining):
+                    with self._spill_lock:
+                        if not os.path.exists(self.spill_path):
+                            continue
+                        os.replace(self.spill_path, draining)
+                self._drain_file(draining, get_orchestrator(), submit, interval)
+            except Exception as e:
+                logger.error("Spill drain error: %s", e)
+
+    def _drain_file(self, path: str, orchestrator, submit: Callable, interval: float):
+        with open(path, encoding="utf-8") as fh:
+            lines = [line for line in fh if line.strip()]
+        replay = self._replay = _Replay(path, lines)
+        for index, line in enumerate(lines):
+            entry = json.loads(line)
+            msg = MessageRecord.from_dict(entry["msg"])
+            handler = _Replayed(getattr(orchestrator, entry["handler"]), replay, index)
+            # Wait for room so drained work obeys the same high-water mark.
+            key = admission_key(msg)
+            while not self.try_acquire(key):
+                if self._stop.wait(0.05):
+                    replay.flush()
+                    return
+            submit(msg.platform, self.run, key, handler, msg)
+            with self._spill_lock:
+                self._spilled = max(0, self._spilled - 1)
+        # The file goes only once the messages have run: a crash meanwhile replays them again.
+        while replay.flush():
+            if self._stop.wait(interval):
+                return
+        self._replay = None
+        logger.info("Drained %d spilled message(s)", len(lines))
+
+
+class _Replay:
+    """A ``.draining`` file; a line is removed once its task has run or been checkpointed."""
+
+    def __init__(self, path: str, lines):
+        self.path = path
+        self.lines = lines
+        self.pending = set(range(len(lines)))
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def settle(self, index: int):
+        with self._lock:
+            self.pending.discard(index)
+            self._dirty = True
+
+    def flush(self) -> int:
+        """Rewrites the file with the unsettled lines (removes it when none are left)."""
+        with self._lock:
+            if self._dirty:
+                self._dirty = False
+                if self.pending:
+                    tmp = self.path + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as fh:
+                        fh.writelines(self.lines[i] for i in sorted(self.pending))
+                    os.replace(tmp, self.path)
+                elif os.path.exists(self.path):
+                    os.remove(self.path)
+            return len(self.pending)
+
+
+class _Replayed:
+    """Handler wrapper that settles the message's ``.draining`` line when it returns."""
+
+    def __init__(self, func: Callable, replay: _Replay, index: int):
+        self.func = func
+        self.replay = replay
+        self.index = index
+        self.__name__ = func.__name__
+
+    def __call__(self, *args, **kwargs):
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            # Settled on failure too: a message that crashes its handler is not replayed forever.
+            self.replay.settle(self.index)
+
+def _depth_samples(controller: AdmissionController):
+    samples = {}
+    for platform, state in controller.snapshot().items():
+        samples[(platform, "inflight")] = state["inflight"]
+        samples[(platform, "limit")] = state["limit"]
+    samples[("all", "spilled")] = controller.spill_backlog()
+    return samples
+
+
+def register_metrics(controller: AdmissionController):
+    GaugeFunc(
+        "multikanal_admission_queue",
+        "In-flight messages, high-water mark and spill backlog per channel (for autoscaling).",
+        ("platform", "state"),
+        lambda: _depth_samples(controller),
+    )
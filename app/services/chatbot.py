@@ -1,22 +1,76 @@
 import requests
 import logging
-from typing import Dict, Any, Optional
+import uuid
+from typing import Dict, Any, Iterable, List, Optional
 from app.core.config import settings
+from app.core.tracing import start_span, inject
+from app.core.circuit import CircuitBreaker
 
 logger = logging.getLogger("service.chatbot")
 
+# send_feedback outcomes; only FEEDBACK_RETRY (429, 5xx, network, open circuit) can succeed later.
+FEEDBACK_SENT = "sent"
+FEEDBACK_RETRY = "retry"
+FEEDBACK_REJECTED = "rejected"
+
+class _MultipartBody:
+    """multipart/form-data body streamed from ``chunks``.
+
+    Having a length makes requests send Content-Length and iterate the body
+    instead of reading it into memory; the file part must produce exactly
+    ``size`` bytes.
+    """
+
+    def __init__(self, fields: Dict[str, str], filename: str, mime_type: str, chunks: Iterable[bytes], size: int):
+        boundary = uuid.uuid4().hex
+        filename = filename.replace('"', "'").replace("\r", " ").replace("\n", " ")
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = "".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        )
+        self.head = head.encode()
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+        self.chunks = chunks
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        yield from self.chunks
+        yield self.tail
+
+
+def dify_breaker(name: str = "dify") -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.DIFY_CIRCUIT_FAILURES,
+        reset_seconds=settings.DIFY_CIRCUIT_RESET_SECONDS
+    )
+
+
 class ChatbotClient:
-    def __init__(self):
+    def __init__(self, api_key: Optional[str] = None, session=None, breaker: Optional[CircuitBreaker] = None):
         self.base_url = settings.DIFY_API_BASE_URL.rstrip("/")
-        self.api_key = settings.DIFY_API_KEY
+        self.api_key = api_key or settings.DIFY_API_KEY
+        self.http = session or requests
+        # One breaker per Dify app: clients of the same app key pass the same one.
+        self.breaker = breaker or dify_breaker()
 
-    def send_message(self, query: str, user_id: str, conversation_id: str = None, inputs: dict = None) -> Dict[str, Any]:
+    def send_message(self, query: str, user_id: str, conversation_id: str = None, inputs: dict = None,
+                     files: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         url = f"{self.base_url}/chat-messages"
         
-        headers = {
+        headers = inject({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
-        }
+        })
 
         payload = {
             "inputs": inputs or {},
@@ -24,37 +78,98 @@ class ChatbotClient:
             "response_mode": "blocking",
             "user": user_id,
             "conversation_id": conversation_id if conversation_id else "",
-            "files": []
+            "files": files or []
         }
         
-        logger.info(f"Send to Dify [User: {user_id}]: {query[:50]}...")
+        logger.info("Send to Dify [User: %s]: %.50s...", user_id, query)
+
+        if not self.breaker.allow():
+            logger.warning("Dify circuit open, skipping request for %s", user_id)
+            return {"error": "Dify circuit open"}
         
-        try:
-            response = requests.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Dify API Error: {e}")
-            if e.response:
-                logger.error(f"Response: {e.response.text}")
-            return {"error": str(e)}
+        with start_span("dify.chat_messages", has_conversation=bool(conversation_id)) as span:
+            try:
+                response = self.http.post(url, json=payload, headers=headers, timeout=60)
+                span.set_attribute("http.status_code", response.status_code)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response.json()
+
+            except requests.exceptions.RequestException as e:
+                span.record_error(str(e))
+                # Client errors (4xx) say nothing about Dify's health.
+                if e.response is None or e.response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                logger.error("Dify API Error: %s", e)
+                if e.response:
+                    logger.error("Response: %s", e.response.text)
+                return {"error": str(e)}
             
-    def send_feedback(self, message_id: str, rating: str, user_id: str, content: str = None) -> bool:
+    def upload_file(self, filename: str, mime_type: str, chunks: Iterable[bytes], size: int, user_id: str) -> Optional[str]:
+        """Streams ``size`` bytes to ``/files/upload``; returns the upload file id."""
+        if not self.breaker.allow():
+            logger.warning("Dify circuit open, skipping upload for %s", user_id)
+            return None
+        body = _MultipartBody({"user": user_id}, filename, mime_type, chunks, size)
+        headers = inject({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": body.content_type
+        })
+        with start_span("dify.files_upload", size=size) as span:
+            try:
+                response = self.http.post(f"{self.base_url}/files/upload", data=body, headers=headers, timeout=120)
+                span.set_attribute("http.status_code", response.status_code)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response.json().get("id")
+            except requests.exceptions.RequestException as e:
+                span.record_error(str(e))
+                # Client errors (413, 415, ...) say nothing about Dify's health.
+                if e.response is None or e.response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                logger.error("Dify Upload Error: %s", e)
+                return None
+            except Exception as e:
+                # The body (our download) failed mid-stream or the reply was not an object:
+                # no verdict on Dify, but a half-open trial must not stay claimed.
+                span.record_error(str(e))
+                self.breaker.release()
+                logger.error("Dify Upload Error: %s", e)
+                return None
+
+    def send_feedback(self, message_id: str, rating: str, user_id: str, content: str = None) -> str:
         url = f"{self.base_url}/messages/{message_id}/feedbacks"
-        headers = {
+        headers = inject({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
-        }
+        })
         payload = {
             "rating": rating,
             "user": user_id,
             "content": content
         }
         
-        try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=10)
-            return resp.ok
-        except Exception as e:
-            logger.error(f"Feedback Error: {e}")
-            return False
\ No newline at end of file
+        if not self.breaker.allow():
+            return FEEDBACK_RETRY
+        
+        with start_span("dify.feedback", rating=rating) as span:
+            try:
+                resp = self.http.post(url, json=payload, headers=headers, timeout=10)
+                span.set_attribute("http.status_code", resp.status_code)
+                if resp.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if resp.ok:
+                    return FEEDBACK_SENT
+                logger.error("Feedback Error (%s): %s", resp.status_code, resp.text)
+                return FEEDBACK_RETRY if resp.status_code == 429 or resp.status_code >= 500 else FEEDBACK_REJECTED
+            except Exception as e:
+                span.record_error(str(e))
+                self.breaker.record_failure()
+                logger.error("Feedback Error: %s", e)
+                return FEEDBACK_RETRY
\ No newline at end of file
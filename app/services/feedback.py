@@ -0,0 +1,170 @@
+"""Feedback (like/dislike button replies) -> Dify ``/messages/<id>/feedbacks``.
+
+Webhooks only buffer the event (no DB, no HTTP), keyed by Dify app and
+message so a user tapping twice, or changing their mind, sends one rating:
+the latest. Every ``flush_seconds`` (sooner once ``batch_size`` events are
+waiting) the buffer is handed to the low-priority ``feedback`` lane, whose
+worker cap bounds the concurrent Dify calls and which only runs when the
+chat lanes have nothing queued. Failed sends are retried with exponential
+backoff (429, 5xx and network errors only) unless a newer event for the same
+message has arrived meanwhile.
+
+Button payloads carry the answer's Dify message id; when one does not, the
+last answer this process sent in the session is rated (its Dify
+``message_id`` is remembered from the chat response). Without either the
+event is dropped as ``unresolved``.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.metrics import Counter
+from app.services.chatbot import ChatbotClient, FEEDBACK_SENT, FEEDBACK_RETRY
+from app.services.threads import LRUCache
+
+logger = logging.getLogger("service.feedback")
+
+RATINGS = ("like", "dislike")
+
+FEEDBACK_EVENTS = Counter(
+    "multikanal_feedback_events_total",
+    "Feedback events by outcome (received, deduplicated, sent, retried, failed, unresolved, rejected, dropped).",
+    ("result",),
+)
+
+
+def parse_feedback(payload: Optional[str]) -> Optional[Tuple[str, Optional[str]]]:
+    """``like-<id>`` / ``dislike-<id>`` -> (rating, id or None)."""
+    rating, _, target = (payload or "").partition("-")
+    if rating not in RATINGS:
+        return None
+    return rating, target.strip() or None
+
+
+def _session_key(platform: Optional[str], session_id: Optional[str]) -> str:
+    return f"session:{platform}:{session_id}"
+
+
+class FeedbackPipeline:
+    def __init__(self, submit: Callable, flush_seconds: float = 2.0, batch_size: int = 50, max_attempts: int = 3,
+                 retry_seconds: float = 5.0, lane: str = "feedback", answer_cache_size: int = 4096):
+        self.submit = submit
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lane = lane
+        self.answers = LRUCache(answer_cache_size)  # app key + session -> last Dify message id
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, chatbot: ChatbotClient, user_id: str, rating: str, message_id: Optional[str] = None,
+            session_id: Optional[str] = None, platform: Optional[str] = None) -> bool:
+        # Without a message id the target is "the latest answer in this session".
+        key = (chatbot.api_key, message_id or _session_key(platform, session_id))
+        event = {
+            "chatbot": chatbot,
+            "user_id": user_id,
+            "rating": rating,
+            "message_id": message_id,
+            "session_id": session_id,
+            "platform": platform,
+            "attempt": 0,
+            "due": 0.0,
+            "seq": next(self._seq),
+        }
+        with self._cond:
+            if self._closed:
+                return False
+            if key in self._pending:
+                FEEDBACK_EVENTS.inc("deduplicated")
+            self._pending[key] = event
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feedback-flush", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        FEEDBACK_EVENTS.inc("received")
+        return True
+
+    def remember_answer(self, chatbot: ChatbotClient, session_id: str, platform: str, message_id: Optional[str]):
+        if message_id:
+            self.answers.put(f"{chatbot.api_key}:{_session_key(platform, session_id)}", message_id)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def close(self, timeout: float = 5.0):
+        """Hands everything still buffered (retries included) to the lane and stops."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def discard(self, tasks) -> int:
+        """Counts and logs this pipeline's sends among lane tasks dropped at shutdown."""
+        dropped = [args[1] for _, func, args, _ in tasks if func == self._send]
+        for event in dropped:
+            logger.warning("Feedback from %s dropped at shutdown", event['user_id'])
+        if dropped:
+            FEEDBACK_EVENTS.inc("dropped", amount=len(dropped))
+        return len(dropped)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.flush_seconds)
+                closed = self._closed
+                now = time.monotonic()
+                due = [(key, event) for key, event in self._pending.items() if closed or event["due"] <= now]
+                for key, _ in due:
+                    del self._pending[key]
+            for key, event in due:
+                try:
+                    self.submit(self.lane, self._send, key, event)
+                except RuntimeError as e:
+                    # The lanes are already stopped (late shutdown).
+                    logger.warning("Feedback for %s dropped: %s", key[1], e)
+                    FEEDBACK_EVENTS.inc("failed")
+            if closed:
+                return
+
+    def _send(self, key: Tuple[str, str], event: Dict[str, Any]):
+        message_id = event["message_id"] or self.answers.get(
+            f"{event['chatbot'].api_key}:{_session_key(event['platform'], event['session_id'])}"
+        )
+        if not message_id:
+            logger.info("No answer to rate for %s, feedback dropped", event['user_id'])
+            FEEDBACK_EVENTS.inc("unresolved")
+            return
+        event["message_id"] = message_id
+        result = event["chatbot"].send_feedback(message_id, event["rating"], event["user_id"])
+        if result == FEEDBACK_SENT:
+            FEEDBACK_EVENTS.inc("sent")
+            return
+        if result != FEEDBACK_RETRY:
+            # 4xx: unknown message, bad rating... retrying cannot help.
+            FEEDBACK_EVENTS.inc("rejected")
+            return
+
+        event["attempt"] += 1
+        with self._cond:
+            if self._closed or event["attempt"] >= self.max_attempts:
+                logger.error("Feedback for %s failed after %s attempt(s)", message_id, event['attempt'])
+                FEEDBACK_EVENTS.inc("failed")
+                return
+            current = self._pending.get(key)
+            if current is not None and current["seq"] > event["seq"]:
+                return  # superseded by a newer rating
+            event["due"] = time.monotonic() + self.retry_seconds * 2 ** (event["attempt"] - 1)
+            self._pending[key] = event
+        FEEDBACK_EVENTS.inc("retried")
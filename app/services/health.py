@@ -0,0 +1,92 @@
+"""Readiness probe: DB pool and queue depth, plus upstream circuits.
+
+An open upstream circuit is reported as ``degraded`` but does not fail
+readiness: every replica sees the same Dify outage, and going unready
+everywhere would also shed the webhook acks that can still spill or queue.
+
+Results are cached for ``READINESS_CACHE_SECONDS`` so frequent probes from
+load balancers cost one DB round trip per interval, not one per probe.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.circuit import BREAKERS, OPEN
+from app.core.lanes import LaneScheduler
+from app.core.lifecycle import is_draining
+from app.repositories.base import Database
+from app.services.admission import AdmissionController
+
+logger = logging.getLogger("service.health")
+
+
+class ReadinessProbe:
+    def __init__(self, admission: AdmissionController, lanes: LaneScheduler, cache_seconds: float,
+                 db_max_wait_ms: float):
+        self.admission = admission
+        self.lanes = lanes
+        self.cache_seconds = cache_seconds
+        self.db_max_wait_ms = db_max_wait_ms
+        self.started = False
+        self._cached: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def mark_started(self):
+        self.started = True
+        self._cached = None
+
+    def status(self) -> Dict[str, Any]:
+        # Draining flips immediately; everything else may be a few seconds old.
+        if is_draining():
+            return {"ready": False, "reason": "draining"}
+        if not self.started:
+            return {"ready": False, "reason": "starting"}
+        with self._lock:
+            if self._cached is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+                self._cached = self._evaluate()
+                self._checked_at = time.monotonic()
+            return self._cached
+
+    def _evaluate(self) -> Dict[str, Any]:
+        checks = {
+            "db": self._check_db(),
+            "upstreams": self._check_upstreams(),
+            "queues": self._check_queues(),
+        }
+        return {"ready": all(check["ok"] for check in checks.values()), "checks": checks}
+
+    def _check_db(self) -> Dict[str, Any]:
+        if Database._pool is None:
+            # Startup could not reach the DB; retry here instead of in a request.
+            try:
+                Database.initialize()
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+        # Waiting longer than the threshold would not change the verdict.
+        wait_ms = Database.ping(timeout=self.db_max_wait_ms / 1000)
+        stats = Database.get_stats()
+        return {
+            "ok": wait_ms is not None and wait_ms <= self.db_max_wait_ms,
+            "ping_ms": round(wait_ms, 1) if wait_ms is not None else None,
+            "pool_size": stats.get("pool_size", 0),
+            "pool_available": stats.get("pool_available", 0),
+            "requests_waiting": stats.get("requests_waiting", 0),
+        }
+
+    def _check_upstreams(self) -> Dict[str, Any]:
+        states = {name: breaker.state for name, breaker in BREAKERS.items()}
+        degraded = sorted(name for name, state in states.items() if state == OPEN)
+        return {"ok": True, "degraded": degraded, "circuits": states}
+
+    def _check_queues(self) -> Dict[str, Any]:
+        admission = self.admission.snapshot()
+        saturated = [name for name, state in admission.items() if state["inflight"] >= state["limit"]]
+        return {
+            "ok": not saturated,
+            "saturated": saturated,
+            "admission": admission,
+            "spilled": self.admission.spill_backlog(),
+            "lanes": self.lanes.snapshot(),
+        }
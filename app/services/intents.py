@@ -0,0 +1,178 @@
+import re
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("service.intents")
+
+RESET_KEYWORDS: List[str] = [
+    "terima kasih", "terimakasih", "makasih", "trimakasih", "trims",
+    "thank you", "thankyou", "thanks"
+]
+
+GREETING_KEYWORDS: List[str] = [
+    "halo", "hallo", "helo", "hai", "hi", "hello", "hey",
+    "selamat pagi", "selamat siang", "selamat sore", "selamat malam",
+    "pagi", "siang", "sore", "malam",
+    "assalamualaikum", "assalamu'alaikum", "permisi"
+]
+
+# Courtesy words allowed around an "exact" keyword ("makasih banyak kak 🙏").
+FILLER_WORDS: List[str] = [
+    "ok", "oke", "okay", "baik", "ya", "yah", "kak", "kakak", "min", "admin",
+    "pak", "bu", "bapak", "ibu", "banyak", "sekali", "so", "much", "very"
+]
+
+# Longer messages are never just a courtesy phrase, so "exact" rules skip them.
+MAX_EXACT_LENGTH = 120
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    name: str
+    action: str  # "reset" clears the session after replying, "reply" only answers
+    keywords: Tuple[str, ...]
+    reply: str
+    mode: str = "exact"  # "exact": the whole message; "contains": anywhere, on word boundaries
+    priority: int = 100
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    rule: IntentRule
+    keyword: str
+
+
+DEFAULT_RULES: Tuple[IntentRule, ...] = (
+    IntentRule(
+        name="reset",
+        action="reset",
+        keywords=tuple(RESET_KEYWORDS),
+        reply="Sama-sama! Senang bisa membantu. Sesi percakapan ini telah di-akhiri.",
+        priority=10,
+    ),
+    IntentRule(
+        name="greeting",
+        action="reply",
+        keywords=tuple(GREETING_KEYWORDS),
+        reply="Halo! Ada yang bisa kami bantu terkait layanan investasi dan perizinan berusaha?",
+        priority=20,
+    ),
+)
+
+
+def _keyword_pattern(keywords: Iterable[str]) -> str:
+    # Longest first so "terima kasih" wins over a shorter overlapping keyword.
+    ordered = sorted({k.strip().lower() for k in keywords if k and k.strip()}, key=len, reverse=True)
+    return "|".join(r"\s+".join(re.escape(part) for part in k.split()) for k in ordered)
+
+
+class IntentMatcher:
+    """All rules compiled into two alternations: anchored (exact) and word-bounded (contains).
+
+    The contains alternation finds the leftmost keyword, not the best rule, so
+    a hit is only re-checked against the higher-priority contains rules, one
+    pattern each; messages without any keyword cost a single search.
+    """
+
+    def __init__(self, rules: Iterable[IntentRule]):
+        self.rules = sorted(rules, key=lambda r: r.priority)
+        self._groups = {}
+        exact, contains = [], []
+        self._contains_each: List[Tuple[str, re.Pattern]] = []
+        for index, rule in enumerate(self.rules):
+            pattern = _keyword_pattern(rule.keywords)
+            if not pattern:
+                continue
+            group = f"r{index}"
+            self._groups[group] = rule
+            (contains if rule.mode == "contains" else exact).append(f"(?P<{group}>{pattern})")
+            if rule.mode == "contains":
+                self._contains_each.append(
+                    (group, re.compile(rf"(?<!\w)(?P<{group}>{pattern})(?!\w)", re.IGNORECASE))
+                )
+
+        fillers = _keyword_pattern(FILLER_WORDS)
+        self._exact = re.compile(
+            rf"[\W_]*(?:(?:{fillers})[\W_]+)*(?:{'|'.join(exact)})(?:[\W_]+(?:{fillers}))*[\W_]*",
+            re.IGNORECASE
+        ) if exact else None
+        self._contains = re.compile(
+            rf"(?<!\w)(?:{'|'.join(contains)})(?!\w)", re.IGNORECASE
+        ) if contains else None
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        if not text:
+            return None
+        found = None
+        stripped = text.strip()
+        if self._exact is not None and len(stripped) <= MAX_EXACT_LENGTH:
+            found = self._exact.fullmatch(stripped)
+        if found is None and self._contains is not None:
+            found = self._contains.search(text)
+            if found is not None:
+                found = self._best_contains(text, found)
+        if found is None:
+            return None
+        group = found.lastgroup
+        return IntentMatch(rule=self._groups[group], keyword=found.group(group))
+
+    def _best_contains(self, text: str, found: re.Match) -> re.Match:
+        for group, pattern in self._contains_each:
+            if group == found.lastgroup:
+                return found
+            better = pattern.search(text)
+            if better is not None:
+                return better
+        return found
+
+
+class IntentRegistry:
+    """Holds the current matcher and swaps in DB rules every ``refresh_seconds``."""
+
+    def __init__(self, repo=None, refresh_seconds: int = 60):
+        self.repo = repo
+        self.refresh_seconds = refresh_seconds
+        self._matcher = IntentMatcher(DEFAULT_RULES)
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        self._maybe_refresh()
+        return self._matcher.match(text)
+
+    def reload(self):
+        rows = self.repo.get_active_rules() if self.repo else None
+        if rows is None:
+            return
+        rules = [
+            IntentRule(
+                name=row["name"],
+                action=row["action"],
+                keywords=tuple(row["keywords"]),
+                reply=row["reply"],
+                mode=row["mode"],
+                priority=row["priority"]
+            )
+            for row in rows
+        ]
+        merged = {rule.name: rule for rule in DEFAULT_RULES}
+        merged.update({rule.name: rule for rule in rules})
+        self._matcher = IntentMatcher(merged.values())
+        logger.info("Loaded %d intent rule(s) from DB", len(rules))
+
+    def _maybe_refresh(self):
+        if self.repo is None or time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        # Only one thread reloads; the others keep matching against the current rules.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._loaded_at = time.monotonic()
+            self.reload()
+        except Exception as e:
+            logger.error("Failed to reload intent rules: %s", e)
+        finally:
+            self._lock.release()
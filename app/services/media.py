@@ -0,0 +1,198 @@
+"""Media attachments: Meta download -> Dify ``/files/upload``, streamed.
+
+WhatsApp media ids resolve to a short-lived URL (with size, MIME type and
+sha256); Instagram attachments carry a signed CDN URL and nothing else.
+Bodies move in ``chunk_bytes`` pieces and are never held whole in memory:
+
+- a WhatsApp file whose sha256 is cached is not downloaded at all; on a
+  miss the download is piped straight into the upload
+- an Instagram file is hashed into a spool (memory up to ``spool_bytes``,
+  then a temp file) and only uploaded when the hash is not cached, so
+  forwarded duplicates are uploaded once
+- files over ``max_bytes`` (declared or counted) are skipped
+- at most ``max_concurrent`` transfers run at once, across all lanes
+
+Cached upload ids are keyed by Dify app key + content hash: upload files
+belong to the app's workspace, not to the user who sent them.
+"""
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import threading
+from contextlib import closing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.metrics import Counter
+from app.core.tracing import start_span
+from app.schemas.record import MessageRecord
+from app.services.chatbot import ChatbotClient
+from app.services.threads import LRUCache
+
+logger = logging.getLogger("service.media")
+
+MEDIA_TOTAL = Counter(
+    "multikanal_media_total",
+    "Media attachments by outcome (uploaded, cached, too_large, failed).",
+    ("platform", "result"),
+)
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def dify_file_type(mime_type: Optional[str]) -> str:
+    kind = (mime_type or "").split("/", 1)[0]
+    return kind if kind in ("image", "audio", "video") else "document"
+
+
+def _filename(ref: Dict[str, Any], mime_type: str) -> str:
+    if ref.get("filename"):
+        return ref["filename"]
+    return "lampiran" + (mimetypes.guess_extension(mime_type) or "")
+
+
+def _capped(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Passes ``chunks`` through, failing the upload if they are not exactly ``size`` bytes.
+
+    Raised inside the upload body, so ``upload_file`` reports it as a failed
+    upload; ``size`` was already checked against ``max_bytes``.
+    """
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > size:
+            raise IOError(f"media body larger than the declared {size} bytes")
+        yield chunk
+    if total != size:
+        raise IOError(f"short media body: {total} of {size} bytes")
+
+
+class MediaIngestor:
+    def __init__(self, max_bytes: int, max_concurrent: int = 4, cache_size: int = 1024,
+                 spool_bytes: int = 1 << 20, chunk_bytes: int = 1 << 16):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.chunk_bytes = chunk_bytes
+        self.cache = LRUCache(cache_size)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def files_for(self, msg: MessageRecord, adapter, chatbot: ChatbotClient, user_id: str) -> List[Dict[str, Any]]:
+        """Dify ``files`` entries for the message's attachments (failed ones are left out)."""
+        files = []
+        for ref in msg.media or []:
+            uploaded = self._ingest(msg.platform, ref, adapter, chatbot, user_id)
+            if uploaded:
+                upload_id, mime_type = uploaded
+                files.append({
+                    "type": dify_file_type(mime_type),
+                    "transfer_method": "local_file",
+                    "upload_file_id": upload_id
+                })
+        return files
+
+    def _cached(self, chatbot: ChatbotClient, digest: Optional[str]) -> Optional[str]:
+        return self.cache.get(f"{chatbot.api_key}:{digest}") if digest else None
+
+    def _ingest(self, platform: str, ref: Dict[str, Any], adapter, chatbot: ChatbotClient,
+                user_id: str) -> Optional[Tuple[str, str]]:
+        digest = ref.get("sha256")
+        key = f"{chatbot.api_key}:{digest}" if digest else None
+        while True:
+            cached = self._cached(chatbot, digest)
+            if cached:
+                MEDIA_TOTAL.inc(platform, "cached")
+                return cached, ref.get("mime_type")
+            if key is None:
+                break
+            # The same file arriving twice at once is transferred once.
+            with self._lock:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            if not pending.wait(timeout=60):
+                break
+        try:
+            return self._guarded(platform, ref, adapter, chatbot, user_id)
+        finally:
+            if key is not None:
+                with self._lock:
+                    done = self._inflight.pop(key, None)
+                if done is not None:
+                    done.set()
+
+    def _guarded(self, platform: str, ref: Dict[str, Any], adapter, chatbot: ChatbotClient,
+                 user_id: str) -> Optional[Tuple[str, str]]:
+        try:
+            with self._slots, start_span("media.ingest", platform=platform):
+                return self._transfer(platform, dict(ref), adapter, chatbot, user_id)
+        except MediaTooLarge as e:
+            logger.warning("Media from %s skipped: %s", user_id, e)
+            MEDIA_TOTAL.inc(platform, "too_large")
+        except Exception as e:
+            logger.error("Media ingest failed for %s: %s", user_id, e)
+            MEDIA_TOTAL.inc(platform, "failed")
+        return None
+
+    def _transfer(self, platform: str, ref: Dict[str, Any], adapter, chatbot: ChatbotClient,
+                  user_id: str) -> Optional[Tuple[str, str]]:
+        if ref.get("id"):
+            # WhatsApp: the id resolves to the download URL and the file's facts.
+            info = adapter.media_info(ref["id"]) or {}
+            for key in ("url", "mime_type", "sha256", "file_size"):
+                ref[key] = ref.get(key) or info.get(key)
+            cached = self._cached(chatbot, ref.get("sha256"))
+            if cached:
+                MEDIA_TOTAL.inc(platform, "cached")
+                return cached, ref.get("mime_type")
+        if not ref.get("url"):
+            raise ValueError("media has no download URL")
+        size = int(ref.get("file_size") or 0)
+        if size > self.max_bytes:
+            raise MediaTooLarge(f"{size} bytes declared")
+
+        with closing(adapter.open_media(ref["url"])) as response:
+            if not size and not response.headers.get("Content-Encoding"):
+                size = int(response.headers.get("Content-Length") or 0)
+            if size > self.max_bytes:
+                raise MediaTooLarge(f"{size} bytes declared")
+            mime_type = ref.get("mime_type") or response.headers.get("Content-Type", "").split(";")[0] \
+                or "application/octet-stream"
+            filename = _filename(ref, mime_type)
+            chunks = response.iter_content(self.chunk_bytes)
+
+            digest = ref.get("sha256")
+            if digest and size:
+                upload_id = chatbot.upload_file(filename, mime_type, _capped(chunks, size), size, user_id)
+            else:
+                with tempfile.SpooledTemporaryFile(max_size=self.spool_bytes) as spool:
+                    digest, size = self._spool(chunks, spool)
+                    cached = self._cached(chatbot, digest)
+                    if cached:
+                        MEDIA_TOTAL.inc(platform, "cached")
+                        return cached, mime_type
+                    spool.seek(0)
+                    body = iter(lambda: spool.read(self.chunk_bytes), b"")
+                    upload_id = chatbot.upload_file(filename, mime_type, body, size, user_id)
+
+        if not upload_id:
+            MEDIA_TOTAL.inc(platform, "failed")
+            return None
+        self.cache.put(f"{chatbot.api_key}:{digest}", upload_id)
+        MEDIA_TOTAL.inc(platform, "uploaded")
+        return upload_id, mime_type
+
+    def _spool(self, chunks: Iterable[bytes], spool) -> Tuple[str, int]:
+        sha256 = hashlib.sha256()
+        total = 0
+        for chunk in chunks:
+            total += len(chunk)
+            if total > self.max_bytes:
+                raise MediaTooLarge(f"more than {self.max_bytes} bytes")
+            sha256.update(chunk)
+            spool.write(chunk)
+        return sha256.hexdigest(), total
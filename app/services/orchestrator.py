@@ -1,107 +1,199 @@
 import time
-from typing import Dict, Any, List
-from app.schemas.models import IncomingMessage
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+from app.schemas.record import MessageRecord
 from app.services.chatbot import ChatbotClient
+from app.services.intents import IntentRegistry
+from app.services.threads import EmailThreadResolver
+from app.services.tenants import TenantRegistry, scoped_user_id, split_user_id
+from app.services.media import MediaIngestor
+from app.services.feedback import FeedbackPipeline, parse_feedback
 from app.adapters.base import BaseAdapter
 from app.repositories.conversation import ConversationRepository
 from app.core.config import settings
+from app.core.metrics import PIPELINE_STAGE_SECONDS, MESSAGES_TOTAL
+from app.core.tracing import start_span
 import logging
 
 logger = logging.getLogger("service.orchestrator")
 
-RESET_KEYWORDS: List[str] = [
-    "terima kasih", "terimakasih", "makasih", "trimakasih", "trims",
-    "thank you", "thankyou", "thanks"
-]
+# Chat replies take no extra send arguments; shared instead of a new dict per message.
+_NO_SEND_KWARGS: Dict[str, Any] = {}
+
+@contextmanager
+def _stage(platform: str, stage: str):
+    with start_span(f"stage.{stage}"), PIPELINE_STAGE_SECONDS.time(platform, stage):
+        yield
 
 class MessageOrchestrator:
     def __init__(
         self, 
         chatbot: ChatbotClient,
-        adapters: Dict[str, BaseAdapter]
+        adapters: Dict[str, BaseAdapter],
+        intents: Optional[IntentRegistry] = None,
+        threads: Optional[EmailThreadResolver] = None,
+        tenants: Optional[TenantRegistry] = None,
+        media: Optional[MediaIngestor] = None,
+        feedback: Optional[FeedbackPipeline] = None
     ):
         self.chatbot = chatbot
         self.adapters = adapters
+        self.intents = intents
+        self.threads = threads
+        self.tenants = tenants
+        self.media = media
+        self.feedback = feedback
         self.repo_conv = ConversationRepository()
 
-    def timeout_session(self, user_id: str, platform: str):
-        adapter = self.adapters.get(platform)
+    def _route(self, msg: MessageRecord) -> Tuple[Optional[str], Dict[str, BaseAdapter], ChatbotClient]:
+        """(tenant key, adapters, Dify client) for the message; None is the default tenant."""
+        tenant = self.tenants.for_message(msg) if self.tenants else None
+        if tenant is None or tenant.is_default:
+            return None, self.adapters, self.chatbot
+        return tenant.key, tenant.adapters, tenant.chatbot
+
+    def notify_timeout(self, user_id: str, platform: str):
+        """Sends the session-ended notice; the session row is already gone."""
+        tenant_key, recipient = split_user_id(user_id)
+        adapters = self.tenants.get(tenant_key).adapters if tenant_key and self.tenants else self.adapters
+        adapter = adapters.get(platform)
         if adapter:
             try:
                 timeout_msg = "Sesi Anda telah berakhir. Silakan kirim pesan baru untuk memulai percakapan kembali."
-                adapter.send_message(user_id, timeout_msg)
+                adapter.send_message(recipient, timeout_msg)
             except Exception as e:
-                logger.error(f"Failed to send timeout message to {user_id}: {e}")
-        
-        self.repo_conv.clear_session(user_id)
+                logger.error("Failed to send timeout message to %s: %s", user_id, e)
+
+    def handle_feedback(self, msg: MessageRecord):
+        """Buffers a like/dislike reply; the feedback pipeline sends it later."""
+        parsed = parse_feedback(msg.feedback)
+        if parsed is None or self.feedback is None:
+            return
+        rating, message_id = parsed
+        tenant_key, _, chatbot = self._route(msg)
+        self.feedback.add(
+            chatbot,
+            msg.user_id,
+            rating,
+            message_id=message_id,
+            session_id=scoped_user_id(tenant_key, msg.user_id),
+            platform=msg.platform
+        )
 
-    def handle_feedback(self, msg: IncomingMessage):
-        return
+    def _build_send_kwargs(self, msg: MessageRecord) -> Dict[str, Any]:
+        if msg.platform != "email":
+            return _NO_SEND_KWARGS
+        send_kwargs = {"subject": f"Re: {msg.subject if msg.subject is not None else 'Inquiry'}"}
+        if settings.EMAIL_PROVIDER == "azure_oauth2":
+            send_kwargs["graph_message_id"] = msg.graph_message_id
+        else:
+            send_kwargs["in_reply_to"] = msg.message_id
+            # References keeps the whole chain so mail clients thread the reply.
+            references = f"{msg.references or ''} {msg.message_id or ''}".strip()
+            send_kwargs["references"] = references or None
+        return send_kwargs
 
-    def process_message(self, msg: IncomingMessage):
-        adapter = self.adapters.get(msg.platform)
+    def process_message(self, msg: MessageRecord):
+        tenant_key, adapters, chatbot = self._route(msg)
+        adapter = adapters.get(msg.platform)
         if not adapter: 
+            MESSAGES_TOTAL.inc(msg.platform, "no_adapter")
             return
 
-        user_id = msg.platform_unique_id
-        
-        clean_query = msg.query.strip().lower()
-        
-        is_reset = any(keyword in clean_query for keyword in RESET_KEYWORDS)
+        with start_span("orchestrator.process_message", parent=msg.traceparent, platform=msg.platform) as span:
+            started = time.perf_counter()
+            outcome = "failed"
+            try:
+                outcome = self._process(msg, adapter, chatbot, scoped_user_id(tenant_key, msg.user_id))
+            finally:
+                PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, msg.platform, "total")
+                MESSAGES_TOTAL.inc(msg.platform, outcome)
+                span.set_attribute("outcome", outcome)
 
-        if is_reset:
-            logger.info(f"User {user_id} sent reset keyword. Clearing local session.")
-            
-            reply_text = "Sama-sama! Senang bisa membantu. Sesi percakapan ini telah di-akhiri."
-            adapter.send_message(user_id, reply_text)
-            
-            self.repo_conv.clear_session(user_id)
-            return
+    def _process(self, msg: MessageRecord, adapter: BaseAdapter, chatbot: ChatbotClient, session_id: str) -> str:
+        user_id = msg.user_id
+        platform = msg.platform
+        send_kwargs = self._build_send_kwargs(msg)
+
+        intent = self.intents.match(msg.query) if self.intents else None
+        # Email conversations are per thread, everything else per sender.
+        by_thread = platform == "email" and self.threads is not None
+
+        if intent:
+            logger.info("User %s matched intent '%s'. Answering locally.", user_id, intent.rule.name)
+            with _stage(platform, "adapter_send"):
+                adapter.send_message(user_id, intent.rule.reply, **send_kwargs)
 
-        current_conv_id = self.repo_conv.get_active_session(user_id, msg.platform)
+            if intent.rule.action == "reset":
+                with _stage(platform, "db_write"):
+                    if by_thread:
+                        self.threads.forget(msg)
+                    else:
+                        self.repo_conv.clear_session(session_id)
+            return "intent"
+
+        with _stage(platform, "session_lookup"):
+            if by_thread:
+                current_conv_id = self.threads.resolve(msg)
+            else:
+                current_conv_id = self.repo_conv.get_active_session(session_id, platform)
         
-        try:
-            msg_id = msg.metadata.get("message_id") if msg.metadata else None
-            adapter.send_typing_on(user_id, message_id=msg_id)
-            if msg.platform == "whatsapp" and msg_id and hasattr(adapter, 'mark_as_read'):
-                adapter.mark_as_read(msg_id)
-        except Exception: 
-            pass
+        with _stage(platform, "typing"):
+            try:
+                msg_id = msg.message_id
+                adapter.send_typing_on(user_id, message_id=msg_id)
+                if platform == "whatsapp" and msg_id and hasattr(adapter, 'mark_as_read'):
+                    adapter.mark_as_read(msg_id)
+            except Exception: 
+                pass
 
         inputs = {
-            "platform": msg.platform,
-            "sender_name": msg.metadata.get("sender_name", "Unknown")
+            "platform": platform,
+            "sender_name": msg.sender_name if msg.sender_name is not None else "Unknown"
         }
+
+        files = []
+        if self.media is not None and msg.media:
+            with _stage(platform, "media"):
+                files = self.media.files_for(msg, adapter, chatbot, user_id)
         
-        resp = self.chatbot.send_message(
-            query=msg.query,
-            user_id=user_id,
-            conversation_id=current_conv_id,
-            inputs=inputs
-        )
+        with _stage(platform, "dify_call"):
+            resp = chatbot.send_message(
+                query=msg.query,
+                user_id=user_id,
+                conversation_id=current_conv_id,
+                inputs=inputs,
+                files=files
+            )
         
         if "error" in resp:
-            logger.error(f"Dify Error: {resp['error']}")
-            adapter.send_message(user_id, "Mohon maaf, sistem sedang sibuk. Silakan coba lagi nanti.")
+            logger.error("Dify Error: %s", resp["error"])
+            outcome = "dify_error"
+            with _stage(platform, "adapter_send"):
+                adapter.send_message(user_id, "Mohon maaf, sistem sedang sibuk. Silakan coba lagi nanti.")
         else:
+            outcome = "answered"
             answer = resp.get("answer", "")
             new_conv_id = resp.get("conversation_id")
+            if self.feedback is not None:
+                # Target of a later like/dislike that carries no message id.
+                self.feedback.remember_answer(chatbot, session_id, platform, resp.get("message_id"))
             
             # 4. Save new ID to DB
-            if new_conv_id:
-                self.repo_conv.save_session(user_id, msg.platform, new_conv_id)
+            if new_conv_id and by_thread:
+                if new_conv_id != current_conv_id:
+                    with _stage(platform, "db_write"):
+                        self.threads.remember(msg, new_conv_id)
+            elif new_conv_id:
+                with _stage(platform, "db_write"):
+                    self.repo_conv.save_session(session_id, platform, new_conv_id)
             
-            send_kwargs = {}
-            if msg.platform == "email":
-                send_kwargs["subject"] = f"Re: {msg.metadata.get('subject', 'Inquiry')}"
-                if settings.EMAIL_PROVIDER == "azure_oauth2":
-                    send_kwargs["graph_message_id"] = msg.metadata.get("graph_message_id")
-                else:
-                    send_kwargs["in_reply_to"] = msg.metadata.get("message_id")
-
-            adapter.send_message(user_id, answer, **send_kwargs)
+            with _stage(platform, "adapter_send"):
+                adapter.send_message(user_id, answer, **send_kwargs)
 
         try: 
             adapter.send_typing_off(user_id)
         except Exception: 
-            pass
\ No newline at end of file
+            pass
+
+        return outcome
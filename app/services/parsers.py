@@ -1,8 +1,13 @@
 from typing import Dict, Any, Optional, Tuple
-from app.schemas.models import IncomingMessage
+from app.schemas.record import MessageRecord
 from app.core.config import settings
 
-def parse_whatsapp_payload(data: Dict[str, Any]) -> Optional[IncomingMessage]:
+WHATSAPP_MEDIA_TYPES = ("image", "document", "audio", "video")
+INSTAGRAM_MEDIA_TYPES = ("image", "file", "audio", "video")
+# Dify needs a query; used when an attachment arrives without a caption.
+MEDIA_PLACEHOLDER_QUERY = "Mohon tinjau lampiran yang saya kirim."
+
+def parse_whatsapp_payload(data: Dict[str, Any]) -> Optional[MessageRecord]:
     try:
         entry = data.get("entry", [])[0]
         changes = entry.get("changes", [])[0]
@@ -14,43 +19,57 @@ def parse_whatsapp_payload(data: Dict[str, Any]) -> Optional[IncomingMessage]:
         message = value["messages"][0]
         sender_id = message.get("from")
         msg_id = message.get("id") 
+        # The business number the message was sent to; selects the tenant.
+        channel_id = value.get("metadata", {}).get("phone_number_id")
 
-        if str(sender_id) == str(settings.WHATSAPP_PHONE_NUMBER_ID):
+        if str(sender_id) in (str(settings.WHATSAPP_PHONE_NUMBER_ID), str(channel_id)):
             return None
 
         msg_type = message.get("type")
         
         if msg_type == "text":
-            return IncomingMessage(
-                platform_unique_id=sender_id,
-                query=message["text"]["body"],
-                platform="whatsapp",
-                metadata={"phone": sender_id, "message_id": msg_id}
+            return MessageRecord(
+                "whatsapp", sender_id, message["text"]["body"],
+                message_id=msg_id, channel_id=channel_id
             )
             
+        elif msg_type in WHATSAPP_MEDIA_TYPES:
+            media = message.get(msg_type, {})
+            return MessageRecord(
+                "whatsapp", sender_id, media.get("caption") or MEDIA_PLACEHOLDER_QUERY,
+                message_id=msg_id,
+                channel_id=channel_id,
+                media=[{
+                    "id": media.get("id"),
+                    "mime_type": media.get("mime_type"),
+                    "sha256": media.get("sha256"),
+                    "filename": media.get("filename")
+                }]
+            )
+
         elif msg_type == "interactive":
             interactive = message.get("interactive", {})
             if interactive.get("type") == "button_reply":
                 btn_id = interactive["button_reply"]["id"]
-                return IncomingMessage(
-                    platform_unique_id=sender_id,
-                    query=f"FEEDBACK_EVENT:{btn_id}",
-                    platform="whatsapp",
-                    metadata={"is_feedback": True, "payload": btn_id, "message_id": msg_id}
+                return MessageRecord(
+                    "whatsapp", sender_id, f"FEEDBACK_EVENT:{btn_id}",
+                    message_id=msg_id, channel_id=channel_id, feedback=btn_id
                 )
                 
     except (IndexError, KeyError, AttributeError):
         pass
     return None
 
-def parse_instagram_payload(data: Dict[str, Any]) -> Optional[IncomingMessage]:
+def parse_instagram_payload(data: Dict[str, Any]) -> Optional[MessageRecord]:
     try:
         entry = data.get("entry", [])[0]
         messaging = entry.get("messaging", [])[0]
         
         sender_id = messaging.get("sender", {}).get("id")
+        # The Instagram account the webhook entry belongs to; selects the tenant.
+        channel_id = entry.get("id")
         
-        if str(sender_id) == str(settings.INSTAGRAM_CHATBOT_ID):
+        if str(sender_id) in (str(settings.INSTAGRAM_CHATBOT_ID), str(channel_id)):
             return None
 
         message = messaging.get("message", {})
@@ -58,20 +77,29 @@ def parse_instagram_payload(data: Dict[str, Any]) -> Optional[IncomingMessage]:
         
         if "quick_reply" in message:
             payload = message["quick_reply"].get("payload")
-            return IncomingMessage(
-                platform_unique_id=sender_id,
-                query=f"FEEDBACK_EVENT:{payload}",
-                platform="instagram",
-                metadata={"is_feedback": True, "payload": payload, "message_id": msg_id}
+            return MessageRecord(
+                "instagram", sender_id, f"FEEDBACK_EVENT:{payload}",
+                message_id=msg_id, channel_id=channel_id, feedback=payload or ""
+            )
+
+        attachments = [
+            a for a in message.get("attachments") or []
+            if a.get("type") in INSTAGRAM_MEDIA_TYPES and (a.get("payload") or {}).get("url")
+        ]
+        if attachments:
+            if message.get("is_echo"): return None
+            return MessageRecord(
+                "instagram", sender_id, message.get("text") or MEDIA_PLACEHOLDER_QUERY,
+                message_id=msg_id,
+                channel_id=channel_id,
+                media=[{"url": a["payload"]["url"]} for a in attachments]
             )
 
         if "text" in message:
             if message.get("is_echo"): return None
-            return IncomingMessage(
-                platform_unique_id=sender_id,
-                query=message["text"],
-                platform="instagram",
-                metadata={"message_id": msg_id}
+            return MessageRecord(
+                "instagram", sender_id, message["text"],
+                message_id=msg_id, channel_id=channel_id
             )
             
     except (IndexError, KeyError, AttributeError):
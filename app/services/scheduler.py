@@ -1,33 +1,55 @@
 import time
 import logging
+from app.core.config import settings
 from app.repositories.conversation import ConversationRepository
-from app.api.dependencies import get_orchestrator
+from app.api.dependencies import get_orchestrator, get_lanes
 
 logger = logging.getLogger("service.scheduler")
 
+def _queue_notices(lanes, orchestrator, sessions):
+    """Submits a timeout notice per session; returns the sessions that could not be queued."""
+    for index, (user_id, platform, _) in enumerate(sessions):
+        try:
+            lanes.submit("maintenance", orchestrator.notify_timeout, user_id, platform)
+        except Exception as e:
+            logger.error("Could not queue %d timeout notice(s): %s", len(sessions) - index, e)
+            return sessions[index:]
+    return []
+
+
 def run_scheduler():
-    logger.info("Session Timeout Scheduler Started (3 Minutes Policy)...")
+    logger.info("Session Timeout Scheduler Started (%ss Policy)...", settings.SESSION_TIMEOUT_SECONDS)
     repo_conv = ConversationRepository()    
     
     time.sleep(5)
 
     while True:
         try:
-            stale_sessions = repo_conv.get_stale_sessions(seconds=180)
-    
-            if stale_sessions:
-                logger.info(f"Found {len(stale_sessions)} stale sessions.")
-                
-                orchestrator = get_orchestrator()
-
-                for session in stale_sessions:
-                    user_id, platform, conversation_id = session
-                    
-                    orchestrator.timeout_session(user_id, platform)
-                    
-                    logger.info(f"Session timeout processed for {user_id}")
+            orchestrator = get_orchestrator()
+            lanes = get_lanes()
+
+            # Each claim deletes its batch atomically, so a session is notified
+            # once even with several instances sweeping at the same time.
+            while True:
+                stale_sessions = repo_conv.claim_stale_sessions(
+                    seconds=settings.SESSION_TIMEOUT_SECONDS,
+                    limit=settings.SESSION_SWEEP_BATCH_SIZE
+                )
+                if not stale_sessions:
+                    break
+
+                logger.info("Claimed %d stale sessions.", len(stale_sessions))
+                # Notifications fan out over the maintenance lane's workers.
+                unsent = _queue_notices(lanes, orchestrator, stale_sessions)
+                if unsent:
+                    # The rows are already deleted: put them back for the next sweep.
+                    repo_conv.restore_sessions(unsent, settings.SESSION_TIMEOUT_SECONDS)
+                    break
+
+                if len(stale_sessions) < settings.SESSION_SWEEP_BATCH_SIZE:
+                    break
 
         except Exception as e:
-            logger.error(f"Scheduler Error: {e}")
+            logger.error("Scheduler Error: %s", e)
         
-        time.sleep(30)
\ No newline at end of file
+        time.sleep(settings.SESSION_SWEEP_INTERVAL_SECONDS)
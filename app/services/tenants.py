@@ -0,0 +1,248 @@
+"""Tenant (agency) routing for a shared deployment.
+
+A tenant owns channel identities (a WhatsApp phone number id, an Instagram
+account id, a Graph mailbox) and a Dify app. Tenants are read from the JSON
+file at ``TENANTS_FILE`` (see ``tenants.example.json``); anything that does
+not match a tenant belongs to the default tenant built from the single-
+channel settings, so deployments without the file behave as before.
+
+Each tenant gets its own adapter instances on its own keep-alive HTTP pool,
+its own Dify key and its own admission budget (``<platform>:<tenant>``).
+Tenants on the same Dify app key share a circuit breaker, so one agency's
+failing app does not fail fast for the others.
+Lookups are one dict access into an index that is rebuilt off to the side
+and swapped in when the file changes; unchanged tenants keep their objects
+(and warm connections) across reloads.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.adapters.base import BaseAdapter
+from app.adapters.utils import new_http_session
+from app.adapters.whatsapp import WhatsAppAdapter
+from app.adapters.instagram import InstagramAdapter
+from app.adapters.email.sender import EmailAdapter
+from app.core.circuit import BREAKERS, CircuitBreaker
+from app.services.chatbot import ChatbotClient, dify_breaker
+
+logger = logging.getLogger("service.tenants")
+
+DEFAULT_TENANT = "default"
+SCOPE_SEPARATOR = "|"
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    key: str
+    dify_api_key: str
+    whatsapp_phone_number_id: Optional[str] = None
+    whatsapp_access_token: Optional[str] = None
+    instagram_page_id: Optional[str] = None
+    instagram_access_token: Optional[str] = None
+    mailbox: Optional[str] = None
+    max_inflight: Dict[str, int] = field(default_factory=dict)  # platform -> admission limit
+
+
+class Tenant:
+    def __init__(self, key: str, adapters: Dict[str, BaseAdapter], chatbot: ChatbotClient,
+                 config: Optional[TenantConfig] = None, session=None):
+        self.key = key
+        self.adapters = adapters
+        self.chatbot = chatbot
+        self.config = config
+        self.session = session
+
+    @property
+    def is_default(self) -> bool:
+        return self.key == DEFAULT_TENANT
+
+    def close(self):
+        email = self.adapters.get("email")
+        if email is not None:
+            email.close()
+        if self.session is not None:
+            self.session.close()
+
+
+def scoped_user_id(tenant_key: Optional[str], user_id: str) -> str:
+    """Session key for ``user_id``: the same person may talk to two agencies."""
+    if not tenant_key or tenant_key == DEFAULT_TENANT:
+        return user_id
+    return f"{tenant_key}{SCOPE_SEPARATOR}{user_id}"
+
+
+def split_user_id(value: str) -> Tuple[Optional[str], str]:
+    if SCOPE_SEPARATOR in value:
+        tenant_key, user_id = value.split(SCOPE_SEPARATOR, 1)
+        return tenant_key, user_id
+    return None, value
+
+
+def load_tenant_configs(path: str) -> List[TenantConfig]:
+    with open(path, encoding="utf-8") as fh:
+        entries = json.load(fh)
+    configs = []
+    for entry in entries:
+        try:
+            config = TenantConfig(**entry)
+        except TypeError as e:
+            logger.error("Invalid tenant entry %r: %s", entry.get('key'), e)
+            continue
+        if config.key == DEFAULT_TENANT:
+            logger.error("Tenant key %r is reserved, entry skipped", DEFAULT_TENANT)
+            continue
+        configs.append(config)
+    return configs
+
+
+class TenantRegistry:
+    """Channel id -> tenant index; reloads ``path`` when its mtime changes."""
+
+    def __init__(self, default: Tenant, path: Optional[str] = None, refresh_seconds: int = 60,
+                 admission=None, http_pool_size: int = 10):
+        self.default = default
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.admission = admission
+        self.http_pool_size = http_pool_size
+        self._index: Dict[Tuple[str, str], Tenant] = {("tenant", DEFAULT_TENANT): default}
+        # Dify app key -> breaker, and the admission keys this registry set.
+        self._breakers: Dict[str, CircuitBreaker] = {default.chatbot.api_key: default.chatbot.breaker}
+        self._limit_keys: Set[str] = set()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # --- Lookups (hot path) ---
+
+    def get(self, key: Optional[str]) -> Tenant:
+        self._maybe_refresh()
+        return self._index.get(("tenant", key), self.default)
+
+    def resolve(self, platform: str, channel_id: Optional[str]) -> Tenant:
+        self._maybe_refresh()
+        if not channel_id:
+            return self.default
+        return self._index.get((platform, str(channel_id).lower()), self.default)
+
+    def for_message(self, msg) -> Tenant:
+        if msg.tenant:
+            return self.get(msg.tenant)
+        return self.resolve(msg.platform, msg.channel_id)
+
+    def tenants(self) -> List[Tenant]:
+        self._maybe_refresh()
+        return [tenant for (kind, _), tenant in self._index.items() if kind == "tenant"]
+
+    def mailboxes(self) -> List[str]:
+        boxes = []
+        for tenant in self.tenants():
+            email = tenant.adapters.get("email")
+            mailbox = getattr(email, "mailbox", None)
+            if mailbox and mailbox not in boxes:
+                boxes.append(mailbox)
+        return boxes
+
+    # --- Loading ---
+
+    def reload(self):
+        if not self.path:
+            return
+        self._checked_at = time.monotonic()
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        configs = load_tenant_configs(self.path)
+        current = {tenant.key: tenant for tenant in self.tenants() if not tenant.is_default}
+
+        index: Dict[Tuple[str, str], Tenant] = {("tenant", DEFAULT_TENANT): self.default}
+        for config in configs:
+            previous = current.pop(config.key, None)
+            tenant = previous if previous is not None and previous.config == config else self._build(config)
+            if previous is not None and tenant is not previous:
+                current[config.key] = previous  # replaced, close below
+            index[("tenant", config.key)] = tenant
+            for platform, channel_id in (
+                ("whatsapp", config.whatsapp_phone_number_id),
+                ("instagram", config.instagram_page_id),
+                ("email", config.mailbox),
+            ):
+                if not channel_id:
+                    continue
+                route = (platform, str(channel_id).lower())
+                if route in index:
+                    logger.warning("%s id %s claimed by %s and %s", platform, channel_id, index[route].key, config.key)
+                    continue
+                index[route] = tenant
+            if self.admission is not None:
+                for platform, limit in config.max_inflight.items():
+                    self.admission.limits[f"{platform}:{config.key}"] = limit
+
+        self._index = index
+        self._mtime = mtime
+        self._prune(configs)
+        logger.info("Loaded %d tenant(s)", len(configs))
+        if current:
+            # Replies still queued on the old adapters are flushed off the hot path.
+            threading.Thread(target=self._close, args=(list(current.values()),), daemon=True).start()
+
+    def close(self):
+        self._close(self.tenants())
+
+    def _build(self, config: TenantConfig) -> Tenant:
+        session = new_http_session(self.http_pool_size)
+        adapters: Dict[str, BaseAdapter] = {}
+        if config.whatsapp_phone_number_id:
+            adapters["whatsapp"] = WhatsAppAdapter(
+                config.whatsapp_phone_number_id, config.whatsapp_access_token, session=session
+            )
+        if config.instagram_page_id:
+            adapters["instagram"] = InstagramAdapter(
+                config.instagram_page_id, config.instagram_access_token, session=session
+            )
+        if config.mailbox:
+            adapters["email"] = EmailAdapter(mailbox=config.mailbox)
+        breaker = self._breakers.get(config.dify_api_key)
+        if breaker is None:
+            breaker = self._breakers[config.dify_api_key] = dify_breaker(f"dify:{config.key}")
+        chatbot = ChatbotClient(api_key=config.dify_api_key, session=session, breaker=breaker)
+        return Tenant(config.key, adapters, chatbot, config=config, session=session)
+
+    def _prune(self, configs: List[TenantConfig]):
+        """Drops the breakers and admission limits of tenants no longer in the file."""
+        app_keys = {config.dify_api_key for config in configs} | {self.default.chatbot.api_key}
+        for app_key in set(self._breakers) - app_keys:
+            breaker = self._breakers.pop(app_key)
+            if BREAKERS.get(breaker.name) is breaker:
+                del BREAKERS[breaker.name]
+        if self.admission is not None:
+            limit_keys = {f"{platform}:{config.key}" for config in configs for platform in config.max_inflight}
+            for key in self._limit_keys - limit_keys:
+                self.admission.limits.pop(key, None)
+            self._limit_keys = limit_keys
+
+    @staticmethod
+    def _close(tenants: List[Tenant]):
+        for tenant in tenants:
+            try:
+                tenant.close()
+            except Exception as e:
+                logger.error("Failed to close tenant %s: %s", tenant.key, e)
+
+    def _maybe_refresh(self):
+        if not self.path or time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        # Only one thread reloads; the others keep routing with the current index.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error("Failed to reload tenants: %s", e)
+        finally:
+            self._lock.release()
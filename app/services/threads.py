@@ -0,0 +1,142 @@
+"""Email thread -> Dify conversation resolution.
+
+Each email thread gets its own conversation, so two threads from the same
+sender no longer share the per-sender ``active_conversations`` row. A
+thread is identified by its canonical key: the Azure ``conversationId`` or,
+for SMTP/IMAP mail, the root Message-ID (first ``References`` entry, else
+``In-Reply-To``, else the message's own id). The other ids in the headers
+are tried as fallbacks for clients that trim ``References``.
+
+Lookups go through an in-memory LRU in front of ``bkpm.email_metadata``;
+only positive results are cached, so the first message of a new thread
+costs one DB query (all candidate keys at once) and every later reply is
+answered from memory. Misses are remembered for ``miss_ttl`` seconds, so
+the mails of a burst on a new thread do not each query again.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.metrics import Counter
+from app.repositories.message import MessageRepository
+from app.schemas.record import MessageRecord
+
+logger = logging.getLogger("service.threads")
+
+THREAD_CACHE_LOOKUPS = Counter(
+    "multikanal_email_thread_cache_total",
+    "Email thread lookups by result (hit, db, miss, negative).",
+    ("result",),
+)
+
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_values(self, values) -> int:
+        """Evicts every entry pointing at one of ``values`` (a full scan; rare resets only)."""
+        with self._lock:
+            stale = [key for key, value in self._data.items() if value in values]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def thread_keys(msg: MessageRecord) -> List[str]:
+    """Candidate thread keys, canonical key first."""
+    references = (msg.references or "").split()
+    candidates = [
+        msg.graph_conversation_id,
+        references[0] if references else None,
+        msg.in_reply_to,
+        *reversed(references[1:]),
+        msg.thread_key,
+        msg.message_id,
+    ]
+    keys = []
+    for key in candidates:
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+class EmailThreadResolver:
+    def __init__(self, repo: Optional[MessageRepository] = None, max_entries: int = 2048, miss_ttl: float = 10.0):
+        self.repo = repo or MessageRepository()
+        self.cache = LRUCache(max_entries)
+        self.miss_ttl = miss_ttl
+        self.misses = LRUCache(max_entries)  # joined keys -> monotonic expiry
+
+    def resolve(self, msg: MessageRecord) -> Optional[str]:
+        keys = thread_keys(msg)
+        for key in keys:
+            conversation_id = self.cache.get(key)
+            if conversation_id:
+                THREAD_CACHE_LOOKUPS.inc("hit")
+                return conversation_id
+        if not keys:
+            THREAD_CACHE_LOOKUPS.inc("miss")
+            return None
+        lookup = " ".join(keys)
+        expires = self.misses.get(lookup)
+        if expires is not None and expires > time.monotonic():
+            THREAD_CACHE_LOOKUPS.inc("negative")
+            return None
+        conversation_id = self.repo.find_conversation_by_thread_keys(keys)
+        if conversation_id:
+            THREAD_CACHE_LOOKUPS.inc("db")
+            self._cache_keys(keys, conversation_id)
+            return conversation_id
+        THREAD_CACHE_LOOKUPS.inc("miss")
+        if self.miss_ttl > 0:
+            self.misses.put(lookup, time.monotonic() + self.miss_ttl)
+        return None
+
+    def remember(self, msg: MessageRecord, conversation_id: str):
+        keys = thread_keys(msg)
+        if not keys:
+            return
+        self.repo.save_email_metadata(conversation_id, msg.subject, msg.in_reply_to, msg.references, keys[0])
+        self._cache_keys(keys, conversation_id)
+
+    def forget(self, msg: MessageRecord):
+        """Unmaps the message's thread, so its next message starts a new conversation."""
+        keys = thread_keys(msg)
+        if not keys:
+            return
+        conversation_ids = {self.cache.get(key) for key in keys} - {None}
+        conversation_ids.update(self.repo.delete_email_threads(keys))
+        for key in keys:
+            self.cache.discard(key)
+        # Other messages of the thread may have cached keys this one does not carry.
+        self.cache.discard_values(conversation_ids)
+
+    def _cache_keys(self, keys: List[str], conversation_id: str):
+        for key in keys:
+            self.cache.put(key, conversation_id)
@@ -0,0 +1,83 @@
+"""Round-trip smoke check of the async repositories against the configured DB.
+
+Runs the ``Async*Repository`` methods the way a coroutine caller would
+(several of them racing on the first pool use) and compares the results
+with the sync repositories. Writes only a throwaway session row, removed
+again at the end:
+
+    python -m app.tools.db_smoke --timeout 10
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from typing import List, Tuple
+
+from app.repositories.base import Database, AsyncDatabase
+from app.repositories.conversation import ConversationRepository, AsyncConversationRepository
+from app.repositories.message import MessageRepository, AsyncMessageRepository
+
+PLATFORM = "generic"
+
+
+async def run_checks(timeout: float) -> List[Tuple[str, bool, str]]:
+    results: List[Tuple[str, bool, str]] = []
+
+    def check(name: str, ok: bool, detail: str = ""):
+        results.append((name, ok, detail))
+
+    try:
+        await AsyncDatabase.prewarm(timeout)
+    except Exception as e:
+        check("async pool opens", False, str(e))
+        return results
+    check("async pool opens", True)
+
+    conv, msg = AsyncConversationRepository(), AsyncMessageRepository()
+    user_id = f"db-smoke-{uuid.uuid4().hex[:12]}"
+    conversation_id = str(uuid.uuid4())
+
+    # Concurrent first calls share the pool (see AsyncDatabase.initialize).
+    missing = await asyncio.gather(*(conv.get_active_session(user_id, PLATFORM) for _ in range(5)))
+    check("get_active_session (none yet)", missing == [None] * 5, repr(missing))
+
+    await conv.save_session(user_id, PLATFORM, conversation_id)
+    found = await conv.get_active_session(user_id, PLATFORM)
+    check("save_session + get_active_session", found == conversation_id, repr(found))
+
+    sync_found = await asyncio.to_thread(ConversationRepository().get_active_session, user_id, PLATFORM)
+    check("sync repository sees the same row", sync_found == conversation_id, repr(sync_found))
+
+    await conv.clear_session(user_id)
+    cleared = await conv.get_active_session(user_id, PLATFORM)
+    check("clear_session", cleared is None, repr(cleared))
+
+    thread = await msg.find_conversation_by_thread_keys([f"<{user_id}@smoke>"])
+    check("find_conversation_by_thread_keys (unknown)", thread is None, repr(thread))
+
+    metadata = await msg.get_email_metadata(conversation_id)
+    sync_metadata = await asyncio.to_thread(MessageRepository().get_email_metadata, conversation_id)
+    check("get_email_metadata matches sync", metadata == sync_metadata, repr(metadata))
+    return results
+
+
+async def _main(timeout: float) -> int:
+    try:
+        results = await run_checks(timeout)
+    finally:
+        await AsyncDatabase.close()
+        Database.close()
+    for name, ok, detail in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{'' if ok else f': {detail}'}")
+    return 0 if results and all(ok for _, ok, _ in results) else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Smoke-test the async repositories against the DB.")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for the pool")
+    args = parser.parse_args(argv)
+    return asyncio.run(_main(args.timeout))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
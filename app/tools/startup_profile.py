@@ -0,0 +1,107 @@
+"""Cold-start import profiler.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter,
+reports the slowest modules and packages, and exits non-zero when the
+total import time exceeds the startup budget so CI can gate on it:
+
+    python -m app.tools.startup_profile --budget-ms 1500 --runs 3
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int, int]]:
+    """Return (module, self_us, cumulative_us, depth) rows from -X importtime output."""
+    rows = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def run_once(module: str) -> List[Tuple[str, int, int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Importing {module} failed (exit {proc.returncode})")
+    return parse_importtime(proc.stderr)
+
+
+def profile(module: str, runs: int) -> Dict:
+    totals = []
+    per_module: Dict[str, List[int]] = defaultdict(list)
+    per_package: Dict[str, List[int]] = defaultdict(list)
+
+    for _ in range(runs):
+        rows = run_once(module)
+        totals.append(sum(row[1] for row in rows))
+        packages: Dict[str, int] = defaultdict(int)
+        for name, self_us, _, _ in rows:
+            per_module[name].append(self_us)
+            packages[name.split(".")[0]] += self_us
+        for name, self_us in packages.items():
+            per_package[name].append(self_us)
+
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": statistics.median(totals) / 1000,
+        "modules": {name: statistics.median(v) / 1000 for name, v in per_module.items()},
+        "packages": {name: statistics.median(v) / 1000 for name, v in per_package.items()},
+    }
+
+
+def _print_table(title: str, timings: Dict[str, float], top: int):
+    print(f"\n{title}")
+    for name, ms in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {ms:9.1f} ms  {name}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Profile application import time.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    budget = args.budget_ms
+    if budget is None:
+        budget = float(os.environ.get("STARTUP_BUDGET_MS", 1500))
+
+    report = profile(args.module, max(1, args.runs))
+    report["budget_ms"] = budget
+
+    _print_table("Slowest packages (self time)", report["packages"], args.top)
+    _print_table("Slowest modules (self time)", report["modules"], args.top)
+    print(f"\nTotal import time of {args.module}: {report['total_ms']:.1f} ms (budget {budget:.0f} ms)")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+
+    if report["total_ms"] > budget:
+        print("Startup budget exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Latency report for spans written by the file trace exporter.
+
+Prints per-span percentiles and the slowest traces with their span tree,
+which is usually enough to tell whether a slow tail is Dify, Postgres or
+the Graph API:
+
+    TRACE_EXPORTER=file uvicorn app.main:app
+    python -m app.tools.trace_report traces/spans.jsonl --slowest 5
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+
+def load_spans(path: str) -> List[Dict]:
+    spans = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(spans: List[Dict]) -> Dict[str, Dict[str, float]]:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for span in spans:
+        durations[span["name"]].append(span["duration_ms"])
+        if span.get("status") == "error":
+            errors[span["name"]] += 1
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": values[-1],
+        }
+    return summary
+
+
+def _print_tree(span: Dict, children: Dict[str, List[Dict]], depth: int = 0):
+    status = "" if span.get("status") == "ok" else f"  [{span.get('status')}]"
+    print(f"  {'  ' * depth}{span['duration_ms']:9.1f} ms  {span['name']}{status}")
+    for child in sorted(children.get(span["span_id"], []), key=lambda s: s["start"]):
+        _print_tree(child, children, depth + 1)
+
+
+def print_slowest(spans: List[Dict], count: int):
+    by_id = {span["span_id"] for span in spans}
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    children: Dict[str, List[Dict]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+        if span.get("parent_id") in by_id:
+            children[span["parent_id"]].append(span)
+
+    def wall_ms(trace_spans: List[Dict]) -> float:
+        start = min(s["start"] for s in trace_spans)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in trace_spans)
+        return (end - start) * 1000
+
+    ranked = sorted(traces.items(), key=lambda item: wall_ms(item[1]), reverse=True)
+    for trace_id, trace_spans in ranked[:count]:
+        print(f"\nTrace {trace_id} ({wall_ms(trace_spans):.1f} ms)")
+        # The webhook span and the background processing span are separate
+        # local roots; a parent from another process is never in the file.
+        roots = [s for s in trace_spans if s.get("parent_id") not in by_id]
+        for root in sorted(roots, key=lambda s: s["start"]):
+            _print_tree(root, children)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize exported trace spans.")
+    parser.add_argument("path", nargs="?", default="traces/spans.jsonl")
+    parser.add_argument("--slowest", type=int, default=5, help="Print the N slowest traces")
+    parser.add_argument("--name", default=None, help="Only spans whose name starts with this prefix")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.path)
+    if not spans:
+        print(f"No spans in {args.path}", file=sys.stderr)
+        return 1
+
+    summary = summarize([s for s in spans if not args.name or s["name"].startswith(args.name)])
+    print(f"{'span':40} {'count':>7} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, row in sorted(summary.items(), key=lambda item: item[1]["p99_ms"], reverse=True):
+        print(
+            f"{name:40} {row['count']:7d} {row['errors']:5d} {row['p50_ms']:9.1f} "
+            f"{row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['max_ms']:9.1f}"
+        )
+
+    if args.slowest:
+        print_slowest(spans, args.slowest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
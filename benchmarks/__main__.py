@@ -0,0 +1,132 @@
+"""Runs every ``bench_*`` module and gates on ``benchmarks/baseline.json``.
+
+    python -m benchmarks                      # run all, compare with the baseline
+    python -m benchmarks -k parsers -k split  # only matching modules/benchmarks
+    python -m benchmarks --save-baseline      # record new baseline numbers
+    python -m benchmarks --legacy             # include the legacy comparisons
+
+A benchmark fails when its ``relative`` time (median of its samples over an
+interleaved reference workload, see ``harness.bench``) is slower than the
+baseline by more than its threshold (``thresholds`` in the baseline, else
+``default_threshold``) and by more than ``NOISE_FLOOR_US`` in absolute terms.
+Raw times on a shared VM drift by 2x between runs; the ratio mostly does not.
+Record the baseline on the machine that runs the gate, and re-record it in
+the commit that lands an intentional change.
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks import harness
+from benchmarks.harness import offline_settings, print_results
+
+HERE = Path(__file__).parent
+BASELINE = HERE / "baseline.json"
+DEFAULT_THRESHOLD = 0.5
+NOISE_FLOOR_US = 2.0
+
+
+def discover() -> List[str]:
+    return sorted(path.stem for path in HERE.glob("bench_*.py"))
+
+
+def _selected(name: str, patterns: List[str]) -> bool:
+    return not patterns or any(p in name for p in patterns)
+
+
+def run(patterns: List[str], legacy: bool) -> List[Dict]:
+    results = []
+    for module_name in discover():
+        harness.selector = lambda name: (legacy or not name.startswith("legacy")) and _selected(
+            f"{module_name}:{name}", patterns
+        )
+        module = importlib.import_module(f"benchmarks.{module_name}")
+        print(f"# {module_name}", file=sys.stderr)
+        results.extend({**r, "module": module_name} for r in module.run() if r)
+    harness.selector = None
+    return results
+
+
+def check(results: List[Dict], baseline: Dict) -> List[str]:
+    recorded = baseline.get("benchmarks", {})
+    thresholds = baseline.get("thresholds", {})
+    default = baseline.get("default_threshold", DEFAULT_THRESHOLD)
+    failures = []
+    print(f"\n{'benchmark (median, us)':<48} {'baseline':>10} {'now':>10} {'change':>8}")
+    for result in results:
+        old = recorded.get(result["name"])
+        if not old or "relative" not in old:
+            print(f"{result['name']:<48} {'-':>10} {result['median_us']:10.1f}      new")
+            continue
+        change = result["relative"] / old["relative"] - 1
+        # Slowdown in today's microseconds, for the absolute noise floor.
+        slower_us = (result["relative"] - old["relative"]) * result["reference_us"]
+        limit = thresholds.get(result["name"], default)
+        regressed = change > limit and slower_us > NOISE_FLOOR_US
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{result['name']:<48} {old['median_us']:10.1f} {result['median_us']:10.1f} {change:+8.1%}{flag}")
+        if flag:
+            failures.append(result["name"])
+    return failures
+
+
+def save_baseline(results: List[Dict], previous: Dict):
+    baseline = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "default_threshold": previous.get("default_threshold", DEFAULT_THRESHOLD),
+        # Per-benchmark overrides for noisy or sub-microsecond cases are kept.
+        "thresholds": previous.get("thresholds", {}),
+        "benchmarks": {
+            r["name"]: {
+                "module": r["module"],
+                "median_us": round(r["median_us"], 3),
+                "min_us": round(r["min_us"], 3),
+                "relative": round(r["relative"], 5),
+            }
+            for r in results
+        },
+    }
+    if previous.get("benchmarks"):
+        # A filtered run only replaces the benchmarks it measured.
+        baseline["benchmarks"] = {**previous["benchmarks"], **baseline["benchmarks"]}
+    BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+    print(f"Saved {len(results)} benchmark(s) to {BASELINE}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the microbenchmark suite.")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="Substring of 'module:benchmark' to select (repeatable)")
+    parser.add_argument("--legacy", action="store_true", help="Include legacy implementations")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write raw results as JSON")
+    args = parser.parse_args(argv)
+
+    offline_settings()
+    results = run(args.patterns, args.legacy)
+    print_results(results)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+    previous = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    if args.save_baseline:
+        save_baseline(results, previous)
+        return 0
+    if not previous:
+        print("\nNo baseline yet; run with --save-baseline to record one.")
+        return 0
+
+    failures = check(results, previous)
+    if failures:
+        print(f"\n{len(failures)} benchmark(s) regressed beyond their threshold", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""Channel chunker benchmark.
+
+    python -m benchmarks.bench_chunker
+
+Splits rendered Dify answers at the WhatsApp (4096 chars) and Instagram
+(1000 UTF-8 bytes) limits, from a single short answer up to a ~100 KB
+worst case, plus emoji-dense text that exercises the grapheme checks.
+"""
+from pathlib import Path
+
+from app.adapters.markdown import parse_markdown, render_whatsapp, render_plain
+from app.adapters.utils import CHANNEL_LIMITS, split_text_smartly, stream_chunks
+from benchmarks.harness import bench, print_results
+
+CORPUS = Path(__file__).parent / "corpus" / "answers"
+
+
+def load_cases():
+    cases = {}
+    for path in sorted(CORPUS.glob("*.md")):
+        cases[path.stem] = path.read_text()
+    cases["sector_summary_x10"] = "\n\n".join([cases["sector_summary"]] * 10)
+    cases["emoji_dense"] = "Terima kasih 🙏🏽 layanan 👨‍👩‍👧 OSS 🇮🇩 sudah membantu! " * 300
+    return cases
+
+
+def run():
+    results = []
+    for name, text in load_cases().items():
+        whatsapp = render_whatsapp(parse_markdown(text))
+        instagram = render_plain(parse_markdown(text))
+        results.append(bench(f"split_whatsapp[{name}]", split_text_smartly, whatsapp, *CHANNEL_LIMITS["whatsapp"]))
+        results.append(bench(f"split_instagram[{name}]", split_text_smartly, instagram, *CHANNEL_LIMITS["instagram"]))
+    pieces = [render_whatsapp(parse_markdown(load_cases()["sector_summary_x10"]))[i:i + 64] for i in range(0, 97000, 64)]
+    results.append(bench("stream_whatsapp[64-char pieces]", lambda p: list(stream_chunks(p, 4096)), pieces))
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,77 @@
+"""Email body sanitizer benchmark.
+
+    python -m benchmarks.bench_email
+
+Compares ``sanitize_email_body`` against the previous regex-chain
+implementation on the Outlook/Gmail corpus, a large newsletter and an
+adversarial input that made the old greedy patterns backtrack.
+"""
+import re
+from html import unescape
+from pathlib import Path
+
+from app.adapters.email.utils import sanitize_email_body
+from benchmarks.harness import bench, print_results
+
+CORPUS = Path(__file__).parent / "corpus" / "email"
+
+
+def legacy_sanitize_email_body(text_plain, html, max_chars=6000):
+    def strip_html(html):
+        if not html: return ""
+        html = re.sub(r'<hr\s*/?>', '\n__\n', html, flags=re.IGNORECASE)
+        html = re.sub(r'<script[^>]>.?</script>', '', html, flags=re.IGNORECASE | re.DOTALL)
+        html = re.sub(r'<style[^>]>.?</style>', '', html, flags=re.IGNORECASE | re.DOTALL)
+        html = re.sub(r'</(p|div|br|li|h[1-6]|tr)>', '\n', html, flags=re.IGNORECASE)
+        html = re.sub(r'<br\s*/?>', '\n', html, flags=re.IGNORECASE)
+        html = re.sub(r'<[^>]+>', ' ', html)
+        return unescape(html).strip()
+
+    def strip_quoted_sections(text):
+        patterns = [
+            r'(?:\r\n|\n|^)?\s*On\s+.*(?:at|pukul)\s+.*(?:wrote|menulis):?\s*[\s\S]*',
+            r'(?:\r\n|\n|^)?\s*On\s+.*(?:wrote|menulis):?\s*[\s\S]*',
+            r'(?:\r\n|\n|^)?\s*Pada\s+.*menulis:\s*[\s\S]*',
+            r'(?:\r\n|\n|^)?\s*From:\s*.*\n?Sent:\s*.*\n?To:\s*.*[\s\S]*',
+            r'(?:\r\n|\n|^)?\s*Dari:\s*.*\n?Kirim:\s*.*\n?Kepada:\s*.*[\s\S]*',
+            r'\n\s*_{3,}[\s\S]*',
+            r'\n\s*-{3,}\s*Original Message\s*-{3,}[\s\S]*',
+            r'\n\s*>[\s\S]*',
+        ]
+        for pattern in patterns:
+            text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+        return text.strip()
+
+    body = text_plain.strip() if text_plain else strip_html(html)
+    body = strip_quoted_sections(body)
+    body = re.sub(r'\s{2,}', ' ', body)
+    body = re.sub(r'\n{3,}', '\n\n', body)
+    return body[:max_chars].strip()
+
+
+def load_cases():
+    cases = {}
+    for path in sorted(CORPUS.glob("*.html")):
+        if path.stem != "newsletter_block":
+            cases[path.stem] = (None, path.read_text())
+    for path in sorted(CORPUS.glob("*.txt")):
+        cases[f"{path.stem}_plain"] = (path.read_text(), None)
+
+    block = (CORPUS / "newsletter_block.html").read_text()
+    cases["newsletter_400kb"] = (None, "<html><body>" + block * 280 + "</body></html>")
+    # Repeated "On ... at" tokens on one line make the old patterns backtrack
+    # cubically (200 -> 0.6 s, 800 -> 36 s); the streaming sanitizer stays linear.
+    cases["adversarial_on_200"] = ("On at " * 200, None)
+    return cases
+
+
+def run():
+    results = []
+    for name, (plain, html) in load_cases().items():
+        results.append(bench(f"sanitize[{name}]", sanitize_email_body, plain, html))
+        results.append(bench(f"legacy[{name}]", legacy_sanitize_email_body, plain, html, repeat=3))
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,52 @@
+"""Markdown rendering pipeline benchmark.
+
+    python -m benchmarks.bench_markdown
+
+Measures one uncached parse of a Dify answer, each channel renderer on
+the parsed tree, and the previous per-adapter ``re.sub`` chains.
+"""
+import re
+from pathlib import Path
+
+from app.adapters.markdown import parse_markdown, render_whatsapp, render_plain, render_email_html
+from benchmarks.harness import bench, print_results
+
+CORPUS = Path(__file__).parent / "corpus" / "answers"
+parse_uncached = parse_markdown.__wrapped__
+
+
+def legacy_whatsapp(text):
+    text = re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)
+    return re.sub(r'~~(.*?)~~', r'~\1~', text)
+
+
+def legacy_instagram(text):
+    return re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)
+
+
+def legacy_email(text):
+    text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
+    text = re.sub(r'\*(.*?)\*', r'<i>\1</i>', text)
+    text = re.sub(r'_(.*?)_', r'<i>\1</i>', text)
+    return text.replace('\n', '<br>')
+
+
+def run():
+    results = []
+    for path in sorted(CORPUS.glob("*.md")):
+        text = path.read_text()
+        tree = parse_uncached(text)
+        name = path.stem
+        results.append(bench(f"parse[{name}]", parse_uncached, text))
+        results.append(bench(f"render_whatsapp[{name}]", render_whatsapp, tree))
+        results.append(bench(f"render_plain[{name}]", render_plain, tree))
+        results.append(bench(f"render_email_html[{name}]", render_email_html, tree))
+        results.append(bench(f"parse+whatsapp[{name}]", lambda t: render_whatsapp(parse_uncached(t)), text))
+        results.append(bench(f"legacy_whatsapp[{name}]", legacy_whatsapp, text))
+        results.append(bench(f"legacy_instagram[{name}]", legacy_instagram, text))
+        results.append(bench(f"legacy_email[{name}]", legacy_email, text))
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
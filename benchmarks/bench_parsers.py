@@ -0,0 +1,35 @@
+"""Meta webhook parser benchmark.
+
+    python -m benchmarks.bench_parsers
+
+Runs ``parse_whatsapp_payload`` / ``parse_instagram_payload`` on the
+checked-in webhook corpus (single messages, batched deliveries, status
+callbacks, echoes), both on the decoded dict and including ``json.loads``
+as the route does.
+"""
+import json
+from pathlib import Path
+
+from benchmarks.harness import bench, print_results, offline_settings
+
+offline_settings()
+
+from app.services.parsers import parse_whatsapp_payload, parse_instagram_payload  # noqa: E402
+
+CORPUS = Path(__file__).parent / "corpus" / "webhooks"
+PARSERS = {"whatsapp": parse_whatsapp_payload, "instagram": parse_instagram_payload}
+
+
+def run():
+    results = []
+    for path in sorted(CORPUS.glob("*.json")):
+        raw = path.read_bytes()
+        payload = json.loads(raw)
+        parser = PARSERS[path.stem.split("_", 1)[0]]
+        results.append(bench(f"parse[{path.stem}]", parser, payload))
+        results.append(bench(f"decode+parse[{path.stem}]", lambda r: parser(json.loads(r)), raw))
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,92 @@
+"""Minimal timeit-based benchmark helpers shared by the bench_* modules."""
+import math
+import os
+import statistics
+import timeit
+from typing import Callable, Dict, List, Optional
+
+# Required settings without defaults; placeholders let app modules import offline.
+OFFLINE_SETTINGS = {
+    "DIFY_API_BASE_URL": "http://127.0.0.1:9/v1",
+    "DIFY_API_KEY": "bench",
+    "DB_HOST": "127.0.0.1",
+    "DB_PORT": "5432",
+    "DB_NAME": "bench",
+    "DB_USER": "bench",
+    "DB_PASS": "bench",
+}
+
+
+def offline_settings():
+    """Call before importing modules that read ``app.core.config.settings``."""
+    for key, value in OFFLINE_SETTINGS.items():
+        os.environ.setdefault(key, value)
+
+
+# Set by ``python -m benchmarks`` so deselected cases are skipped, not just hidden.
+selector: Optional[Callable[[str], bool]] = None
+
+
+def _reference():
+    # Fixed interpreter workload (dict, str and call overhead like the code under test).
+    counts = {}
+    for word in "satu dua tiga empat lima enam tujuh delapan sembilan sepuluh".split() * 8:
+        counts[word] = counts.get(word, 0) + len(word)
+    return ",".join(f"{k}={v}" for k, v in sorted(counts.items()))
+
+
+_reference_timer = timeit.Timer(_reference)
+_reference_number = None
+
+
+def bench(name: str, fn: Callable, *args, repeat: int = 15, min_time: float = 0.1, **kwargs) -> Optional[Dict]:
+    """Times ``fn`` ``repeat`` times, each sample preceded by one of ``_reference``.
+
+    ``relative`` (median of bench/reference per sample pair) cancels most of
+    the machine-wide speed drift between runs; it is what the gate compares.
+    """
+    global _reference_number
+    if selector is not None and not selector(name):
+        return None
+    if _reference_number is None:
+        _reference_number = max(1, int(_reference_timer.autorange()[0] * min_time / 0.2))
+    timer = timeit.Timer(lambda: fn(*args, **kwargs))
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    samples, references = [], []
+    for _ in range(repeat):
+        references.append(_reference_timer.timeit(_reference_number) / _reference_number)
+        samples.append(timer.timeit(number) / number)
+    return {
+        "name": name,
+        "loops": number,
+        "min_us": min(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "reference_us": statistics.median(references) * 1e6,
+        "relative": statistics.median(s / r for s, r in zip(samples, references)),
+    }
+
+
+def print_results(results: List[Optional[Dict]]):
+    results = [r for r in results if r]
+    width = max((len(r["name"]) for r in results), default=10)
+    print(f"{'benchmark':<{width}}  {'median':>12}  {'min':>12}  {'relative':>9}  loops")
+    for r in results:
+        print(f"{r['name']:<{width}}  {_fmt(r['median_us']):>12}  {_fmt(r['min_us']):>12}  {r['relative']:9.3f}  {r['loops']}")
+
+
+def _fmt(us: float) -> str:
+    if us >= 1e6:
+        return f"{us / 1e6:.2f} s"
+    if us >= 1e3:
+        return f"{us / 1e3:.2f} ms"
+    return f"{us:.1f} us"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; ``values`` need not be sorted."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
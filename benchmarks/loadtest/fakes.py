@@ -0,0 +1,273 @@
+"""Local stand-ins for Dify, the Meta Graph API and Microsoft Graph.
+
+Each fake is a ``ThreadingHTTPServer`` on an ephemeral port that answers
+with realistic payloads after a configurable latency, and records what it
+received so the driver can measure end-to-end reply latency.
+
+Latency specs: ``none``, ``fixed:<s>``, ``uniform:<lo>:<hi>`` or
+``lognormal:<median>:<sigma>`` (seconds).
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.loadtest.payloads import media_content
+
+CORPUS = Path(__file__).resolve().parent.parent / "corpus" / "answers"
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    kind, *params = (spec or "none").split(":")
+    values = [float(p) for p in params]
+    if kind == "none":
+        return lambda: 0.0
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The app fans out many short keep-alive-less requests.
+    request_queue_size = 512
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: "FakeService" = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw) if raw else {}
+        except ValueError:
+            return {}
+
+    def send_bytes(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.fake.handle(self, "GET", {})
+
+    def do_POST(self):
+        self.fake.handle(self, "POST", self._body())
+
+    def do_PATCH(self):
+        self.fake.handle(self, "PATCH", self._body())
+
+
+class FakeService:
+    name = "fake"
+
+    def __init__(self, latency: str = "none"):
+        self.latency = parse_latency(latency)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_FakeServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeService":
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {"fake": self})
+        self._server = _FakeServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self._server.serve_forever, name=self.name, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, request: _Handler, method: str, body: Dict):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency()
+        if delay > 0:
+            time.sleep(delay)
+        self.respond(request, method, body)
+
+    def respond(self, request: _Handler, method: str, body: Dict):
+        request.send_json(404, {"error": "not found"})
+
+
+class FakeDify(FakeService):
+    """``POST /v1/chat-messages`` in blocking or streaming (SSE) mode, plus ``/files/upload``."""
+
+    name = "fake-dify"
+
+    def __init__(self, latency: str = "none", answers: Optional[List[str]] = None):
+        super().__init__(latency)
+        self.answers = answers or [p.read_text() for p in sorted(CORPUS.glob("*.md"))] or ["OK"]
+        self.uploads = 0
+        self.uploaded_bytes = 0
+
+    def handle(self, request: _Handler, method: str, body: Dict):
+        # Streaming spreads the latency over the chunks instead of sleeping up front.
+        if body.get("response_mode") == "streaming" and request.path.endswith("/chat-messages"):
+            with self._lock:
+                self.requests += 1
+            self._stream(request, body, self.latency())
+            return
+        super().handle(request, method, body)
+
+    def _ids(self, body: Dict):
+        return body.get("conversation_id") or str(uuid.uuid4()), str(uuid.uuid4())
+
+    def respond(self, request: _Handler, method: str, body: Dict):
+        if request.path.endswith("/chat-messages"):
+            conversation_id, message_id = self._ids(body)
+            request.send_json(200, {
+                "event": "message",
+                "message_id": message_id,
+                "conversation_id": conversation_id,
+                "mode": "chat",
+                "answer": random.choice(self.answers),
+                "metadata": {"usage": {"total_tokens": 0}},
+                "created_at": int(time.time()),
+            })
+        elif "/feedbacks" in request.path:
+            request.send_json(200, {"result": "success"})
+        elif request.path.endswith("/files/upload"):
+            # The multipart body was drained by _body(); its size is enough here.
+            with self._lock:
+                self.uploads += 1
+                self.uploaded_bytes += int(request.headers.get("Content-Length") or 0)
+            request.send_json(201, {"id": str(uuid.uuid4()), "created_at": int(time.time())})
+        else:
+            super().respond(request, method, body)
+
+    def _stream(self, request: _Handler, body: Dict, delay: float):
+        conversation_id, message_id = self._ids(body)
+        answer = random.choice(self.answers)
+        pieces = [answer[i:i + 64] for i in range(0, len(answer), 64)] or [""]
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Connection", "close")
+        request.end_headers()
+        request.close_connection = True
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            event = {"event": "message", "answer": piece, "message_id": message_id,
+                     "conversation_id": conversation_id}
+            request.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            request.wfile.flush()
+        end = {"event": "message_end", "message_id": message_id, "conversation_id": conversation_id}
+        request.wfile.write(f"data: {json.dumps(end)}\n\n".encode())
+
+
+class FakeMeta(FakeService):
+    """``POST /<version>/<id>/messages`` for both WhatsApp Cloud API and Instagram.
+
+    Also serves WhatsApp media: ``GET /<version>/<media-id>`` and the
+    download URL it returns.
+
+    Text replies are recorded as ``(monotonic_time, recipient_id)`` so the
+    driver can pair them with the webhook that triggered them; typing
+    indicators and read receipts are counted but not recorded.
+    """
+
+    name = "fake-meta"
+
+    def __init__(self, latency: str = "none"):
+        super().__init__(latency)
+        self.replies: Dict[str, float] = {}
+        self.sends = 0
+
+    def respond(self, request: _Handler, method: str, body: Dict):
+        path = request.path.split("?", 1)[0]
+        if method == "GET" and path.startswith("/media/"):
+            return request.send_bytes(200, media_content(path[len("/media/"):]), "image/jpeg")
+        if method == "GET" and "/media." in path:
+            # Media id lookup: GET /<version>/<media-id>
+            media_id = path.rsplit("/", 1)[-1]
+            content = media_content(media_id)
+            return request.send_json(200, {
+                "messaging_product": "whatsapp",
+                "url": f"{self.url}/media/{media_id}",
+                "mime_type": "image/jpeg",
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "file_size": len(content),
+                "id": media_id,
+            })
+        if method != "POST" or not request.path.endswith("/messages"):
+            return super().respond(request, method, body)
+
+        recipient = body.get("to") or (body.get("recipient") or {}).get("id")
+        is_reply = (body.get("type") == "text") or ("text" in (body.get("message") or {}))
+        if recipient and is_reply:
+            now = time.monotonic()
+            with self._lock:
+                self.sends += 1
+                self.replies.setdefault(str(recipient), now)
+
+        if "messaging_product" in body:
+            request.send_json(200, {
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": recipient, "wa_id": recipient}],
+                "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+            })
+        else:
+            request.send_json(200, {"recipient_id": recipient, "message_id": f"mid.{uuid.uuid4().hex}"})
+
+
+class FakeGraph(FakeService):
+    """The Microsoft Graph calls used by the email channel, including ``$batch``."""
+
+    name = "fake-graph"
+    REGEX_BATCH = re.compile(r"/v1\.0/\$batch$")
+
+    def __init__(self, latency: str = "none"):
+        super().__init__(latency)
+        self.sent: List[Dict] = []
+
+    def respond(self, request: _Handler, method: str, body: Dict):
+        path = request.path.split("?", 1)[0]
+        if method == "GET" and path.endswith("/mailFolders/inbox/messages"):
+            request.send_json(200, {"value": []})
+        elif method == "PATCH" and "/messages/" in path:
+            request.send_json(200, {"id": path.rsplit("/", 1)[-1], "isRead": True})
+        elif method == "POST" and (path.endswith("/sendMail") or path.endswith("/reply")):
+            with self._lock:
+                self.sent.append({"path": path, "at": time.monotonic()})
+            request.send_json(202)
+        elif method == "POST" and self.REGEX_BATCH.search(path):
+            responses = []
+            with self._lock:
+                for item in body.get("requests", []):
+                    self.sent.append({"path": item.get("url"), "at": time.monotonic()})
+                    responses.append({"id": item.get("id"), "status": 202, "headers": {}, "body": None})
+            request.send_json(200, {"responses": responses})
+        else:
+            super().respond(request, method, body)
@@ -0,0 +1,126 @@
+"""In-memory stand-in for Postgres.
+
+Replaces the repository methods the message pipeline uses with dict-backed
+versions that sleep ``latency_ms`` per call, roughly one round trip to a
+local database. Used when no Postgres is available for the load test; pass
+``--db postgres`` (and the usual ``DB_*`` variables) to measure a real one.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.repositories.base import Database
+from app.repositories.conversation import ConversationRepository
+from app.repositories.intent import IntentRepository
+from app.repositories.message import MessageRepository
+
+
+class MemoryStore:
+    def __init__(self, latency_ms: float = 1.0):
+        self.delay = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, Tuple[str, str, float]] = {}
+        self.processed = set()
+        self.email_metadata: Dict[str, Dict[str, str]] = {}
+
+    def round_trip(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def install(latency_ms: float = 1.0) -> MemoryStore:
+    store = MemoryStore(latency_ms)
+
+    def get_active_session(self, user_id: str, platform: str) -> Optional[str]:
+        store.round_trip()
+        row = store.sessions.get(user_id)
+        return row[0] if row and row[1] == platform else None
+
+    def save_session(self, user_id: str, platform: str, conversation_id: str):
+        store.round_trip()
+        with store.lock:
+            store.sessions[user_id] = (conversation_id, platform, time.time())
+
+    def claim_stale_sessions(self, seconds: int, limit: int) -> List[Tuple[str, str, str]]:
+        store.round_trip()
+        cutoff = time.time() - seconds
+        with store.lock:
+            stale = sorted((row[2], uid, row[1], row[0]) for uid, row in store.sessions.items() if row[2] < cutoff)
+            claimed = [(uid, platform, conv) for _, uid, platform, conv in stale[:limit]]
+            for uid, _, _ in claimed:
+                del store.sessions[uid]
+        return claimed
+
+    def restore_sessions(self, sessions, seconds: int):
+        store.round_trip()
+        expired = time.time() - seconds - 1
+        with store.lock:
+            for uid, platform, conv in sessions:
+                store.sessions.setdefault(uid, (conv, platform, expired))
+
+    def clear_session(self, user_id: str):
+        store.round_trip()
+        with store.lock:
+            store.sessions.pop(user_id, None)
+
+    def is_processed(self, message_id: str, platform: str) -> bool:
+        store.round_trip()
+        with store.lock:
+            if (message_id, platform) in store.processed:
+                return True
+            store.processed.add((message_id, platform))
+            return False
+
+    def claim_new(self, message_ids, platform: str):
+        store.round_trip()  # one pipelined round trip for the batch
+        new = set()
+        with store.lock:
+            for message_id in message_ids:
+                if message_id and (message_id, platform) not in store.processed:
+                    store.processed.add((message_id, platform))
+                    new.add(message_id)
+        return new
+
+    def save_email_metadata(self, conversation_id, subject, in_reply_to, references, thread_key):
+        store.round_trip()
+        with store.lock:
+            store.email_metadata[conversation_id] = {
+                "subject": subject, "in_reply_to": in_reply_to,
+                "references": references, "thread_key": thread_key,
+            }
+
+    def get_email_metadata(self, conversation_id: str) -> Optional[Dict[str, str]]:
+        store.round_trip()
+        return store.email_metadata.get(conversation_id)
+
+    def find_conversation_by_thread_keys(self, thread_keys):
+        store.round_trip()
+        with store.lock:
+            by_key = {row["thread_key"]: cid for cid, row in store.email_metadata.items()}
+        return next((by_key[key] for key in thread_keys if key in by_key), None)
+
+    def delete_email_threads(self, thread_keys):
+        store.round_trip()
+        with store.lock:
+            deleted = [cid for cid, row in store.email_metadata.items() if row["thread_key"] in thread_keys]
+            for cid in deleted:
+                del store.email_metadata[cid]
+        return deleted
+
+    ConversationRepository.get_active_session = get_active_session
+    ConversationRepository.save_session = save_session
+    ConversationRepository.claim_stale_sessions = claim_stale_sessions
+    ConversationRepository.restore_sessions = restore_sessions
+    ConversationRepository.clear_session = clear_session
+    MessageRepository.is_processed = is_processed
+    MessageRepository.claim_new = claim_new
+    MessageRepository.save_email_metadata = save_email_metadata
+    MessageRepository.get_email_metadata = get_email_metadata
+    MessageRepository.find_conversation_by_thread_keys = find_conversation_by_thread_keys
+    MessageRepository.delete_email_threads = delete_email_threads
+    IntentRepository.get_active_rules = lambda self: None
+    Database.initialize = classmethod(lambda cls: None)
+    Database.close = classmethod(lambda cls: None)
+    Database.prewarm = classmethod(lambda cls, timeout=10.0: None)
+    Database.ping = classmethod(lambda cls, timeout=2.0: latency_ms)
+    return store
@@ -0,0 +1,165 @@
+"""Webhook payload mix for the load test.
+
+Every event gets its own sender id so the reply recorded by the Meta fake
+can be matched to the webhook that caused it.
+"""
+import hashlib
+import random
+import time
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+WHATSAPP_PHONE_NUMBER_ID = "100000000000001"
+INSTAGRAM_CHATBOT_ID = "17840000000000001"
+
+QUESTIONS = [
+    "Bagaimana cara mengurus NIB untuk usaha mikro?",
+    "Apa saja syarat perizinan berusaha berbasis risiko untuk KBLI 56101?",
+    "Berapa lama proses verifikasi izin lokasi di OSS?",
+    "Saya mau tanya soal LKPM triwulan, kapan batas pelaporannya?",
+    "Apakah PMA boleh bergerak di bidang perdagangan eceran?",
+    "Bagaimana cara mengubah data pemegang saham di OSS RBA?",
+    "Sertifikat standar saya belum terverifikasi, apa yang harus dilakukan?",
+    "tolong jelaskan perbedaan risiko menengah rendah dan menengah tinggi",
+]
+GREETINGS = ["halo", "selamat pagi kak", "terima kasih banyak", "makasih min"]
+
+# kind: weight. Replies are expected for text and greeting events only.
+DEFAULT_MIX: Dict[str, float] = {
+    "wa_text": 0.45,
+    "wa_greeting": 0.05,
+    "wa_button": 0.05,
+    "wa_status": 0.10,
+    "ig_text": 0.25,
+    "ig_greeting": 0.03,
+    "ig_quick_reply": 0.07,
+}
+# Opt-in kinds (not in the default mix), e.g. --mix wa_text=0.8,wa_image=0.2
+EXTRA_KINDS = {"wa_image"}
+EXPECTS_REPLY = {"wa_text", "wa_greeting", "ig_text", "ig_greeting", "wa_image"}
+
+# Images come from a small pool so forwarded duplicates hit the upload cache.
+MEDIA_POOL = 8
+MEDIA_BYTES = 256 * 1024
+
+
+def media_content(media_id: str) -> bytes:
+    """Deterministic body of a fake media file (served by FakeMeta)."""
+    block = hashlib.sha256(media_id.encode()).digest()
+    return (block * (MEDIA_BYTES // len(block) + 1))[:MEDIA_BYTES]
+
+
+class Event(NamedTuple):
+    kind: str
+    path: str
+    sender: str
+    payload: Dict
+    expects_reply: bool
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in DEFAULT_MIX and kind.strip() not in EXTRA_KINDS:
+            raise ValueError(f"Unknown event kind: {kind}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def _whatsapp(sender: str, message: Dict) -> Dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WABA_ID",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "6281100000000", "phone_number_id": WHATSAPP_PHONE_NUMBER_ID},
+                    "contacts": [{"profile": {"name": "Load Test"}, "wa_id": sender}],
+                    "messages": [{"from": sender, "id": f"wamid.{sender}", "timestamp": str(int(time.time())), **message}],
+                },
+            }],
+        }],
+    }
+
+
+def _whatsapp_status(sender: str) -> Dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WABA_ID",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"phone_number_id": WHATSAPP_PHONE_NUMBER_ID},
+                    "statuses": [{"id": f"wamid.out.{sender}", "status": "delivered",
+                                  "timestamp": str(int(time.time())), "recipient_id": sender}],
+                },
+            }],
+        }],
+    }
+
+
+def _instagram(sender: str, message: Dict) -> Dict:
+    return {
+        "object": "instagram",
+        "entry": [{
+            "id": INSTAGRAM_CHATBOT_ID,
+            "time": int(time.time() * 1000),
+            "messaging": [{
+                "sender": {"id": sender},
+                "recipient": {"id": INSTAGRAM_CHATBOT_ID},
+                "timestamp": int(time.time() * 1000),
+                "message": {"mid": f"aWdfZAG1.{sender}", **message},
+            }],
+        }],
+    }
+
+
+def build_event(kind: str, index: int, rng: random.Random) -> Event:
+    if kind.startswith("wa_"):
+        sender = f"628{index:010d}"
+        path = "/whatsapp/webhook"
+        if kind == "wa_text":
+            payload = _whatsapp(sender, {"type": "text", "text": {"body": rng.choice(QUESTIONS)}})
+        elif kind == "wa_greeting":
+            payload = _whatsapp(sender, {"type": "text", "text": {"body": rng.choice(GREETINGS)}})
+        elif kind == "wa_image":
+            media_id = f"media.{index % MEDIA_POOL}"
+            image = {"id": media_id, "mime_type": "image/jpeg",
+                     "sha256": hashlib.sha256(media_content(media_id)).hexdigest(), "caption": rng.choice(QUESTIONS)}
+            payload = _whatsapp(sender, {"type": "image", "image": image})
+        elif kind == "wa_button":
+            reply = {"id": f"like-{index}", "title": "Membantu"}
+            payload = _whatsapp(sender, {"type": "interactive",
+                                         "interactive": {"type": "button_reply", "button_reply": reply}})
+        else:
+            payload = _whatsapp_status(sender)
+    else:
+        sender = f"2{index:015d}"
+        path = "/instagram/webhook"
+        if kind == "ig_text":
+            payload = _instagram(sender, {"text": rng.choice(QUESTIONS)})
+        elif kind == "ig_greeting":
+            payload = _instagram(sender, {"text": rng.choice(GREETINGS)})
+        else:
+            payload = _instagram(sender, {"text": "Membantu", "quick_reply": {"payload": f"like-{index}"}})
+    return Event(kind, path, sender, payload, kind in EXPECTS_REPLY)
+
+
+def generate(count: int, mix: Dict[str, float], seed: int = 1) -> List[Event]:
+    rng = random.Random(seed)
+    kinds: List[str] = list(mix)
+    weights: List[float] = [mix[k] for k in kinds]
+    return [build_event(rng.choices(kinds, weights)[0], i, rng) for i in range(count)]
+
+
+def iter_kinds(events: List[Event]) -> Iterator[Tuple[str, int]]:
+    counts: Dict[str, int] = {}
+    for event in events:
+        counts[event.kind] = counts.get(event.kind, 0) + 1
+    return iter(sorted(counts.items()))
@@ -0,0 +1,167 @@
+"""Replays a traffic capture (``CAPTURE_PATH``) against a local instance.
+
+Webhook entries are re-posted to ``/whatsapp/webhook`` and
+``/instagram/webhook``; email entries go through ``/api/messages/process``.
+Inter-arrival gaps are preserved and scaled by ``--speed``:
+
+    python -m benchmarks.loadtest.replay capture.jsonl               # 1x, stubbed upstreams
+    python -m benchmarks.loadtest.replay capture.jsonl --speed 10    # 10x faster
+    python -m benchmarks.loadtest.replay capture.jsonl --speed max --concurrency 64
+    python -m benchmarks.loadtest.replay capture.jsonl --target http://127.0.0.1:8000
+
+Without ``--target`` the app is started the same way as the load test, with
+Dify, Meta and Graph replaced by the local fakes.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import percentile
+from benchmarks.loadtest.fakes import FakeDify, FakeGraph, FakeMeta
+from benchmarks.loadtest.run import _free_port, start_app, wait_healthy
+
+ROUTES = {"whatsapp": "/whatsapp/webhook", "instagram": "/instagram/webhook", "email": "/api/messages/process"}
+REPLAY_API_KEY = "replay"
+
+
+def load_capture(path: str, channels: Optional[List[str]], limit: int) -> List[Dict]:
+    entries = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if channels and entry["ch"] not in channels:
+                continue
+            entries.append(entry)
+            if limit and len(entries) >= limit:
+                break
+    entries.sort(key=lambda e: e["t"])
+    return entries
+
+
+def to_request(entry: Dict):
+    body = entry["body"]
+    if entry["ch"] == "email":
+        body = {
+            "platform_unique_id": body["sender_email"],
+            "query": body["body"],
+            "platform": "email",
+            "metadata": body.get("metadata") or {},
+        }
+    return ROUTES[entry["ch"]], body
+
+
+async def replay(base_url: str, entries: List[Dict], speed: Optional[float], concurrency: int,
+                 api_key: Optional[str]) -> List[Dict]:
+    results: List[Dict] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-API-Key": api_key} if api_key else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, headers=headers) as client:
+        async def send(entry: Dict, due: float):
+            path, body = to_request(entry)
+            async with semaphore:
+                sent = time.monotonic()
+                try:
+                    status = (await client.post(path, json=body)).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                results.append({"ch": entry["ch"], "status": status, "lag_ms": (sent - due) * 1000,
+                                "ack_ms": (time.monotonic() - sent) * 1000})
+
+        tasks = []
+        started = time.monotonic()
+        first = entries[0]["t"] if entries else 0
+        for entry in entries:
+            due = started + (entry["t"] - first) / speed if speed else time.monotonic()
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(entry, due)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def report(results: List[Dict], wall_seconds: float, captured_seconds: float):
+    acks = [r["ack_ms"] for r in results if r["status"] == 200]
+    lags = [r["lag_ms"] for r in results]
+    by_channel: Dict[str, int] = {}
+    for r in results:
+        by_channel[r["ch"]] = by_channel.get(r["ch"], 0) + 1
+    errors = sum(1 for r in results if r["status"] != 200)
+
+    print(f"\nReplayed {len(results)} entries {by_channel} in {wall_seconds:.1f} s "
+          f"(captured span {captured_seconds:.1f} s), {errors} errors")
+    print(f"throughput   {len(acks) / wall_seconds if wall_seconds else 0:.1f} req/s")
+    print(f"ack          p50 {percentile(acks, 50):.1f} ms  p99 {percentile(acks, 99):.1f} ms")
+    print(f"send lag     p50 {percentile(lags, 50):.1f} ms  p99 {percentile(lags, 99):.1f} ms  "
+          "(how far behind schedule requests went out)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured inbound traffic.")
+    parser.add_argument("path")
+    parser.add_argument("--speed", default="1", help="Time scale (1, 10, ...) or 'max'")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--channels", default="", help="Comma-separated subset, e.g. whatsapp,email")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--target", default=None, help="Existing instance; default starts one with stubs")
+    parser.add_argument("--api-key", default=None, help="X-API-Key for email entries on --target")
+    parser.add_argument("--dify-latency", default="lognormal:0.8:0.4")
+    parser.add_argument("--meta-latency", default="uniform:0.02:0.08")
+    parser.add_argument("--graph-latency", default="uniform:0.05:0.15")
+    parser.add_argument("--db", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--drain-seconds", type=float, default=5.0, help="Wait for background work after the last ack")
+    args = parser.parse_args(argv)
+
+    speed = None if args.speed == "max" else float(args.speed)
+    channels = [c.strip() for c in args.channels.split(",") if c.strip()] or None
+    entries = load_capture(args.path, channels, args.limit)
+    if not entries:
+        print("Nothing to replay", file=sys.stderr)
+        return 1
+    captured_seconds = entries[-1]["t"] - entries[0]["t"]
+
+    fakes, proc, api_key = [], None, args.api_key
+    base_url = args.target
+    if base_url is None:
+        dify, meta, graph = FakeDify(args.dify_latency), FakeMeta(args.meta_latency), FakeGraph(args.graph_latency)
+        fakes = [dify.start(), meta.start(), graph.start()]
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        api_key = REPLAY_API_KEY
+        proc = start_app(args, dify, meta, graph, port, extra_env={"X_API_KEY": api_key})
+
+    try:
+        if proc is not None:
+            wait_healthy(base_url, proc)
+        started = time.monotonic()
+        results = asyncio.run(replay(base_url, entries, speed, args.concurrency, api_key))
+        wall = time.monotonic() - started
+        if fakes:
+            time.sleep(args.drain_seconds)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        for fake in fakes:
+            fake.stop()
+
+    report(results, wall, captured_seconds)
+    if fakes:
+        print(f"upstream     dify {fakes[0].requests}  meta {fakes[1].requests} ({fakes[1].sends} replies)  "
+              f"graph {fakes[2].requests}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""End-to-end load test against local stand-ins.
+
+Starts fake Dify / Meta / Microsoft Graph servers, runs the app in a
+subprocess pointed at them, fires a mix of WhatsApp and Instagram webhooks
+and reports throughput, webhook ack latency and end-to-end reply latency
+(webhook sent -> reply received by the Meta fake):
+
+    python -m benchmarks.loadtest.run --requests 500 --concurrency 32
+    python -m benchmarks.loadtest.run --rate 50 --dify-latency lognormal:0.8:0.5
+    python -m benchmarks.loadtest.run --compare benchmarks/results/baseline.json
+
+Results are written as JSON (``--out``). ``--compare`` exits non-zero when
+a metric regresses by more than ``--max-regression`` against a previous
+result, so a release can be gated on it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import percentile
+from benchmarks.loadtest.fakes import FakeDify, FakeGraph, FakeMeta
+from benchmarks.loadtest.payloads import (
+    INSTAGRAM_CHATBOT_ID, WHATSAPP_PHONE_NUMBER_ID, Event, generate, iter_kinds, parse_mix
+)
+
+ROOT = Path(__file__).resolve().parents[2]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+# metric -> True when higher is better
+GATED_METRICS = {
+    "throughput_rps": True,
+    "ack_p50_ms": False,
+    "ack_p99_ms": False,
+    "e2e_p50_ms": False,
+    "e2e_p99_ms": False,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def start_app(args, dify: FakeDify, meta: FakeMeta, graph: FakeGraph, port: int,
+              extra_env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "DIFY_API_BASE_URL": f"{dify.url}/v1",
+        "DIFY_API_KEY": "loadtest",
+        "META_GRAPH_BASE_URL": meta.url,
+        "INSTAGRAM_GRAPH_BASE_URL": meta.url,
+        "MS_GRAPH_BASE_URL": graph.url,
+        "WHATSAPP_ACCESS_TOKEN": "loadtest",
+        "WHATSAPP_PHONE_NUMBER_ID": WHATSAPP_PHONE_NUMBER_ID,
+        "INSTAGRAM_PAGE_ACCESS_TOKEN": "loadtest",
+        "INSTAGRAM_CHATBOT_ID": INSTAGRAM_CHATBOT_ID,
+        "LOG_LEVEL": args.log_level,
+        **(extra_env or {}),
+    })
+    if args.db == "memory":
+        for key, value in (("DB_HOST", "127.0.0.1"), ("DB_PORT", "5432"), ("DB_NAME", "loadtest"),
+                           ("DB_USER", "loadtest"), ("DB_PASS", "loadtest")):
+            env.setdefault(key, value)
+    cmd = [sys.executable, "-m", "benchmarks.loadtest.serve", "--port", str(port),
+           "--db", args.db, "--db-latency-ms", str(args.db_latency_ms)]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+
+def wait_healthy(base_url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"App exited during startup (code {proc.returncode})")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit("App did not become healthy in time")
+
+
+async def drive(base_url: str, events: List[Event], concurrency: int, rate: float) -> List[Dict]:
+    """Send every event; closed loop with ``concurrency`` workers, or open loop at ``rate``/s."""
+    results: List[Dict] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def send(event: Event):
+            async with semaphore:
+                sent = time.monotonic()
+                try:
+                    resp = await client.post(event.path, json=event.payload)
+                    status = resp.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                results.append({"event": event, "sent": sent, "ack_ms": (time.monotonic() - sent) * 1000,
+                                "status": status})
+
+        tasks = []
+        started = time.monotonic()
+        for index, event in enumerate(events):
+            if rate > 0:
+                delay = started + index / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(event)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def wait_replies(meta: FakeMeta, expected: List[str], timeout: float) -> float:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(sender in meta.replies for sender in expected):
+            break
+        time.sleep(0.05)
+    return time.monotonic()
+
+
+def summarize(results: List[Dict], meta: FakeMeta, wall_seconds: float) -> Dict:
+    acks = [r["ack_ms"] for r in results if r["status"] == 200]
+    errors = [r for r in results if r["status"] != 200]
+    e2e, missing = [], 0
+    for r in results:
+        if not r["event"].expects_reply or r["status"] != 200:
+            continue
+        replied = meta.replies.get(r["event"].sender)
+        if replied is None:
+            missing += 1
+        else:
+            e2e.append((replied - r["sent"]) * 1000)
+
+    return {
+        "requests": len(results),
+        "errors": len(errors),
+        "missing_replies": missing,
+        "throughput_rps": round(len(acks) / wall_seconds, 2) if wall_seconds else 0.0,
+        "ack_p50_ms": round(percentile(acks, 50), 2),
+        "ack_p95_ms": round(percentile(acks, 95), 2),
+        "ack_p99_ms": round(percentile(acks, 99), 2),
+        "e2e_p50_ms": round(percentile(e2e, 50), 2),
+        "e2e_p95_ms": round(percentile(e2e, 95), 2),
+        "e2e_p99_ms": round(percentile(e2e, 99), 2),
+        "e2e_max_ms": round(max(e2e), 2) if e2e else 0.0,
+    }
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Print the comparison and return the names of metrics that regressed."""
+    failures = []
+    changed = [k for k, v in current["config"].items() if k != "max_regression" and baseline.get("config", {}).get(k) != v]
+    if changed:
+        print(f"  warning: config differs from the baseline ({', '.join(changed)})")
+    for name, higher_is_better in GATED_METRICS.items():
+        new, old = current["metrics"].get(name), baseline["metrics"].get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -max_regression if higher_is_better else change > max_regression
+        print(f"  {name:16} {old:10.2f} -> {new:10.2f}  ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+        if regressed:
+            failures.append(name)
+    for name in ("errors", "missing_replies"):
+        if current["metrics"].get(name, 0) > baseline["metrics"].get(name, 0):
+            print(f"  {name:16} {baseline['metrics'].get(name, 0):10} -> {current['metrics'][name]:10}  REGRESSION")
+            failures.append(name)
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end webhook load test.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrivals per second (0: closed loop)")
+    parser.add_argument("--mix", default="", help="e.g. wa_text=0.7,ig_text=0.3 (default: realistic mix)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dify-latency", default="lognormal:0.8:0.4")
+    parser.add_argument("--meta-latency", default="uniform:0.02:0.08")
+    parser.add_argument("--graph-latency", default="uniform:0.05:0.15")
+    parser.add_argument("--db", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="Per-call delay of the memory DB")
+    parser.add_argument("--reply-timeout", type=float, default=60)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--out", default=None, help="Result JSON path (default: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to gate against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    events = generate(args.requests, parse_mix(args.mix), args.seed)
+    dify = FakeDify(args.dify_latency).start()
+    meta = FakeMeta(args.meta_latency).start()
+    graph = FakeGraph(args.graph_latency).start()
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    proc = start_app(args, dify, meta, graph, port)
+
+    try:
+        wait_healthy(base_url, proc)
+        started = time.monotonic()
+        results = asyncio.run(drive(base_url, events, args.concurrency, args.rate))
+        acked = time.monotonic()
+        expected = [r["event"].sender for r in results if r["event"].expects_reply and r["status"] == 200]
+        finished = wait_replies(meta, expected, args.reply_timeout)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        for fake in (dify, meta, graph):
+            fake.stop()
+
+    metrics = summarize(results, meta, acked - started)
+    metrics["drain_seconds"] = round(finished - acked, 2)
+    report = {
+        "name": "loadtest",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "events": dict(iter_kinds(events)),
+        "upstream_requests": {"dify": dify.requests, "meta": meta.requests, "graph": graph.requests},
+        "dify_uploads": dify.uploads,
+        "metrics": metrics,
+    }
+
+    print(f"\n{metrics['requests']} webhooks, {metrics['errors']} errors, "
+          f"{metrics['missing_replies']} missing replies")
+    print(f"throughput   {metrics['throughput_rps']:.1f} req/s")
+    print(f"ack          p50 {metrics['ack_p50_ms']:.1f} ms  p95 {metrics['ack_p95_ms']:.1f} ms  "
+          f"p99 {metrics['ack_p99_ms']:.1f} ms")
+    print(f"end-to-end   p50 {metrics['e2e_p50_ms']:.1f} ms  p95 {metrics['e2e_p95_ms']:.1f} ms  "
+          f"p99 {metrics['e2e_p99_ms']:.1f} ms")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Saved {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"\nCompared with {args.compare} (max regression {args.max_regression:.0%}):")
+        if compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
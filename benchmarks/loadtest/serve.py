@@ -0,0 +1,25 @@
+"""Runs the app under uvicorn for the load test, optionally on the in-memory DB.
+
+    python -m benchmarks.loadtest.serve --port 8099 --db memory
+"""
+import argparse
+
+import uvicorn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve app.main for load testing.")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--db", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.db == "memory":
+        from benchmarks.loadtest.memory_db import install
+        install(args.db_latency_ms)
+
+    uvicorn.run("app.main:app", host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Per-message memory: ``IncomingMessage`` vs ``MessageRecord``.
+
+    python -m benchmarks.message_memory [--count 10000]
+
+Parses ``count`` copies of each webhook corpus message (plus an SMTP and a
+Graph email) as the pipeline queues them, traceparent stamped, and reports
+the bytes each representation keeps alive per message (``tracemalloc``).
+Both hold the same decoded strings; the difference is the container cost.
+Not part of the ``python -m benchmarks`` timing gate.
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.harness import offline_settings
+
+offline_settings()
+
+from app.schemas.models import IncomingMessage  # noqa: E402
+from app.schemas.record import MessageRecord  # noqa: E402
+from app.services.parsers import parse_whatsapp_payload, parse_instagram_payload  # noqa: E402
+
+CORPUS = Path(__file__).parent / "corpus" / "webhooks"
+PARSERS = {"whatsapp": parse_whatsapp_payload, "instagram": parse_instagram_payload}
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+EMAILS = {
+    "email_smtp": {
+        "subject": "Pertanyaan perizinan usaha",
+        "sender_name": "Budi Santoso <budi@example.co.id>",
+        "message_id": "<CAF1x2y3z@mail.example.co.id>",
+        "in_reply_to": "<CAF0a1b2c@mail.example.co.id>",
+        "references": "<CAE9z8y7x@mail.example.co.id> <CAF0a1b2c@mail.example.co.id>",
+        "thread_key": "<CAF0a1b2c@mail.example.co.id>",
+    },
+    "email_graph": {
+        "subject": "Pertanyaan perizinan usaha",
+        "sender_name": "Budi Santoso",
+        "graph_message_id": "AAMkAGI2TG93AAA=" * 8,
+        "conversation_id": "AAQkAGI2TG93AAA=" * 4,
+        "channel_id": "layanan@example.go.id",
+    },
+}
+
+
+def load_cases():
+    """name -> callable returning a fresh ``MessageRecord`` (fresh strings too)."""
+    cases = {}
+    for path in sorted(CORPUS.glob("*.json")):
+        raw = path.read_bytes()
+        parser = PARSERS[path.stem.split("_", 1)[0]]
+        if parser(json.loads(raw)) is not None:
+            cases[path.stem] = lambda raw=raw, parser=parser: parser(json.loads(raw))
+    for name, metadata in EMAILS.items():
+        raw = json.dumps(metadata)
+        cases[name] = lambda raw=raw: MessageRecord.from_metadata(
+            "email", "budi@example.co.id", "Mohon info syarat izin usaha.", metadata=json.loads(raw)
+        )
+    return cases
+
+
+def as_incoming(make):
+    # What the queue held before: the Pydantic model, metadata copied once per stamp.
+    msg = IncomingMessage(**make().to_dict())
+    msg.metadata = {**(msg.metadata or {}), "traceparent": TRACEPARENT}
+    return msg
+
+
+def as_record(make):
+    msg = make()
+    msg.traceparent = TRACEPARENT
+    return msg
+
+
+def measure(build, make, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(make) for _ in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-message memory of the queued representation.")
+    parser.add_argument("--count", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    cases = load_cases()
+    width = max(len(name) for name in cases)
+    print(f"{'message':<{width}}  {'IncomingMessage':>15}  {'MessageRecord':>13}  change")
+    for name, make in cases.items():
+        old = measure(as_incoming, make, args.count)
+        new = measure(as_record, make, args.count)
+        print(f"{name:<{width}}  {old:13.0f} B  {new:11.0f} B  {new / old - 1:+7.1%}")
+
+
+if __name__ == "__main__":
+    main()
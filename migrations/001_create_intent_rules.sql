@@ -0,0 +1,18 @@
+-- Intent fast-path rules, hot-reloaded by app.services.intents.IntentRegistry.
+-- A row whose name matches a built-in rule ("reset", "greeting") overrides it.
+CREATE TABLE IF NOT EXISTS bkpm.intent_rules (
+    id          BIGSERIAL PRIMARY KEY,
+    name        TEXT NOT NULL UNIQUE,
+    action      TEXT NOT NULL DEFAULT 'reply' CHECK (action IN ('reset', 'reply')),
+    keywords    TEXT[] NOT NULL,
+    reply       TEXT NOT NULL,
+    match_mode  TEXT NOT NULL DEFAULT 'exact' CHECK (match_mode IN ('exact', 'contains')),
+    priority    INTEGER NOT NULL DEFAULT 100,
+    is_active   BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Example canned FAQ trigger:
+-- INSERT INTO bkpm.intent_rules (name, action, keywords, reply, match_mode, priority)
+-- VALUES ('faq_contact_center', 'reply', ARRAY['contact center', 'nomor call center'],
+--         'Contact Center dapat dihubungi di 1500-765 pada hari kerja pukul 08.00-16.00 WIB.', 'contains', 50);
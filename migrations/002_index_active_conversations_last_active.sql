@@ -0,0 +1,6 @@
+-- Supports the stale-session sweep (ConversationRepository.claim_stale_sessions),
+-- which claims the oldest idle rows with ORDER BY last_active_at ... LIMIT.
+-- CONCURRENTLY avoids blocking writes on a live table; it cannot run inside a
+-- transaction block, so apply this file on its own (e.g. psql -f).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_active_conversations_last_active_at
+    ON active_conversations (last_active_at);